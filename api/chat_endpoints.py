@@ -1,40 +1,45 @@
 # api/chat_endpoints.py
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
-from typing import Dict, List, Optional
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, List, Optional, Tuple
 import json
 import asyncio
+import os
 from datetime import datetime
 
 from models.chat_models import (
     Message, ChatSession, Project, Agent, AGENTS,
     ChatRequest, ChatResponse
 )
+from api.delegation_v7 import build_workflow, level7_enabled, workflow_orchestrator
+from services.ai_integrations import AgentReply, ai_router
+from services.response_cache import should_bypass
+from services.job_queue import ConnectionJobQueue, JobQueueFull, user_limiter
+from services.ws_hub import ConnectionManager, project_topic
+from storage.chat_sessions import ChatSessionRepository
+from storage.message_store import MAX_PAGE_SIZE, MessageStore, InMemoryMessageStore, create_message_store
+from storage.write_behind import WriteBehindQueue
+from utils.logger import accept_request_id, get_request_id
+from utils.tracing import current_span, tracer
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
 # WebSocket connections storage
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-        
-    async def connect(self, websocket: WebSocket, user_id: str):
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
-        
-    def disconnect(self, user_id: str):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-            
-    async def send_personal_message(self, message: str, user_id: str):
-        if user_id in self.active_connections:
-            await self.active_connections[user_id].send_text(message)
-
 manager = ConnectionManager()
 
 # In-memory storage (в продакшене заменить на базу данных)
 projects_db: Dict[str, Project] = {}
-chat_sessions_db: Dict[str, ChatSession] = {}
-messages_db: Dict[str, List[Message]] = {}
+chat_sessions = ChatSessionRepository()
+
+# История сообщений; init_message_store() переключает на SQL при наличии DATABASE_URL
+message_store: MessageStore = InMemoryMessageStore()
+
+# Запись сообщений пачками вне пути запроса
+message_writer = WriteBehindQueue(message_store)
+
+# Пакетная отправка: размер пакета и параллельность внутри одного запроса
+BATCH_MAX_SIZE = int(os.getenv('CHAT_BATCH_MAX_SIZE', 1000))
+BATCH_MAX_CONCURRENCY = int(os.getenv('CHAT_BATCH_MAX_CONCURRENCY', 16))
 
 # ============== REST API ENDPOINTS ==============
 
@@ -56,20 +61,60 @@ async def create_project(name: str, description: str = ""):
     return {"project": project}
 
 @router.get("/projects/{project_id}/chats")
-async def get_project_chats(project_id: str):
-    """Получить все чаты проекта"""
+async def get_project_chats(project_id: str, limit: int = 50, offset: int = 0, active_only: bool = False):
+    """Получить чаты проекта (постранично)"""
     if project_id not in projects_db:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    project_chats = [
-        chat for chat in chat_sessions_db.values() 
-        if chat.project_id == project_id
-    ]
-    return {"chats": project_chats}
+    project_chats = chat_sessions.list_by_project(
+        project_id, offset=offset, limit=limit, active_only=active_only
+    )
+    return {
+        "chats": project_chats,
+        "total": chat_sessions.count_by_project(project_id, active_only=active_only)
+    }
+
+@router.post("/projects/{project_id}/chats")
+async def create_project_chat(project_id: str, agent_id: str):
+    """Создать чат проекта с агентом"""
+    if project_id not in projects_db:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if agent_id not in AGENTS:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    
+    chat = chat_sessions.create(ChatSession(
+        project_id=project_id,
+        agent_id=agent_id,
+        agent_name=AGENTS[agent_id].name
+    ))
+    sync_chat_count(project_id)
+    return {"chat": chat}
+
+@router.patch("/projects/{project_id}/chats/{chat_id}")
+async def update_project_chat(project_id: str, chat_id: str, is_active: bool):
+    """Активировать или закрыть чат проекта"""
+    chat = chat_sessions.get(chat_id)
+    if chat is None or chat.project_id != project_id:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    
+    chat = chat_sessions.update(chat_id, is_active=is_active)
+    return {"chat": chat}
+
+@router.delete("/projects/{project_id}/chats/{chat_id}")
+async def delete_project_chat(project_id: str, chat_id: str):
+    """Удалить чат проекта"""
+    chat = chat_sessions.get(chat_id)
+    if chat is None or chat.project_id != project_id:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    
+    chat_sessions.delete(chat_id)
+    sync_chat_count(project_id)
+    return {"success": True}
 
 @router.post("/send")
-async def send_message(request: ChatRequest):
+async def send_message(request: ChatRequest, http_request: Request):
     """Отправить сообщение агенту через REST API"""
+    current_span().set_attributes({"ai.agent": request.agent_id, "chat.project_id": request.project_id})
     try:
         # Создаем сообщение пользователя
         user_message = Message(
@@ -79,49 +124,89 @@ async def send_message(request: ChatRequest):
             project_id=request.project_id
         )
         
-        # Сохраняем сообщение
-        if request.project_id not in messages_db:
-            messages_db[request.project_id] = []
-        messages_db[request.project_id].append(user_message)
-        
-        # Получаем ответ от агента (заглушка)
-        agent_response = await process_agent_message(
+        # Получаем ответ от агента
+        reply = await process_agent_message(
             request.message, 
             request.agent_id, 
-            request.project_id
+            request.project_id,
+            use_cache=not should_bypass(http_request.headers),
+            user_id=request.user_id
         )
         
         # Создаем ответное сообщение
         response_message = Message(
             sender="agent",
-            text=agent_response,
+            text=reply.text,
             agent_id=request.agent_id,
             agent_name=AGENTS[request.agent_id].name,
             project_id=request.project_id
         )
         
-        # Сохраняем ответ
-        messages_db[request.project_id].append(response_message)
+        # Сохраняем запрос и ответ (write-behind, без ожидания БД)
+        await message_writer.submit([user_message, response_message])
+        
+        # Живое обновление для подписчиков проекта
+        await publish_project_message(user_message)
+        await publish_project_message(response_message)
         
         return ChatResponse(
             message_id=response_message.id,
-            response=agent_response,
+            response=reply.text,
             agent_id=request.agent_id,
             agent_name=AGENTS[request.agent_id].name,
-            timestamp=response_message.timestamp
+            timestamp=response_message.timestamp,
+            backend=reply.backend
         )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/send_batch")
+async def send_message_batch(requests: List[ChatRequest], http_request: Request,
+                             concurrency: int = BATCH_MAX_CONCURRENCY):
+    """
+    Пакетная отправка сообщений агентам.
+    Ответы стримятся NDJSON по мере готовности (порядок — по завершению, см. поле index);
+    лимиты провайдеров соблюдает роутер, здесь — только общая параллельность пакета.
+    """
+    if len(requests) > BATCH_MAX_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch too large: max {BATCH_MAX_SIZE} requests")
+    
+    use_cache = not should_bypass(http_request.headers)
+    semaphore = asyncio.Semaphore(max(1, min(concurrency, BATCH_MAX_CONCURRENCY)))
+    
+    async def run_item(index: int, request: ChatRequest) -> Dict[str, Any]:
+        async with semaphore:
+            return await process_batch_item(index, request, use_cache)
+    
+    async def results():
+        tasks = [asyncio.create_task(run_item(index, request)) for index, request in enumerate(requests)]
+        try:
+            for completed in asyncio.as_completed(tasks):
+                yield json.dumps(await completed, ensure_ascii=False, default=str) + "\n"
+        finally:
+            # Клиент отключился — незавершенные вызовы не нужны
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
 @router.get("/projects/{project_id}/messages")
-async def get_project_messages(project_id: str, limit: int = 50):
-    """Получить сообщения проекта"""
+async def get_project_messages(project_id: str, limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+                               before: Optional[str] = None):
+    """Получить сообщения проекта (страница до сообщения before)"""
     if project_id not in projects_db:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    project_messages = messages_db.get(project_id, [])
-    return {"messages": project_messages[-limit:]}
+    # Read-your-writes: дописываем очередь проекта перед чтением
+    if message_writer.has_pending(project_id):
+        await message_writer.flush()
+    
+    project_messages = await message_store.list(project_id, limit=limit, before=before)
+    # Хранилища режут страницу до MAX_PAGE_SIZE — полную страницу считаем от фактического лимита
+    next_before = (project_messages[0].id
+                   if project_messages and len(project_messages) >= min(limit, MAX_PAGE_SIZE) else None)
+    return {"messages": project_messages, "next_before": next_before}
 
 @router.delete("/projects/{project_id}/messages")
 async def clear_project_messages(project_id: str):
@@ -129,7 +214,8 @@ async def clear_project_messages(project_id: str):
     if project_id not in projects_db:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    messages_db[project_id] = []
+    await message_writer.flush()
+    await message_store.clear(project_id)
     return {"success": True, "message": "Messages cleared"}
 
 # ============== WEBSOCKET ENDPOINT ==============
@@ -137,89 +223,326 @@ async def clear_project_messages(project_id: str):
 @router.websocket("/ws/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: str):
     """WebSocket endpoint для real-time чата"""
-    await manager.connect(websocket, user_id)
+    channel = await manager.connect(websocket, user_id)
+    
+    # Задачи агентов выполняются параллельно, цикл чтения не блокируется
+    jobs = ConnectionJobQueue(user_limiter.get(user_id))
+    
+    async def send_json(payload: dict):
+        await channel.send(json.dumps(payload, default=str))
     
     try:
         while True:
             # Получаем сообщение от клиента
             data = await websocket.receive_text()
-            message_data = json.loads(data)
             
-            # Создаем сообщение пользователя
-            user_message = Message(
-                sender="user",
-                text=message_data["message"],
-                agent_id=message_data["agent_id"],
-                project_id=message_data["project_id"]
-            )
+            try:
+                message_data = json.loads(data)
+            except ValueError:
+                await send_json({"type": "error", "request_id": get_request_id(), "error": "Invalid JSON"})
+                continue
+            
+            frame_type = message_data.get("type", "message")
+            # Id кадра уходит в логи и X-Request-ID провайдеру — принимаем только безопасный
+            request_id = accept_request_id(message_data.get("request_id"))
             
-            # Сохраняем сообщение
-            project_id = message_data["project_id"]
-            if project_id not in messages_db:
-                messages_db[project_id] = []
-            messages_db[project_id].append(user_message)
+            if frame_type == "ping":
+                await send_json({"type": "pong", "request_id": request_id})
             
-            # Отправляем подтверждение получения
-            await websocket.send_text(json.dumps({
-                "type": "message_received",
-                "message": user_message.dict()
-            }))
+            elif frame_type in ("subscribe", "unsubscribe"):
+                topic = project_topic(message_data.get("project_id", ""))
+                if frame_type == "subscribe":
+                    await manager.subscribe(channel, topic)
+                else:
+                    await manager.unsubscribe(channel, topic)
+                await send_json({
+                    "type": f"{frame_type}d",
+                    "request_id": request_id,
+                    "project_id": message_data.get("project_id")
+                })
             
-            # Обрабатываем сообщение агентом
-            agent_response = await process_agent_message(
+            elif frame_type == "workflow":
+                try:
+                    jobs.submit(
+                        request_id,
+                        lambda data=message_data, rid=request_id: handle_workflow(send_json, data, rid, user_id)
+                    )
+                except (JobQueueFull, ValueError) as e:
+                    await send_json({
+                        "type": "error",
+                        "request_id": request_id,
+                        "error": str(e)
+                    })
+            
+            elif frame_type == "cancel":
+                cancelled = jobs.cancel(request_id)
+                await send_json({
+                    "type": "cancelled",
+                    "request_id": request_id,
+                    "success": cancelled
+                })
+            
+            else:
+                try:
+                    jobs.submit(
+                        request_id,
+                        lambda data=message_data, rid=request_id: handle_chat_message(channel, send_json, data, rid)
+                    )
+                except (JobQueueFull, ValueError) as e:
+                    await send_json({
+                        "type": "error",
+                        "request_id": request_id,
+                        "error": str(e)
+                    })
+            
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await jobs.cancel_all()
+        user_limiter.release(user_id)
+        await manager.disconnect(channel)
+
+async def handle_chat_message(channel, send_json, message_data: dict, request_id: str):
+    """Обработка одного сообщения чата в рамках задачи соединения"""
+    current_span().set_attributes({
+        "ai.agent": message_data.get("agent_id"),
+        "chat.project_id": message_data.get("project_id"),
+        "chat.stream": bool(message_data.get("stream"))
+    })
+    try:
+        # Создаем сообщение пользователя
+        user_message = Message(
+            sender="user",
+            text=message_data["message"],
+            agent_id=message_data["agent_id"],
+            project_id=message_data["project_id"]
+        )
+        
+        # Сохраняем сообщение
+        project_id = message_data["project_id"]
+        await message_writer.submit([user_message])
+        
+        # Отправляем подтверждение получения
+        await send_json({
+            "type": "message_received",
+            "request_id": request_id,
+            "message": user_message.dict()
+        })
+        await publish_project_message(user_message, exclude=channel)
+        
+        # Обрабатываем сообщение агентом: потоково или одним ответом
+        backend = None
+        if message_data.get("stream"):
+            response_message, reply = await stream_agent_message(
+                send_json,
+                message_data["message"],
+                message_data["agent_id"],
+                project_id,
+                request_id,
+                use_cache=not message_data.get("no_cache", False),
+                user_id=channel.user_id
+            )
+            backend = reply.backend
+        else:
+            reply = await process_agent_message(
                 message_data["message"],
                 message_data["agent_id"],
-                project_id
+                project_id,
+                use_cache=not message_data.get("no_cache", False),
+                user_id=channel.user_id
             )
+            backend = reply.backend
             
             # Создаем ответное сообщение
             response_message = Message(
                 sender="agent",
-                text=agent_response,
+                text=reply.text,
                 agent_id=message_data["agent_id"],
                 agent_name=AGENTS[message_data["agent_id"]].name,
                 project_id=project_id
             )
-            
-            # Сохраняем ответ
-            messages_db[project_id].append(response_message)
-            
-            # Отправляем ответ клиенту
-            await websocket.send_text(json.dumps({
-                "type": "agent_response",
-                "message": response_message.dict()
-            }))
-            
-    except WebSocketDisconnect:
-        manager.disconnect(user_id)
+        
+        # Сохраняем ответ
+        await message_writer.submit([response_message])
+        
+        # Отправляем ответ клиенту
+        await send_json({
+            "type": "agent_response",
+            "request_id": request_id,
+            "backend": backend,
+            "message": response_message.dict()
+        })
+        await publish_project_message(response_message, exclude=channel)
+        
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
-        await websocket.send_text(json.dumps({
+        await send_json({
             "type": "error",
+            "request_id": request_id,
             "error": str(e)
-        }))
+        })
+
+async def handle_workflow(send_json, message_data: dict, request_id: str, user_id: str):
+    """Выполнение цепочки агентов с прогрессом шагов в WebSocket"""
+    try:
+        if not level7_enabled():
+            raise ValueError("Level 7 not enabled")
+        steps = message_data.get("steps")
+        if steps is not None and not (isinstance(steps, list) and all(
+            isinstance(step, dict) and {"id", "agent_id"} <= step.keys() for step in steps
+        )):
+            raise ValueError("steps: ожидается список {id, agent_id, depends_on}")
+        workflow = await build_workflow(message_data.get("task") or message_data.get("message", ""),
+                                        message_data.get("chain"), steps=steps)
+        
+        async def on_event(event: dict):
+            await send_json({"request_id": request_id, **event})
+        
+        result = await workflow_orchestrator.run(workflow, on_event=on_event, user_id=user_id)
+        await send_json({
+            "type": "workflow_result",
+            "request_id": request_id,
+            **result.to_dict()
+        })
+    
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        await send_json({
+            "type": "error",
+            "request_id": request_id,
+            "error": str(e)
+        })
 
 # ============== HELPER FUNCTIONS ==============
 
-async def process_agent_message(message: str, agent_id: str, project_id: str) -> str:
+async def process_agent_message(message: str, agent_id: str, project_id: str, use_cache: bool = True,
+                                user_id: str = "default") -> AgentReply:
     """Обработка сообщения конкретным агентом"""
     
     if agent_id not in AGENTS:
-        return "Unknown agent"
+        return AgentReply("Unknown agent")
     
-    agent = AGENTS[agent_id]
+    return await ai_router.route(message, agent_id, use_cache=use_cache, user_id=user_id)
+
+async def process_batch_item(index: int, request: ChatRequest, use_cache: bool = True) -> Dict[str, Any]:
+    """Один элемент пакета: ответ агента, запись через write-behind и публикация"""
     
-    # Заглушка для разных агентов
-    if agent_id == "dashka":
-        return f"🤖 Dashka: Понял! Обрабатываю ваш запрос: '{message}'. Передам команде для выполнения."
+    if request.agent_id not in AGENTS:
+        return {"index": index, "agent_id": request.agent_id, "success": False, "error": "Unknown agent"}
     
-    elif agent_id == "claude":
-        return f"🧠 Claude: Анализирую ваш запрос: '{message}'. Рекомендую структурированный подход к решению."
+    try:
+        reply = await process_agent_message(
+            request.message,
+            request.agent_id,
+            request.project_id,
+            use_cache=use_cache,
+            user_id=request.user_id
+        )
+        
+        user_message = Message(
+            sender="user",
+            text=request.message,
+            agent_id=request.agent_id,
+            project_id=request.project_id
+        )
+        response_message = Message(
+            sender="agent",
+            text=reply.text,
+            agent_id=request.agent_id,
+            agent_name=AGENTS[request.agent_id].name,
+            project_id=request.project_id
+        )
+        
+        # write-behind сливает сообщения всего пакета в общие add_many
+        await message_writer.submit([user_message, response_message])
+        await publish_project_message(user_message)
+        await publish_project_message(response_message)
+        
+        response = ChatResponse(
+            message_id=response_message.id,
+            response=reply.text,
+            agent_id=request.agent_id,
+            agent_name=AGENTS[request.agent_id].name,
+            timestamp=response_message.timestamp,
+            success=reply.backend is not None,
+            error=None if reply.backend is not None else reply.text,
+            backend=reply.backend
+        )
+        return {"index": index, **response.dict()}
     
-    elif agent_id == "deepseek":
-        return f"💻 DeepSeek: Готов к реализации: '{message}'. Начинаю написание кода."
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        return {"index": index, "agent_id": request.agent_id, "success": False, "error": str(e)}
+
+async def stream_agent_message(send_json, message: str, agent_id: str, project_id: str, request_id: str,
+                               use_cache: bool = True, user_id: str = "default") -> Tuple[Message, AgentReply]:
+    """Потоковая обработка: agent_delta фрагменты, затем собранное сообщение и ответ роутера с backend"""
+    
+    if agent_id not in AGENTS:
+        raise ValueError(f"Unknown agent: {agent_id}")
+    
+    response_message = Message(
+        sender="agent",
+        text="",
+        agent_id=agent_id,
+        agent_name=AGENTS[agent_id].name,
+        project_id=project_id
+    )
+    
+    chunks: List[str] = []
+    reply = AgentReply("")
+    # Заголовки ответа провайдера (TTFB) пишет event hook пула; здесь — первый фрагмент и весь поток
+    with tracer.span("chat.stream", {"ai.agent": agent_id}) as span:
+        async for chunk in ai_router.stream_message(message, agent_id, use_cache=use_cache, user_id=user_id,
+                                                    reply=reply):
+            if not chunks:
+                span.add_event("first_chunk")
+                span.set_attribute("stream.first_chunk_ms", round(span.elapsed_ms, 3))
+            chunks.append(chunk)
+            await send_json({
+                "type": "agent_delta",
+                "request_id": request_id,
+                "message_id": response_message.id,
+                "agent_id": agent_id,
+                "delta": chunk
+            })
+        span.set_attributes({"stream.chunks": len(chunks), "ai.backend": reply.backend})
+    
+    response_message.text = reply.text
+    return response_message, reply
+
+def sync_chat_count(project_id: str):
+    """Project.chat_count из индекса репозитория, без сканирования сессий"""
+    project = projects_db.get(project_id)
+    if project is not None:
+        project.chat_count = chat_sessions.count_by_project(project_id)
+
+async def publish_project_message(message: Message, exclude=None):
+    """Живое обновление для всех, кто смотрит проект"""
+    await manager.publish(
+        project_topic(message.project_id),
+        {
+            "type": "project_message",
+            "project_id": message.project_id,
+            "message": message.dict()
+        },
+        exclude=exclude
+    )
+
+async def init_message_store(database_url: Optional[str] = None):
+    """Подключение хранилища истории при старте приложения"""
+    global message_store
+    store = create_message_store(database_url)
+    await store.start()
     
-    else:
-        return f"{agent.emoji} {agent.name}: Получил сообщение: '{message}'"
+    # Очередь сначала дописывает накопленное в старое хранилище
+    await message_writer.flush()
+    message_store = store
+    message_writer.store = store
+    await message_writer.start()
 
 # Создаем тестовый проект при старте
 async def init_test_data():
@@ -4,12 +4,26 @@ REST API для умной маршрутизации задач
 """
 from fastapi import APIRouter, HTTPException, status
 from pydantic import BaseModel
+from typing import List, Optional
 import os
 import sys
 
+from core.routing_rules import routing_rules
+from models.chat_models import AGENTS
+from services.ai_integrations import ai_router
+from src.delegation.engine.delegation_engine import RouteCache, delegation_engine as chain_engine
+from src.delegation.monitoring.delegation_monitor import delegation_monitor
+from src.delegation.orchestrator.workflow_orchestrator import (
+    STEP_TIMEOUT, WORKFLOW_TIMEOUT, Workflow, WorkflowOrchestrator
+)
+
 sys.path.append('/app/src')
 router = APIRouter(tags=["Level 7 Delegation"])
 
+DELEGATION_BATCH_MAX = int(os.getenv('DELEGATION_BATCH_MAX', 10000))
+
+workflow_orchestrator = WorkflowOrchestrator(ai_router, monitor=delegation_monitor)
+
 class DelegationRequest(BaseModel):
     task: str
     user_id: str = "default"
@@ -23,9 +37,62 @@ class DelegationResponse(BaseModel):
     level: int
     status: str
 
+class DelegationBatchRequest(BaseModel):
+    tasks: List[str]
+    user_id: str = "default"
+
+class WorkflowStepSpec(BaseModel):
+    id: str
+    agent_id: str
+    depends_on: List[str] = []
+    instruction: str = ""
+
+class ExecuteRequest(BaseModel):
+    task: str
+    user_id: str = "default"
+    # Без chain цепочку выбирает DelegationEngine
+    chain: Optional[List[str]] = None
+    # Явный DAG шагов вместо цепочки: независимые шаги выполняются параллельно
+    steps: Optional[List[WorkflowStepSpec]] = None
+    step_timeout: float = STEP_TIMEOUT
+    timeout: float = WORKFLOW_TIMEOUT
+
+def level7_enabled() -> bool:
+    return os.getenv('LEVEL7_ENABLED') == 'true'
+
+async def build_workflow(task: str, chain: Optional[List[str]] = None,
+                         step_timeout: float = STEP_TIMEOUT, timeout: float = WORKFLOW_TIMEOUT,
+                         steps: Optional[List[dict]] = None) -> Workflow:
+    """Workflow из явного DAG шагов, явной цепочки или рекомендации DelegationEngine"""
+    step_timeout = min(step_timeout, STEP_TIMEOUT)
+    timeout = min(timeout, WORKFLOW_TIMEOUT)
+    if steps:
+        unknown = [step["agent_id"] for step in steps if step["agent_id"] not in AGENTS]
+        if unknown:
+            raise ValueError(f"Unknown agents in steps: {unknown}")
+        return Workflow.from_steps(task, steps, step_timeout=step_timeout, timeout=timeout)
+    if not chain:
+        chain = (await chain_engine.route_task(task))['recommended_chain']
+    unknown = [agent_id for agent_id in chain if agent_id not in AGENTS]
+    if unknown:
+        raise ValueError(f"Unknown agents in chain: {unknown}")
+    return Workflow.from_chain(task, chain, step_timeout=step_timeout, timeout=timeout)
+
 class SimpleDelegationEngine:
+    def __init__(self):
+        self.cache = RouteCache()
+    
     async def route_task(self, task_text: str):
-        if "баг" in task_text.lower() or "исправить" in task_text.lower():
+        key = self.cache.key(task_text)
+        decision = self.cache.get(key)
+        if decision is None:
+            decision = self._route(key)
+            self.cache.set(key, decision)
+        return {**decision, 'task': task_text, 'recommended_chain': list(decision['recommended_chain'])}
+    
+    def _route(self, task_text: str):
+        categories = routing_rules.match(task_text)
+        if 'simple:bug' in categories:
             return {
                 'task': task_text,
                 'complexity': 'MEDIUM',
@@ -34,7 +101,7 @@ class SimpleDelegationEngine:
                 'estimated_time': 10,
                 'level': 7
             }
-        elif "анализ" in task_text.lower() or "архитектуру" in task_text.lower():
+        elif 'simple:analysis' in categories:
             return {
                 'task': task_text,
                 'complexity': 'MEDIUM',
@@ -43,7 +110,7 @@ class SimpleDelegationEngine:
                 'estimated_time': 15,
                 'level': 7
             }
-        elif "создать" in task_text.lower() and "систему" in task_text.lower():
+        elif 'simple:create' in categories and 'simple:system' in categories:
             return {
                 'task': task_text,
                 'complexity': 'COMPLEX',
@@ -72,13 +139,51 @@ async def route_task(request: DelegationRequest):
     result = await delegation_engine.route_task(request.task)
     return DelegationResponse(**result, status="routed_successfully")
 
+@router.post("/route_batch")
+async def route_batch(request: DelegationBatchRequest):
+    """Маршрутизация пакета задач за один запрос (DelegationEngine, векторная оценка)"""
+    if not level7_enabled():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Level 7 not enabled")
+    if len(request.tasks) > DELEGATION_BATCH_MAX:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"Batch too large: max {DELEGATION_BATCH_MAX} tasks")
+    
+    results = await chain_engine.route_batch(request.tasks)
+    return {"count": len(results), "results": results}
+
+@router.post("/execute")
+async def execute_task(request: ExecuteRequest):
+    """
+    Выполнение workflow: результаты шагов передаются дальше по зависимостям.
+    Цепочка claude → deepseek идет по очереди (deepseek реализует план claude);
+    параллельно выполняются шаги явного DAG steps без общих зависимостей
+    """
+    if not level7_enabled():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Level 7 not enabled")
+    
+    try:
+        steps = [step.dict() for step in request.steps] if request.steps else None
+        workflow = await build_workflow(request.task, request.chain, request.step_timeout, request.timeout,
+                                        steps=steps)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    result = await workflow_orchestrator.run(workflow, user_id=request.user_id)
+    return result.to_dict()
+
 @router.get("/status")  
 async def delegation_status():
     return {
         "level7_enabled": os.getenv('LEVEL7_ENABLED') == 'true',
         "version": "1.0.0",
         "agents_available": ["dashka", "claude", "deepseek"],
-        "engine_status": "operational"
+        "engine_status": "operational",
+        "engine_router": "classifier" if chain_engine.classifier is not None else "keywords",
+        "workflows": delegation_monitor.stats(),
+        "route_cache": {
+            "simple": delegation_engine.cache.stats(),
+            "engine": chain_engine.cache.stats()
+        }
     }
 
 @router.get("/test")
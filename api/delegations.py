@@ -1,10 +1,14 @@
 """
 API для работы с делегированиями
 """
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from datetime import datetime
-from typing import List
+from datetime import datetime, timezone
+from typing import Optional
+import json
+
+from storage.delegation_log import MAX_PAGE_SIZE, delegation_log
 
 router = APIRouter(prefix="/api/delegations", tags=["delegations"])
 
@@ -13,22 +17,62 @@ class Delegation(BaseModel):
     to_agent: str
     message: str
     user_id: int
+    # Метка сложности (SIMPLE/MEDIUM/COMPLEX) для обучения TaskClassifier, если известна
+    complexity: Optional[str] = None
 
-# Временное хранилище
-delegations_storage = []
+def _epoch(value: Optional[datetime]) -> Optional[float]:
+    # Время без зоны считаем UTC, как и timestamp записей
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
 
 @router.get("/recent")
-async def get_recent():
+async def get_recent(limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE)):
     """Последние делегирования"""
-    return delegations_storage[-50:]
+    return [entry.to_dict() for entry in delegation_log.recent(limit)]
+
+@router.get("/query")
+async def query_delegations(
+    to_agent: Optional[str] = None,
+    from_agent: Optional[str] = None,
+    user_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    last_seconds: Optional[float] = Query(None, gt=0),
+    cursor: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE)
+):
+    """Делегирования по агентам/пользователю за период, новые первыми; cursor — с предыдущей страницы"""
+    since_ts = _epoch(since)
+    if last_seconds is not None:
+        since_ts = max(since_ts or 0.0, datetime.now(timezone.utc).timestamp() - last_seconds)
+    entries, next_cursor = delegation_log.query(
+        to_agent=to_agent,
+        from_agent=from_agent,
+        user_id=user_id,
+        since=since_ts,
+        until=_epoch(until),
+        before_id=cursor,
+        limit=limit
+    )
+    return {"items": [entry.to_dict() for entry in entries], "next_cursor": next_cursor}
+
+@router.get("/stats")
+async def delegation_log_stats():
+    return delegation_log.stats()
 
 @router.post("/log")
 async def log_delegation(delegation: Delegation):
     """Логирование нового делегирования"""
-    entry = {
-        "id": len(delegations_storage) + 1,
-        "timestamp": datetime.utcnow().isoformat(),
-        **delegation.dict()
-    }
-    delegations_storage.append(entry)
-    return {"status": "logged", "id": entry["id"]}
+    entry = delegation_log.append(**delegation.dict())
+    return {"status": "logged", "id": entry.id}
+
+@router.get("/export")
+async def export_delegations():
+    """Все делегирования в NDJSON — выборка для scripts/train_task_classifier.py"""
+    async def lines():
+        for entry in delegation_log.iter_all():
+            yield json.dumps(entry.to_dict(), ensure_ascii=False) + "\n"
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
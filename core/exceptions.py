@@ -1,2 +1,16 @@
 class AIRouterError(Exception): pass
 class APITimeoutError(AIRouterError): pass
+
+class ProviderError(AIRouterError):
+    """Ошибка вызова AI провайдера; str() — готовый текст для пользователя"""
+    def __init__(self, provider: str, message: str, status_code: int = None, headers=None,
+                 transient: bool = False):
+        super().__init__(message)
+        self.provider = provider
+        self.status_code = status_code
+        self.headers = dict(headers or {})
+        # Сетевой сбой или таймаут — повтор имеет смысл
+        self.transient = transient
+
+class CircuitOpenError(ProviderError):
+    """Провайдер отключен circuit breaker'ом — вызов не выполнялся"""
@@ -0,0 +1,134 @@
+# core/routing_rules.py
+"""
+Общие правила маршрутизации по ключевым словам: все наборы компилируются
+в одно регулярное выражение, категории ищутся за один проход по тексту
+"""
+
+import re
+from typing import Dict, FrozenSet, Iterable, List, Set, Tuple
+
+# Окончания для облегченного стемминга ключевых слов (длинные — первыми)
+ENDINGS = (
+    "ирование", "ование", "ировать", "ация", "ение", "ость", "ать", "ить",
+    "ка", "ия", "ие", "ый", "ий", "ая", "ое", "ые",
+    "а", "я", "ы", "и", "о", "е", "у", "ю", "ь", "й",
+    "ation", "ing", "ed", "e", "s"
+)
+MIN_STEM = 4
+# Короткие ключи («код», «ui») ищутся только с начала слова, иначе ловят «build», «кодекс»
+SHORT_STEM = 3
+
+ROUTING_KEYWORDS: Dict[str, List[str]] = {
+    # DelegationEngine: специализация агентов
+    "agent:dashka": ['координация', 'ui', 'дизайн', 'интерфейс', 'управление'],
+    "agent:claude": ['анализ', 'архитектура', 'план', 'структура', 'документация'],
+    "agent:deepseek": ['код', 'программирование', 'реализация', 'разработка', 'баг'],
+    # DelegationEngine: индикаторы сложности
+    "complexity:build": ['создать', 'построить', 'разработать', 'implement'],
+    "complexity:analysis": ['анализ', 'план', 'архитектура', 'analyze'],
+    "complexity:integration": ['интеграция', 'система', 'полный', 'complete'],
+    "chain:coding": ['код', 'разработка', 'implementation'],
+    # DashkaService
+    "dashka:technical": ['код', 'программ', 'функци', 'класс', 'api'],
+    "dashka:analytical": ['анализ', 'план', 'стратег', 'архитектур'],
+    # SimpleDelegationEngine (api/delegation_v7.py)
+    "simple:bug": ['баг', 'исправить'],
+    "simple:analysis": ['анализ', 'архитектуру'],
+    "simple:create": ['создать'],
+    "simple:system": ['систему']
+}
+
+
+def stem(word: str) -> str:
+    """Отбрасывает одно окончание, если остается не меньше MIN_STEM символов"""
+    word = word.lower().replace("ё", "е")
+    for ending in ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def trie_pattern(keys: Iterable[str]) -> str:
+    """
+    Regex из префиксного дерева ключей: общие префиксы проверяются один раз,
+    жадные необязательные хвосты дают самое длинное совпадение в позиции
+    """
+    trie: Dict = {}
+    for key in keys:
+        node = trie
+        for char in key:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict) -> str:
+        terminal = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            return f"(?:{body})?"
+        return body
+
+    return build(trie) or "(?!)"
+
+
+class KeywordMatcher:
+    """
+    Все ключи → одна альтернатива regex (длинные первыми).
+    Ключ как есть ищется подстрокой (как прежние `word in text`), его стем — с начала слова:
+    «архитектура» находит «архитектуру», но «полный» не находит «дополнительно».
+    Найденный фрагмент дает категории всех ключей, которые в нем содержатся,
+    поэтому перекрытия («программ» внутри «программирован…») не теряются.
+    """
+
+    def __init__(self, rules: Dict[str, Iterable[str]]):
+        self.rules = {category: list(words) for category, words in rules.items()}
+
+        # фрагмент → только с начала слова? / категории
+        anchored: Dict[str, bool] = {}
+        categories_by_key: Dict[str, Set[str]] = {}
+
+        def add(key: str, at_word_start: bool, category: str):
+            anchored[key] = anchored.get(key, True) and at_word_start
+            categories_by_key.setdefault(key, set()).add(category)
+
+        for category, words in self.rules.items():
+            for word in words:
+                word = word.lower().replace("ё", "е")
+                base = stem(word)
+                add(word, len(word) <= SHORT_STEM, category)
+                if base != word:
+                    add(base, True, category)
+
+        def contained(key: str, found: str, at_word_start: bool) -> bool:
+            if anchored[key]:
+                return at_word_start and found.startswith(key)
+            return key in found
+
+        self._categories: Dict[Tuple[str, bool], FrozenSet[str]] = {}
+        for found in categories_by_key:
+            for at_word_start in (True, False):
+                combined: Set[str] = set()
+                for key, categories in categories_by_key.items():
+                    if contained(key, found, at_word_start):
+                        combined |= categories
+                self._categories[(found, at_word_start)] = frozenset(combined)
+
+        # С начала слова годится любой ключ, в середине слова — только неякорные
+        anywhere = [key for key in categories_by_key if not anchored[key]]
+        self._regex = re.compile(rf"(?<!\w){trie_pattern(categories_by_key)}|{trie_pattern(anywhere)}")
+
+    def match(self, text: str) -> FrozenSet[str]:
+        """Все категории, ключевые слова которых встречаются в тексте"""
+        text = text.lower().replace("ё", "е")
+        categories: Set[str] = set()
+        for m in self._regex.finditer(text):
+            start = m.start()
+            at_word_start = start == 0 or not (text[start - 1].isalnum() or text[start - 1] == "_")
+            categories |= self._categories[(m.group(), at_word_start)]
+        return frozenset(categories)
+
+
+# Собирается один раз при импорте
+routing_rules = KeywordMatcher(ROUTING_KEYWORDS)
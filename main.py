@@ -14,13 +14,30 @@ from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 import uvicorn
 from api.delegation_v7 import router as delegation_router
 
 # Local imports
 from api.chat_endpoints import router as chat_router
 from api.delegation_v7 import router as delegation_router
+from api.delegations import router as delegations_log_router
+from api import chat_endpoints
+from api.chat_endpoints import manager as ws_manager
+from services.backplane import RedisBackplane
+from middleware.logging import LoggingMiddleware
+from middleware.metrics import MetricsMiddleware
+from middleware.tracing import TracingMiddleware
+from services.agent_metrics import LATENCY_BUCKETS_MS, agent_metrics
+from services.ai_integrations import ai_router
+from services.http_pool import http_clients
+from services.rate_limiter import rate_limits
+from services.resilience import resilience
+from services.prometheus import CONTENT_TYPE, histogram_samples, metrics_registry
+from services.response_cache import response_cache
+from storage.delegation_log import delegation_log
+from utils.logger import stop_json_loggers
+from utils.tracing import tracer
 
 # Загрузка переменных окружения
 load_dotenv()
@@ -78,9 +95,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Метрики Prometheus: HTTP и WebSocket на уровне ASGI
+app.add_middleware(MetricsMiddleware)
+
+# Трассировка: корневой спан запроса (внутри access log — видит request id)
+app.add_middleware(TracingMiddleware)
+
+# Access log (JSON, выборка) и request id — самым внешним слоем
+app.add_middleware(LoggingMiddleware)
+
 # Подключаем роутеры
 app.include_router(chat_router)
 app.include_router(delegation_router, prefix="/api/delegation")
+app.include_router(delegations_log_router)
 
 # Статические файлы для production
 if os.path.exists("frontend/build"):
@@ -118,6 +145,18 @@ async def startup_event():
     
     # Инициализация реальных сервисов
     try:
+        # WebSocket хаб (локальный backplane до подключения Redis)
+        await ws_manager.start()
+        
+        # Write-behind очередь сообщений чата
+        await chat_endpoints.message_writer.start()
+        
+        # Журнал делегирований (восстановление сегментов с диска)
+        await asyncio.to_thread(delegation_log.open)
+        
+        # Экспорт спанов (файл / OTLP), если TRACING_ENABLED
+        await tracer.start()
+        
         # Инициализация подключений к внешним API
         await init_ai_services()
         
@@ -136,10 +175,26 @@ async def startup_event():
     except Exception as e:
         logger.error(f"❌ Ошибка инициализации: {e}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Освобождение ресурсов при остановке приложения"""
+    logger.info("🛑 Остановка AI Pipeline Production API...")
+    await ws_manager.stop()
+    await chat_endpoints.message_writer.stop()
+    await chat_endpoints.message_store.close()
+    delegation_log.close()
+    await tracer.stop()
+    stop_json_loggers()
+    await response_cache.close()
+    await http_clients.aclose()
+
 async def init_ai_services():
     """Инициализация AI сервисов"""
     logger.info("🤖 Инициализация AI сервисов...")
     
+    # Пул соединений к провайдерам (keep-alive, HTTP/2)
+    await http_clients.start("claude", "deepseek")
+    
     # Тест Claude API
     if CLAUDE_API_KEY:
         try:
@@ -160,10 +215,8 @@ async def init_database():
     """Инициализация базы данных"""
     logger.info("🗄️ Инициализация PostgreSQL...")
     try:
-        # Здесь будет реальное подключение к PostgreSQL
-        # import asyncpg
-        # conn = await asyncpg.connect(DATABASE_URL)
-        # await conn.close()
+        # История сообщений чата (таблица chat_messages)
+        await chat_endpoints.init_message_store(DATABASE_URL)
         logger.info("✅ PostgreSQL подключен")
     except Exception as e:
         logger.error(f"❌ PostgreSQL ошибка: {e}")
@@ -172,10 +225,12 @@ async def init_redis():
     """Инициализация Redis"""
     logger.info("🔴 Инициализация Redis...")
     try:
-        # Здесь будет реальное подключение к Redis
-        # import aioredis
-        # redis = aioredis.from_url(REDIS_URL)
-        # await redis.ping()
+        # Backplane для WebSocket доставок между воркерами и хостами
+        await ws_manager.use_backplane(RedisBackplane(REDIS_URL))
+        
+        # Второй уровень кэша ответов, общий для воркеров
+        if os.getenv('RESPONSE_CACHE_REDIS', 'true') == 'true':
+            await response_cache.attach_redis(REDIS_URL)
         logger.info("✅ Redis подключен")
     except Exception as e:
         logger.error(f"❌ Redis ошибка: {e}")
@@ -241,6 +296,49 @@ async def health_check():
         }
     }
 
+# Сборщики читают уже существующие счетчики только во время scrape
+def _agent_latency_samples():
+    bounds = [bound / 1000 for bound in LATENCY_BUCKETS_MS]
+    return histogram_samples("ai_agent_request_duration_seconds", bounds, (
+        ({"agent": agent_id}, metrics.histogram.counts, metrics.histogram.sum_ms / 1000)
+        for agent_id, metrics in list(agent_metrics.agents.items())
+    ))
+
+def _agent_request_samples():
+    samples = []
+    for agent_id, metrics in list(agent_metrics.agents.items()):
+        samples.append(("ai_agent_requests_total", {"agent": agent_id, "outcome": "ok"}, metrics.requests - metrics.errors))
+        samples.append(("ai_agent_requests_total", {"agent": agent_id, "outcome": "error"}, metrics.errors))
+    return samples
+
+def _cache_samples():
+    return [
+        ("ai_response_cache_requests_total", {"result": "hit"}, response_cache.hits),
+        ("ai_response_cache_requests_total", {"result": "miss"}, response_cache.misses),
+        ("ai_response_cache_requests_total", {"result": "shared_in_flight"}, ai_router.single_flight.shared)
+    ]
+
+def _queue_samples():
+    samples = [
+        ("queue_depth", {"queue": "message_writer"}, chat_endpoints.message_writer.depth),
+        ("queue_depth", {"queue": "single_flight"}, ai_router.single_flight.in_flight)
+    ]
+    for provider, queued in rate_limits.queue_depths().items():
+        samples.append(("queue_depth", {"queue": f"rate_limit:{provider}"}, queued))
+    return samples
+
+metrics_registry.collector("ai_agent_request_duration_seconds", "histogram",
+                           "AIServiceRouter.route latency per agent (cache misses)", _agent_latency_samples)
+metrics_registry.collector("ai_agent_requests", "counter", "AIServiceRouter.route calls per agent",
+                           _agent_request_samples)
+metrics_registry.collector("ai_response_cache_requests", "counter", "Response cache lookups", _cache_samples)
+metrics_registry.collector("queue_depth", "gauge", "Items waiting in internal queues", _queue_samples)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Метрики для Prometheus"""
+    return Response(metrics_registry.expose(), media_type=CONTENT_TYPE)
+
 @app.get("/status")
 async def system_status():
     """Детальный статус системы"""
@@ -253,7 +351,17 @@ async def system_status():
             "deepseek_api": "ready" if DEEPSEEK_API_KEY else "not_configured",
             "database": "ready" if DATABASE_URL else "not_configured",
             "redis": "ready" if REDIS_URL else "not_configured"
-        }
+        },
+        "queues": {
+            "message_writer": chat_endpoints.message_writer.stats()
+        },
+        "response_cache": response_cache.stats(),
+        "single_flight": ai_router.single_flight.stats(),
+        "rate_limits": rate_limits.stats(),
+        "resilience": resilience.stats(),
+        "routing": ai_router.policy.stats(),
+        "agents": agent_metrics.stats(),
+        "tracing": tracer.stats()
     }
 
 def main():
@@ -272,8 +380,11 @@ def main():
         port=PORT,
         reload=False,  # В production не используем reload
         log_level="info",
-        access_log=True,
-        workers=1  # Для Docker обычно 1 worker
+        # Access log пишет LoggingMiddleware (JSON, выборка) — без дублей uvicorn
+        access_log=False,
+        # Один воркер: проекты, сессии, in-memory сообщения, журнал делегирования и лимиты
+        # провайдеров живут в памяти процесса. Redis backplane — задел для нескольких процессов
+        workers=1
     )
 
 if __name__ == "__main__":
@@ -1,24 +1,86 @@
 """
 Middleware для логирования запросов
+Чистый ASGI: без обертки тела ответа, JSON запись через очередь,
+успешные быстрые запросы — по выборке, медленные и ошибочные — всегда
 """
-import time
 import logging
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-
-logger = logging.getLogger(__name__)
-
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        
-        # Логируем входящий запрос
-        logger.info(f"Запрос: {request.method} {request.url}")
-        
-        response = await call_next(request)
-        
-        # Логируем время выполнения
-        process_time = time.time() - start_time
-        logger.info(f"Ответ: {response.status_code} за {process_time:.4f}с")
-        
-        return response
+import os
+import random
+import time
+from typing import Optional
+
+from utils.logger import REQUEST_ID_HEADER, accept_request_id, get_json_logger, request_context
+
+ACCESS_LOG_SAMPLE_RATE = float(os.getenv('ACCESS_LOG_SAMPLE_RATE', 0.01))
+ACCESS_LOG_SLOW_MS = float(os.getenv('ACCESS_LOG_SLOW_MS', 1000))
+# Статусы от этого и выше логируются всегда
+ACCESS_LOG_ERROR_STATUS = int(os.getenv('ACCESS_LOG_ERROR_STATUS', 500))
+
+HEADER_NAME = REQUEST_ID_HEADER.encode("latin-1")
+
+
+class LoggingMiddleware:
+    def __init__(self, app, sample_rate: float = ACCESS_LOG_SAMPLE_RATE, slow_ms: float = ACCESS_LOG_SLOW_MS,
+                 error_status: int = ACCESS_LOG_ERROR_STATUS, logger: Optional[logging.Logger] = None):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.error_status = error_status
+        self.logger = logger or get_json_logger("ai_pipeline.access")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for name, value in scope.get("headers", ()):
+            if name == HEADER_NAME:
+                incoming = value.decode("latin-1")
+                break
+        request_id = accept_request_id(incoming)
+        started = time.perf_counter()
+        status = 500 if scope["type"] == "http" else 101
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", ()), (HEADER_NAME, request_id.encode("latin-1"))]
+            elif message["type"] == "websocket.close":
+                status = message.get("code", 1000)
+            await send(message)
+
+        error = None
+        with request_context(request_id):
+            try:
+                await self.app(scope, receive, send_wrapper)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                self._log(scope, status, (time.perf_counter() - started) * 1000, request_id, error)
+
+    def _log(self, scope, status: int, duration_ms: float, request_id: str, error):
+        http = scope["type"] == "http"
+        failed = error is not None or (http and status >= self.error_status)
+        # WebSocket сессии редкие и долгие — их закрытие логируем всегда
+        slow = http and duration_ms >= self.slow_ms
+        if http and not failed and not slow and random.random() >= self.sample_rate:
+            return
+        level = logging.ERROR if failed else logging.WARNING if slow else logging.INFO
+        if not self.logger.isEnabledFor(level):
+            return
+
+        fields = {
+            "type": scope["type"],
+            "method": scope.get("method"),
+            "path": scope.get("path"),
+            "status": status,
+            "duration_ms": round(duration_ms, 2)
+        }
+        if error is not None:
+            fields["error"] = repr(error)
+        elif http and not failed and not slow:
+            fields["sample_rate"] = self.sample_rate
+        self.logger.log(level, "request", extra={"fields": fields, "request_id": request_id})
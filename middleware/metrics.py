@@ -0,0 +1,102 @@
+"""
+ASGI middleware метрик: задержка HTTP по шаблону маршрута, WebSocket соединения и сообщения.
+Чистый ASGI (без BaseHTTPMiddleware): не буферизует тело и не ломает стриминг
+"""
+import time
+from typing import Any, Dict, Tuple
+
+from services.prometheus import HTTP_REQUEST_DURATION, WS_CONNECTIONS, WS_CONNECTIONS_OPENED, WS_MESSAGES
+
+# Путь запроса в метке дал бы по серии на каждый id — используем шаблон маршрута
+UNMATCHED_ROUTE = "unmatched"
+
+
+class RouteTemplates:
+    """Шаблон пути маршрута, который обработал запрос (роутер кладет endpoint в scope)"""
+
+    def __init__(self):
+        self._paths: Dict[Any, str] = {}
+
+    def __call__(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        path = self._paths.get(endpoint)
+        if path is None:
+            path = UNMATCHED_ROUTE
+            app = scope.get("app")
+            for route in getattr(app, "routes", ()):
+                if getattr(route, "endpoint", None) is endpoint or getattr(route, "app", None) is endpoint:
+                    path = route.path
+                    break
+            self._paths[endpoint] = path
+        return path
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self._route = RouteTemplates()
+        # (method, endpoint, status) → серия гистограммы: один поиск на запрос
+        self._http_series: Dict[Tuple[str, Any, int], Any] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            await self._http(scope, receive, send)
+        elif scope["type"] == "websocket":
+            await self._websocket(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+    async def _http(self, scope, receive, send):
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            key = (scope["method"], scope.get("endpoint"), status)
+            series = self._http_series.get(key)
+            if series is None:
+                series = self._http_series[key] = HTTP_REQUEST_DURATION.labels(
+                    scope["method"], self._route(scope), str(status)
+                )
+            series.observe(elapsed)
+
+    async def _websocket(self, scope, receive, send):
+        route = None
+        received = sent = None
+        opened = False
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "websocket.receive" and received is not None:
+                received.inc()
+            return message
+
+        async def send_wrapper(message):
+            nonlocal route, received, sent, opened
+            if message["type"] == "websocket.accept":
+                # Маршрут уже сопоставлен роутером — серии разрешаем один раз на соединение
+                route = self._route(scope)
+                received = WS_MESSAGES.labels(route, "in")
+                sent = WS_MESSAGES.labels(route, "out")
+                WS_CONNECTIONS_OPENED.labels(route).inc()
+                WS_CONNECTIONS.labels(route).inc()
+                opened = True
+            elif message["type"] == "websocket.send" and sent is not None:
+                sent.inc()
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            if opened:
+                WS_CONNECTIONS.labels(route).dec()
@@ -0,0 +1,53 @@
+"""
+Middleware трассировки: корневой server-спан на HTTP запрос.
+Продолжает трассу из входящего traceparent; WebSocket кадры получают свои
+корневые спаны в очереди задач соединения
+"""
+from typing import Optional
+
+from middleware.metrics import RouteTemplates
+from utils.logger import get_request_id
+from utils.tracing import TRACEPARENT_HEADER, Tracer, parse_traceparent, tracer as default_tracer
+
+HEADER_NAME = TRACEPARENT_HEADER.encode("latin-1")
+
+
+class TracingMiddleware:
+    def __init__(self, app, tracer: Optional[Tracer] = None):
+        self.app = app
+        self.tracer = tracer or default_tracer
+        self._route = RouteTemplates()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        parent = None
+        for name, value in scope.get("headers", ()):
+            if name == HEADER_NAME:
+                parent = parse_traceparent(value.decode("latin-1"))
+                break
+
+        with self.tracer.span(f"{scope['method']} {scope['path']}", kind="server", parent=parent) as span:
+            span.set_attributes({
+                "http.method": scope["method"],
+                "http.target": scope["path"],
+                "request.id": get_request_id()
+            })
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                    if message["status"] >= 500:
+                        span.set_status("error", f"HTTP {message['status']}")
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                # Имя по шаблону маршрута: /chats/{chat_id}, а не по каждому id
+                route = self._route(scope)
+                span.set_attribute("http.route", route)
+                if span.is_recording:
+                    span.name = f"{scope['method']} {route}"
@@ -104,4 +104,6 @@ class ChatResponse(BaseModel):
     agent_name: str
     timestamp: datetime
     success: bool = True
-    error: Optional[str] = None
\ No newline at end of file
+    error: Optional[str] = None
+    # Backend, который фактически ответил (при failover отличается от agent_id)
+    backend: Optional[str] = None
\ No newline at end of file
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк маршрутизации по ключевым словам: прежние циклы any(word in text)
+всех трех мест вызова против одного прохода KeywordMatcher.
+
+    PYTHONPATH=. python scripts/bench_routing_rules.py [-n 20000]
+"""
+import argparse
+import timeit
+
+from core.routing_rules import ROUTING_KEYWORDS, routing_rules
+
+SAMPLES = [
+    "Создать полную систему интеграции платежей с архитектурой микросервисов",
+    "Исправить баг в функции авторизации",
+    "Проанализировать архитектуру и составить план миграции",
+    "Напиши код для парсера CSV на Python",
+    "Обнови дизайн интерфейса страницы настроек",
+    "What is the status of the deployment pipeline today?",
+    "Подготовь документацию по API для внешних партнеров и опиши структуру ответов " * 4,
+]
+
+
+def legacy_loops(text: str):
+    """Прежняя логика: отдельный lower() и скан на каждый набор ключей"""
+    found = set()
+    for category, words in ROUTING_KEYWORDS.items():
+        if any(word in text.lower() for word in words):
+            found.add(category)
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Routing rules microbenchmark")
+    parser.add_argument("-n", "--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    for name, fn in (("legacy any() loops", legacy_loops), ("KeywordMatcher.match", routing_rules.match)):
+        seconds = min(timeit.repeat(lambda: [fn(text) for text in SAMPLES], number=args.number // len(SAMPLES), repeat=3))
+        calls = (args.number // len(SAMPLES)) * len(SAMPLES)
+        print(f"{name:24s} {seconds / calls * 1e6:8.2f} µs/сообщение")
+
+
+if __name__ == "__main__":
+    main()
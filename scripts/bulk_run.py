@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Прогон JSONL файла промптов через AIServiceRouter.
+
+    PYTHONPATH=. python scripts/bulk_run.py prompts.jsonl -o results.jsonl -c 16
+
+Строка входа: {"id": ..., "message": ..., "agent_id": ..., "context": ...}
+(также понимает prompt/body и request_id). Повторный запуск с тем же -o
+пропускает уже выполненные элементы.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+
+from dotenv import load_dotenv
+
+
+def parse_args(default_concurrency: int):
+    parser = argparse.ArgumentParser(description="Bulk JSONL runner")
+    parser.add_argument("input", help="входной JSONL")
+    parser.add_argument("-o", "--output", help="выходной JSONL (по умолчанию <input>.results.jsonl)")
+    parser.add_argument("-a", "--agent", default="deepseek", help="агент для строк без agent_id")
+    parser.add_argument("-c", "--concurrency", type=int, default=default_concurrency)
+    parser.add_argument("-n", "--limit", type=int, help="обработать не больше N новых элементов")
+    parser.add_argument("--no-cache", action="store_true", help="не использовать кэш ответов")
+    return parser.parse_args()
+
+
+async def main():
+    # Импорт после load_dotenv: настройки BULK_* читаются при импорте, ключи API — в конструкторе сервисов
+    from services.ai_integrations import ai_router
+    from services.bulk_runner import BULK_CONCURRENCY, BulkRunner
+    from services.http_pool import http_clients
+
+    args = parse_args(BULK_CONCURRENCY)
+    output = args.output or f"{os.path.splitext(args.input)[0]}.results.jsonl"
+
+    runner = BulkRunner(ai_router, concurrency=args.concurrency, use_cache=not args.no_cache)
+    try:
+        stats = await runner.run(args.input, output, default_agent=args.agent, limit=args.limit)
+    finally:
+        await http_clients.aclose()
+
+    print(json.dumps(stats.summary(), ensure_ascii=False, indent=2))
+    print(f"✅ Результаты: {output}")
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
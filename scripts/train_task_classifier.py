@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Обучение TaskClassifier на журнале делегирований.
+
+    curl -s localhost:8000/api/delegations/export > delegations.jsonl
+    PYTHONPATH=. python scripts/train_task_classifier.py delegations.jsonl [-o data/task_classifier.npz]
+
+Строка входа: {"message": ..., "to_agent": ..., "complexity": ...}
+(также понимает task/text и agent). Модель подхватывается DelegationEngine
+при старте из DELEGATION_CLASSIFIER_PATH.
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+from src.delegation.engine.task_classifier import CLASSIFIER_PATH, TaskClassifier
+
+
+def load_examples(path: str):
+    examples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            text = record.get("message") or record.get("task") or record.get("text")
+            agent = record.get("to_agent") or record.get("agent")
+            if text and agent:
+                examples.append({"text": text, "agent": agent, "complexity": record.get("complexity")})
+    return examples
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train delegation task classifier")
+    parser.add_argument("input", help="JSONL журнал делегирований")
+    parser.add_argument("-o", "--output", default=CLASSIFIER_PATH)
+    parser.add_argument("-e", "--epochs", type=int, default=15)
+    parser.add_argument("--holdout", type=float, default=0.2, help="доля примеров для проверки точности")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    examples = load_examples(args.input)
+    if not examples:
+        raise SystemExit("❌ Нет примеров с message и to_agent")
+
+    random.Random(0).shuffle(examples)
+    split = int(len(examples) * (1 - args.holdout)) if len(examples) >= 10 else len(examples)
+    train, test = examples[:split], examples[split:]
+
+    classifier = TaskClassifier.train(train, epochs=args.epochs)
+    if not classifier.heads:
+        raise SystemExit("❌ Нужно минимум два разных агента в выборке")
+
+    report = {"train": len(train), "test": len(test), "heads": list(classifier.heads)}
+    for name in classifier.heads:
+        labelled = [e for e in test if e.get(name)]
+        if labelled:
+            correct = sum(classifier.predict(e["text"])[name][0] == e[name] for e in labelled)
+            report[f"{name}_accuracy"] = round(correct / len(labelled), 4)
+
+    started = time.perf_counter()
+    for example in examples[:1000]:
+        classifier.predict(example["text"])
+    report["predict_us"] = round((time.perf_counter() - started) / min(len(examples), 1000) * 1e6, 1)
+
+    classifier.save(args.output)
+    report["size_kb"] = round(os.path.getsize(args.output) / 1024, 1)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    print(f"✅ Модель: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+# services/agent_metrics.py
+"""
+Метрики агентов по реальным вызовам AIServiceRouter.route: гистограммы задержек
+с фиксированными логарифмическими корзинами, токены и доля ошибок в скользящих окнах
+"""
+
+import os
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+
+# Границы корзин, мс: шаг ×√2 от 1 мс до ~2 мин; последняя корзина — все, что больше
+LATENCY_BUCKETS_MS: Tuple[float, ...] = tuple(round(2 ** (i / 2), 1) for i in range(35))
+
+METRICS_SLOT_SECONDS = int(os.getenv('AGENT_METRICS_SLOT_SECONDS', 10))
+# Окна отчета, секунд; история хранится на самое длинное
+METRICS_WINDOWS = tuple(int(w) for w in os.getenv('AGENT_METRICS_WINDOWS', '60,300,900').split(','))
+
+
+class LatencyHistogram:
+    """Счетчики по корзинам LATENCY_BUCKETS_MS + сумма для среднего"""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+
+    def record(self, latency_ms: float):
+        self.counts[bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+        self.count += 1
+        self.sum_ms += latency_ms
+
+    def merge(self, other: "LatencyHistogram"):
+        for index, value in enumerate(other.counts):
+            self.counts[index] += value
+        self.count += other.count
+        self.sum_ms += other.sum_ms
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Оценка квантиля: линейная интерполяция внутри корзины (ошибка не больше ее ширины)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, value in enumerate(self.counts):
+            if value and seen + value >= rank:
+                lower = LATENCY_BUCKETS_MS[index - 1] if index > 0 else 0.0
+                upper = LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else lower * 2
+                return round(lower + (upper - lower) * (rank - seen) / value, 1)
+            seen += value
+        return LATENCY_BUCKETS_MS[-1]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.sum_ms / self.count, 1) if self.count else None,
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99)
+        }
+
+
+class _Slot:
+    __slots__ = ("epoch", "requests", "errors", "cached", "input_tokens", "output_tokens", "histogram")
+
+    def __init__(self, epoch: int):
+        self.epoch = epoch
+        self.requests = 0
+        self.errors = 0
+        self.cached = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.histogram = LatencyHistogram()
+
+
+class AgentMetrics:
+    """Итоги с момента старта + кольцо слотов по METRICS_SLOT_SECONDS для скользящих окон"""
+
+    def __init__(self, slot_seconds: int = METRICS_SLOT_SECONDS, windows: Tuple[int, ...] = METRICS_WINDOWS):
+        self.slot_seconds = slot_seconds
+        self.windows = windows
+        self._slots: List[Optional[_Slot]] = [None] * (max(windows) // slot_seconds + 1)
+        self.histogram = LatencyHistogram()
+        self.requests = 0
+        self.errors = 0
+        self.cached = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def _slot(self, now: float) -> _Slot:
+        epoch = int(now // self.slot_seconds)
+        index = epoch % len(self._slots)
+        slot = self._slots[index]
+        if slot is None or slot.epoch != epoch:
+            slot = self._slots[index] = _Slot(epoch)
+        return slot
+
+    def record_request(self, latency_s: float, ok: bool, cached: bool = False, now: Optional[float] = None):
+        slot = self._slot(time.time() if now is None else now)
+        slot.requests += 1
+        self.requests += 1
+        if not ok:
+            slot.errors += 1
+            self.errors += 1
+        if cached:
+            # Ответы из кэша не описывают провайдера — в гистограмму не идут
+            slot.cached += 1
+            self.cached += 1
+            return
+        latency_ms = latency_s * 1000
+        slot.histogram.record(latency_ms)
+        self.histogram.record(latency_ms)
+
+    def record_tokens(self, input_tokens: int, output_tokens: int, now: Optional[float] = None):
+        slot = self._slot(time.time() if now is None else now)
+        slot.input_tokens += input_tokens
+        slot.output_tokens += output_tokens
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+
+    def window(self, seconds: int, now: Optional[float] = None) -> Dict[str, Any]:
+        """Сводка за последние seconds (с точностью до слота)"""
+        now = time.time() if now is None else now
+        current = int(now // self.slot_seconds)
+        oldest = current - seconds // self.slot_seconds + 1
+        histogram = LatencyHistogram()
+        requests = errors = cached = input_tokens = output_tokens = 0
+        for slot in self._slots:
+            if slot is None or not oldest <= slot.epoch <= current:
+                continue
+            requests += slot.requests
+            errors += slot.errors
+            cached += slot.cached
+            input_tokens += slot.input_tokens
+            output_tokens += slot.output_tokens
+            histogram.merge(slot.histogram)
+        return {
+            "requests": requests,
+            "errors": errors,
+            "error_rate": round(errors / requests, 4) if requests else 0.0,
+            "cached": cached,
+            "tokens_per_second": round((input_tokens + output_tokens) / seconds, 2),
+            "output_tokens_per_second": round(output_tokens / seconds, 2),
+            "latency": histogram.summary()
+        }
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "cached": self.cached,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "latency": self.histogram.summary(),
+            "windows": {f"{seconds}s": self.window(seconds, now) for seconds in self.windows}
+        }
+
+
+class MetricsCollector:
+    def __init__(self):
+        self.agents: Dict[str, AgentMetrics] = {}
+
+    def get(self, agent_id: str) -> AgentMetrics:
+        metrics = self.agents.get(agent_id)
+        if metrics is None:
+            metrics = self.agents[agent_id] = AgentMetrics()
+        return metrics
+
+    def record_request(self, agent_id: str, latency_s: float, ok: bool, cached: bool = False):
+        self.get(agent_id).record_request(latency_s, ok, cached)
+
+    def record_tokens(self, agent_id: str, input_tokens: int, output_tokens: int):
+        if input_tokens or output_tokens:
+            self.get(agent_id).record_tokens(input_tokens, output_tokens)
+
+    def agent_status(self, agent_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Измеренные response_time_ms / success_rate для AgentStatus по вызовам провайдера.
+        Кэш-хиты не учитываются; None — вызовов провайдера еще не было
+        """
+        metrics = self.agents.get(agent_id)
+        if metrics is None:
+            return None
+        recent = metrics.window(max(metrics.windows))
+        if recent["requests"] > recent["cached"]:
+            requests, errors, latency = recent["requests"] - recent["cached"], recent["errors"], recent["latency"]
+        elif metrics.requests > metrics.cached:
+            # В окне только ответы из кэша — берем итоги с момента старта
+            requests, errors, latency = metrics.requests - metrics.cached, metrics.errors, metrics.histogram.summary()
+        else:
+            return None
+        return {
+            "response_time_ms": latency["p50_ms"],
+            "success_rate": round(100.0 * (1 - errors / requests), 1)
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        return {agent_id: metrics.snapshot(now) for agent_id, metrics in self.agents.items()}
+
+
+# Глобальный сборщик метрик
+agent_metrics = MetricsCollector()
@@ -4,19 +4,87 @@
 """
 
 import asyncio
+import json
 import logging
 import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Any, AsyncIterator, List, Mapping, Optional
+
 import httpx
-from typing import Dict, Any
+
+from core.exceptions import CircuitOpenError, ProviderError
+from core.routing_rules import routing_rules
+from services.agent_metrics import agent_metrics
+from services.http_pool import http_clients
+from services.prometheus import PROVIDER_ERRORS, provider_series
+from services.rate_limiter import estimate_tokens, rate_limits
+from services.resilience import is_outage, resilience
+from services.response_cache import response_cache
+from services.routing_policy import RoutingPolicy
+from services.single_flight import SingleFlight
+from utils.logger import with_request_id
+from utils.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
+# Агенты, для которых одинаковые одновременные запросы объединяются
+SINGLE_FLIGHT_AGENTS = {
+    agent.strip() for agent in os.getenv('SINGLE_FLIGHT_AGENTS', 'claude,deepseek').split(',') if agent.strip()
+}
+
+# Дешевая модель Claude — fallback при деградации основной
+CLAUDE_FALLBACK_MODEL = os.getenv('CLAUDE_FALLBACK_MODEL', 'claude-3-haiku-20240307')
+
+@dataclass
+class Completion:
+    """Ответ провайдера с usage и заголовками (для лимитов)"""
+    text: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+    headers: Mapping[str, str] = field(default_factory=dict)
+    # Сбой потока: сервис отдает текст ошибки фрагментом, а причину кладет сюда
+    error: Optional[ProviderError] = None
+    
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+@dataclass
+class AgentReply:
+    """Ответ агента и backend, который его дал (None — никто не ответил)"""
+    text: str
+    backend: Optional[str] = None
+    cached: bool = False
+
+async def iter_sse_events(response) -> AsyncIterator[Dict[str, Any]]:
+    """Разбор Server-Sent Events потока провайдера в JSON события"""
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            break
+        try:
+            yield json.loads(data)
+        except ValueError:
+            logger.warning(f"Некорректное SSE событие: {data[:100]}")
+
+def stream_failed(usage: Optional["Completion"], error: ProviderError):
+    """Причина сбоя потока для роутера: breaker и лимиты backend'а"""
+    if usage is not None:
+        usage.error = error
+
 class ClaudeService:
     """Реальная интеграция с Claude API"""
     
-    def __init__(self):
+    provider = "claude"
+
+    def __init__(self, model: str = "claude-3-sonnet-20240229"):
         self.api_key = os.getenv('CLAUDE_API_KEY')
         self.base_url = "https://api.anthropic.com/v1"
+        self.model = model
+        self.params = {"max_tokens": 1000}
         self.headers = {
             "x-api-key": self.api_key,
             "content-type": "application/json",
@@ -25,46 +93,136 @@ class ClaudeService:
     
     async def send_message(self, message: str, context: str = "") -> str:
         """Отправка сообщения Claude"""
+        try:
+            completion = await self.complete(message, context)
+            return completion.text
+        except ProviderError as e:
+            return str(e)
+        except Exception as e:
+            logger.error(f"Claude API exception: {e}")
+            return f"❌ Ошибка Claude: {str(e)}"
+    
+    async def complete(self, message: str, context: str = "") -> "Completion":
+        """Запрос к Claude API; ошибки поднимаются как ProviderError"""
         if not self.api_key:
-            return "❌ Claude API ключ не настроен"
+            raise ProviderError(self.provider, "❌ Claude API ключ не настроен")
         
         try:
-            async with httpx.AsyncClient() as client:
-                payload = {
-                    "model": "claude-3-sonnet-20240229",
-                    "max_tokens": 1000,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": f"{context}\n\n{message}" if context else message
-                        }
-                    ]
-                }
-                
-                response = await client.post(
-                    f"{self.base_url}/messages",
-                    headers=self.headers,
-                    json=payload,
-                    timeout=30.0
-                )
+            client = http_clients.get(self.provider)
+            payload = self._build_payload(message, context)
+            
+            response = await client.post(
+                f"{self.base_url}/messages",
+                headers=with_request_id(self.headers),
+                json=payload
+            )
+        except httpx.HTTPError as e:
+            logger.error(f"Claude API exception: {e}")
+            raise ProviderError(
+                self.provider,
+                f"❌ Ошибка Claude: {str(e)}",
+                transient=isinstance(e, httpx.TransportError)
+            ) from e
+        
+        if response.status_code != 200:
+            logger.error(f"Claude API error: {response.status_code} - {response.text}")
+            raise ProviderError(
+                self.provider,
+                f"❌ Claude API ошибка: {response.status_code}",
+                status_code=response.status_code,
+                headers=response.headers
+            )
+        
+        data = response.json()
+        usage = data.get('usage') or {}
+        return Completion(
+            text=data['content'][0]['text'],
+            input_tokens=usage.get('input_tokens', 0),
+            output_tokens=usage.get('output_tokens', 0),
+            headers=response.headers
+        )
+    
+    async def stream_message(self, message: str, context: str = "",
+                             usage: Optional[Completion] = None) -> AsyncIterator[str]:
+        """Потоковая отправка сообщения Claude (messages stream); usage заполняется по событиям потока"""
+        if not self.api_key:
+            yield "❌ Claude API ключ не настроен"
+            return
+        
+        try:
+            client = http_clients.get(self.provider)
+            payload = self._build_payload(message, context, stream=True)
+            
+            async with client.stream(
+                "POST",
+                f"{self.base_url}/messages",
+                headers=with_request_id(self.headers),
+                json=payload
+            ) as response:
+                if response.status_code != 200:
+                    body = await response.aread()
+                    logger.error(f"Claude API error: {response.status_code} - {body.decode(errors='replace')}")
+                    text = f"❌ Claude API ошибка: {response.status_code}"
+                    stream_failed(usage, ProviderError(self.provider, text, status_code=response.status_code,
+                                                       headers=response.headers))
+                    yield text
+                    return
+                if usage is not None:
+                    usage.headers = response.headers
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    return data['content'][0]['text']
-                else:
-                    logger.error(f"Claude API error: {response.status_code} - {response.text}")
-                    return f"❌ Claude API ошибка: {response.status_code}"
-                    
+                async for event in iter_sse_events(response):
+                    event_type = event.get("type")
+                    if event_type == "message_start" and usage is not None:
+                        usage.input_tokens = ((event.get("message") or {}).get("usage") or {}).get("input_tokens", 0)
+                    elif event_type == "message_delta" and usage is not None:
+                        usage.output_tokens = (event.get("usage") or {}).get("output_tokens", usage.output_tokens)
+                    elif event_type == "content_block_delta":
+                        text = event.get("delta", {}).get("text")
+                        if text:
+                            yield text
+                    elif event_type == "message_stop":
+                        break
+                    elif event_type == "error":
+                        logger.error(f"Claude stream error: {event.get('error')}")
+                        text = f"❌ Claude API ошибка: {event.get('error', {}).get('type', 'stream')}"
+                        # Ошибка посреди потока (overloaded_error и т.п.) — сбой провайдера
+                        stream_failed(usage, ProviderError(self.provider, text, transient=True))
+                        yield text
+                        return
+                        
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            logger.error(f"Claude API exception: {e}")
-            return f"❌ Ошибка Claude: {str(e)}"
+            logger.error(f"Claude API stream exception: {e}")
+            text = f"❌ Ошибка Claude: {str(e)}"
+            stream_failed(usage, ProviderError(self.provider, text, transient=isinstance(e, httpx.TransportError)))
+            yield text
+    
+    def _build_payload(self, message: str, context: str, stream: bool = False) -> Dict[str, Any]:
+        payload = {
+            "model": self.model,
+            **self.params,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": f"{context}\n\n{message}" if context else message
+                }
+            ]
+        }
+        if stream:
+            payload["stream"] = True
+        return payload
 
 class DeepSeekService:
     """Реальная интеграция с DeepSeek API"""
     
+    provider = "deepseek"
+
     def __init__(self):
         self.api_key = os.getenv('DEEPSEEK_API_KEY')
         self.base_url = "https://api.deepseek.com/v1"
+        self.model = "deepseek-coder"
+        self.params = {"max_tokens": 2000, "temperature": 0.1}
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
@@ -72,53 +230,136 @@ class DeepSeekService:
     
     async def send_message(self, message: str, context: str = "") -> str:
         """Отправка сообщения DeepSeek"""
+        try:
+            completion = await self.complete(message, context)
+            return completion.text
+        except ProviderError as e:
+            return str(e)
+        except Exception as e:
+            logger.error(f"DeepSeek API exception: {e}")
+            return f"❌ Ошибка DeepSeek: {str(e)}"
+    
+    async def complete(self, message: str, context: str = "") -> "Completion":
+        """Запрос к DeepSeek API; ошибки поднимаются как ProviderError"""
         if not self.api_key:
-            return "❌ DeepSeek API ключ не настроен"
+            raise ProviderError(self.provider, "❌ DeepSeek API ключ не настроен")
         
         try:
-            async with httpx.AsyncClient() as client:
-                payload = {
-                    "model": "deepseek-coder",
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": "Ты - опытный разработчик и архитектор ПО. Отвечай на русском языке, предоставляй практические решения и код."
-                        },
-                        {
-                            "role": "user", 
-                            "content": f"{context}\n\n{message}" if context else message
-                        }
-                    ],
-                    "max_tokens": 2000,
-                    "temperature": 0.1
-                }
-                
-                response = await client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=self.headers,
-                    json=payload,
-                    timeout=30.0
-                )
+            client = http_clients.get(self.provider)
+            payload = self._build_payload(message, context)
+            
+            response = await client.post(
+                f"{self.base_url}/chat/completions",
+                headers=with_request_id(self.headers),
+                json=payload
+            )
+        except httpx.HTTPError as e:
+            logger.error(f"DeepSeek API exception: {e}")
+            raise ProviderError(
+                self.provider,
+                f"❌ Ошибка DeepSeek: {str(e)}",
+                transient=isinstance(e, httpx.TransportError)
+            ) from e
+        
+        if response.status_code != 200:
+            logger.error(f"DeepSeek API error: {response.status_code} - {response.text}")
+            raise ProviderError(
+                self.provider,
+                f"❌ DeepSeek API ошибка: {response.status_code}",
+                status_code=response.status_code,
+                headers=response.headers
+            )
+        
+        data = response.json()
+        usage = data.get('usage') or {}
+        return Completion(
+            text=data['choices'][0]['message']['content'],
+            input_tokens=usage.get('prompt_tokens', 0),
+            output_tokens=usage.get('completion_tokens', 0),
+            headers=response.headers
+        )
+    
+    async def stream_message(self, message: str, context: str = "",
+                             usage: Optional[Completion] = None) -> AsyncIterator[str]:
+        """Потоковая отправка сообщения DeepSeek (stream: true); usage приходит последним событием"""
+        if not self.api_key:
+            yield "❌ DeepSeek API ключ не настроен"
+            return
+        
+        try:
+            client = http_clients.get(self.provider)
+            payload = self._build_payload(message, context, stream=True)
+            
+            async with client.stream(
+                "POST",
+                f"{self.base_url}/chat/completions",
+                headers=with_request_id(self.headers),
+                json=payload
+            ) as response:
+                if response.status_code != 200:
+                    body = await response.aread()
+                    logger.error(f"DeepSeek API error: {response.status_code} - {body.decode(errors='replace')}")
+                    text = f"❌ DeepSeek API ошибка: {response.status_code}"
+                    stream_failed(usage, ProviderError(self.provider, text, status_code=response.status_code,
+                                                       headers=response.headers))
+                    yield text
+                    return
+                if usage is not None:
+                    usage.headers = response.headers
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    return data['choices'][0]['message']['content']
-                else:
-                    logger.error(f"DeepSeek API error: {response.status_code} - {response.text}")
-                    return f"❌ DeepSeek API ошибка: {response.status_code}"
-                    
+                # После finish_reason читаем до [DONE]: include_usage шлет usage отдельным событием
+                async for event in iter_sse_events(response):
+                    if event.get("usage") and usage is not None:
+                        usage.input_tokens = event["usage"].get("prompt_tokens", 0)
+                        usage.output_tokens = event["usage"].get("completion_tokens", 0)
+                    choices = event.get("choices") or []
+                    if not choices:
+                        continue
+                    text = (choices[0].get("delta") or {}).get("content")
+                    if text:
+                        yield text
+                        
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            logger.error(f"DeepSeek API exception: {e}")
-            return f"❌ Ошибка DeepSeek: {str(e)}"
+            logger.error(f"DeepSeek API stream exception: {e}")
+            text = f"❌ Ошибка DeepSeek: {str(e)}"
+            stream_failed(usage, ProviderError(self.provider, text, transient=isinstance(e, httpx.TransportError)))
+            yield text
+    
+    def _build_payload(self, message: str, context: str, stream: bool = False) -> Dict[str, Any]:
+        payload = {
+            "model": self.model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "Ты - опытный разработчик и архитектор ПО. Отвечай на русском языке, предоставляй практические решения и код."
+                },
+                {
+                    "role": "user", 
+                    "content": f"{context}\n\n{message}" if context else message
+                }
+            ],
+            **self.params
+        }
+        if stream:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
+        return payload
 
 class DashkaService:
     """Dashka - координатор команды (логика на основе правил)"""
     
+    provider = "internal"
+    model = "rules"
+    params: Dict[str, Any] = {}
+    
     async def send_message(self, message: str, context: str = "") -> str:
         """Обработка сообщения Dashka"""
         
         # Анализ типа задачи
-        if any(word in message.lower() for word in ['код', 'программ', 'функци', 'класс', 'api']):
+        categories = routing_rules.match(message)
+        if 'dashka:technical' in categories:
             return (
                 "🤖 **Dashka:** Вижу техническую задачу!\n\n"
                 "📋 **Мой план:**\n"
@@ -128,7 +369,7 @@ class DashkaService:
                 "⚡ **Действие:** Направляю задачу команде разработки!"
             )
         
-        elif any(word in message.lower() for word in ['анализ', 'план', 'стратег', 'архитектур']):
+        elif 'dashka:analytical' in categories:
             return (
                 "🤖 **Dashka:** Это аналитическая задача!\n\n"
                 "🧠 **Решение:** Направляю Claude для глубокого анализа\n"
@@ -145,6 +386,14 @@ class DashkaService:
                 "- Ответственный: Назначается\n\n"
                 "⏳ **Статус:** В обработке командой AI Pipeline"
             )
+    
+    async def complete(self, message: str, context: str = "") -> Completion:
+        return Completion(text=await self.send_message(message, context))
+    
+    async def stream_message(self, message: str, context: str = "",
+                             usage: Optional[Completion] = None) -> AsyncIterator[str]:
+        """Dashka отвечает сразу целиком — поток из одного фрагмента"""
+        yield await self.send_message(message, context)
 
 class AIServiceRouter:
     """Роутер для выбора правильного AI сервиса"""
@@ -159,28 +408,290 @@ class AIServiceRouter:
             'deepseek': self.deepseek,
             'dashka': self.dashka
         }
+        
+        # Backend'ы для failover: основные сервисы агентов и дешевые модели
+        self.backends = {
+            **self.services,
+            'claude-haiku': ClaudeService(model=CLAUDE_FALLBACK_MODEL)
+        }
+        
+        self.single_flight = SingleFlight()
+        self.policy = RoutingPolicy()
     
-    async def route_message(self, message: str, agent_id: str, context: str = "") -> str:
+    async def route_message(self, message: str, agent_id: str, context: str = "",
+                            use_cache: bool = True, user_id: str = "default") -> str:
         """Маршрутизация сообщения к соответствующему AI"""
-        
+        reply = await self.route(message, agent_id, context, use_cache=use_cache, user_id=user_id)
+        return reply.text
+    
+    async def route(self, message: str, agent_id: str, context: str = "",
+                    use_cache: bool = True, user_id: str = "default") -> AgentReply:
+        """Маршрутизация с failover: ответ и backend, который его дал"""
+        started = time.perf_counter()
+        with tracer.span("ai.route", {"ai.agent": agent_id, "ai.use_cache": use_cache}) as span:
+            reply = await self._route(message, agent_id, context, use_cache, user_id)
+            span.set_attributes({"ai.backend": reply.backend, "ai.cached": reply.cached})
+            if reply.backend is None:
+                span.set_status("error", reply.text[:200])
+        if agent_id in self.services:
+            agent_metrics.record_request(
+                agent_id, time.perf_counter() - started, ok=reply.backend is not None, cached=reply.cached
+            )
+        return reply
+    
+    async def _route(self, message: str, agent_id: str, context: str,
+                     use_cache: bool, user_id: str) -> AgentReply:
         service = self.services.get(agent_id)
         if not service:
-            return f"❌ Неизвестный агент: {agent_id}"
+            return AgentReply(f"❌ Неизвестный агент: {agent_id}")
         
         try:
             # Добавляем информацию об агенте в контекст
             agent_context = f"[Агент: {agent_id.upper()}] {context}"
             
-            response = await service.send_message(message, agent_context)
+            request_key = response_cache.make_key(agent_id, service.model, service.params, agent_context, message)
+            cache_enabled = use_cache and response_cache.is_enabled(agent_id)
+            
+            if cache_enabled:
+                with tracer.span("cache.lookup") as span:
+                    cached = await response_cache.get(request_key)
+                    span.set_attribute("cache.hit", cached is not None)
+                if cached is not None:
+                    logger.info(f"AI Route: {agent_id} | cache hit | Response length: {len(cached)}")
+                    return AgentReply(cached, backend=agent_id, cached=True)
+            
+            async def call_provider() -> AgentReply:
+                reply = await self._complete_with_failover(agent_id, message, agent_context, user_id)
+                # Кэшируем только ответы основного backend'а, ошибки — никогда
+                if cache_enabled and reply.backend == agent_id and not reply.text.startswith("❌"):
+                    await response_cache.set(request_key, reply.text)
+                return reply
+            
+            # Одинаковые одновременные запросы ждут один вызов провайдера
+            if use_cache and agent_id in SINGLE_FLIGHT_AGENTS:
+                # Ведомые ждут чужой вызов: в их трассе этот спан без дочерних спанов провайдера
+                with tracer.span("single_flight.wait"):
+                    reply = await self.single_flight.do(request_key, call_provider)
+            else:
+                reply = await call_provider()
             
             # Логируем использование
-            logger.info(f"AI Route: {agent_id} | Message length: {len(message)} | Response length: {len(response)}")
+            logger.info(f"AI Route: {agent_id} → {reply.backend} | Message length: {len(message)} | Response length: {len(reply.text)}")
             
-            return response
+            return reply
             
         except Exception as e:
             logger.error(f"AI routing error for {agent_id}: {e}")
-            return f"❌ Ошибка обработки сообщения агентом {agent_id}: {str(e)}"
+            return AgentReply(f"❌ Ошибка обработки сообщения агентом {agent_id}: {str(e)}")
+    
+    async def stream_message(self, message: str, agent_id: str, context: str = "",
+                             use_cache: bool = True, user_id: str = "default",
+                             reply: Optional[AgentReply] = None) -> AsyncIterator[str]:
+        """
+        Потоковая маршрутизация: фрагменты ответа по мере генерации.
+        reply после потока — собранный текст и backend, который ответил (None — сбой)
+        """
+        started = time.perf_counter()
+        # backend/cached заполняет _stream
+        reply = reply if reply is not None else AgentReply("")
+        chunks = []
+        async for chunk in self._stream(message, agent_id, context, use_cache, user_id, reply):
+            chunks.append(chunk)
+            yield chunk
+        reply.text = "".join(chunks)
+        # Поток, брошенный клиентом, сюда не доходит и в метрики не попадает
+        if agent_id in self.services:
+            agent_metrics.record_request(
+                agent_id, time.perf_counter() - started, ok=reply.backend is not None, cached=reply.cached
+            )
+    
+    async def _stream(self, message: str, agent_id: str, context: str, use_cache: bool, user_id: str,
+                      reply: AgentReply) -> AsyncIterator[str]:
+        if agent_id not in self.services:
+            yield f"❌ Неизвестный агент: {agent_id}"
+            return
+        
+        response_length = 0
+        try:
+            agent_context = f"[Агент: {agent_id.upper()}] {context}"
+            
+            primary = self.services[agent_id]
+            cache_key = None
+            if use_cache and response_cache.is_enabled(agent_id):
+                cache_key = response_cache.make_key(agent_id, primary.model, primary.params, agent_context, message)
+                with tracer.span("cache.lookup") as span:
+                    cached = await response_cache.get(cache_key)
+                    span.set_attribute("cache.hit", cached is not None)
+                if cached is not None:
+                    reply.backend, reply.cached = agent_id, True
+                    yield cached
+                    return
+            
+            # Поток после первого фрагмента не переключить — backend выбираем заранее
+            backend = self._candidates(agent_id)[0]
+            service = self.backends[backend]
+            if backend != agent_id:
+                self.policy.failovers += 1
+                logger.warning(f"🔀 AI Stream: {agent_id} → {backend}")
+                cache_key = None
+            
+            caller = resilience.get(backend)
+            if caller is not None and not caller.breaker.allow():
+                # Поток не повторяем, но при открытом breaker сразу отказываем
+                PROVIDER_ERRORS.labels(backend, "circuit_open").inc()
+                yield f"❌ Провайдер {service.provider} временно недоступен, попробуйте позже"
+                return
+            
+            chunks = []
+            usage = Completion("")
+            started = time.monotonic()
+            governor = rate_limits.get(backend)
+            outcome_recorded = False
+            try:
+                if governor is None:
+                    async for chunk in service.stream_message(message, agent_context, usage=usage):
+                        response_length += len(chunk)
+                        chunks.append(chunk)
+                        yield chunk
+                else:
+                    tokens = estimate_tokens(message, agent_context, service.params)
+                    async with governor.acquire(user_id, tokens) as permit:
+                        async for chunk in service.stream_message(message, agent_context, usage=usage):
+                            response_length += len(chunk)
+                            chunks.append(chunk)
+                            yield chunk
+                        if usage.total_tokens:
+                            permit.used_tokens = usage.total_tokens
+                
+                elapsed = time.monotonic() - started
+                response = "".join(chunks)
+                error = usage.error
+                failed = error is not None or response.startswith("❌")
+                # Как и в _complete: 429/retry-after тормозят governor, сбои провайдера открывают breaker
+                if governor is not None:
+                    if error is not None:
+                        governor.observe(error.status_code, error.headers)
+                    elif not failed:
+                        governor.observe(200, usage.headers)
+                if caller is not None:
+                    if failed and (error is None or is_outage(error)):
+                        caller.breaker.record_failure()
+                    else:
+                        # 4xx/429: провайдер отвечает
+                        caller.breaker.record_success()
+                outcome_recorded = True
+            finally:
+                if caller is not None and not outcome_recorded:
+                    # Клиент бросил поток — ни успех, ни сбой; пробный слот half_open освобождаем
+                    caller.breaker.release()
+            
+            if failed:
+                self.policy.record_failure(backend)
+                provider_series(backend).error.observe(elapsed)
+                status = str(error.status_code) if error is not None and error.status_code else "stream"
+                PROVIDER_ERRORS.labels(backend, status).inc()
+            else:
+                self.policy.record_success(backend, elapsed)
+                series = provider_series(backend)
+                series.ok.observe(elapsed)
+                series.input_tokens.inc(usage.input_tokens)
+                series.output_tokens.inc(usage.output_tokens)
+                agent_metrics.record_tokens(agent_id, usage.input_tokens, usage.output_tokens)
+                reply.backend = backend
+                if cache_key and response:
+                    await response_cache.set(cache_key, response)
+            
+            logger.info(f"AI Stream: {agent_id} → {backend} | Message length: {len(message)} | Response length: {response_length}")
+            
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"AI streaming error for {agent_id}: {e}")
+            yield f"❌ Ошибка обработки сообщения агентом {agent_id}: {str(e)}"
+    
+    def _candidates(self, agent_id: str) -> List[str]:
+        return self.policy.candidates(agent_id, self.backends, self._backend_available)
+    
+    def _backend_available(self, name: str) -> bool:
+        service = self.backends[name]
+        if not getattr(service, "api_key", True):
+            return False
+        # Breaker — на backend (модель), а не на провайдера: fallback-модель доступна при открытом основном
+        caller = resilience.get(name)
+        return caller is None or caller.breaker.state != caller.breaker.OPEN
+    
+    async def _complete_with_failover(self, agent_id: str, message: str, agent_context: str,
+                                      user_id: str) -> AgentReply:
+        """Backend'ы по порядку политики, пока один не ответит"""
+        first_error: Optional[ProviderError] = None
+        
+        for backend in self._candidates(agent_id):
+            service = self.backends[backend]
+            started = time.monotonic()
+            try:
+                # Повторы, hedging и ожидание лимитов backend'а — внутри этого спана
+                with tracer.span("ai.backend", {"ai.backend": backend, "gen_ai.request.model": service.model}):
+                    completion = await self._complete(backend, service, message, agent_context, user_id)
+            except ProviderError as e:
+                if not isinstance(e, CircuitOpenError):
+                    self.policy.record_failure(backend)
+                    provider_series(backend).error.observe(time.monotonic() - started)
+                status = "circuit_open" if isinstance(e, CircuitOpenError) else str(e.status_code or "transport")
+                PROVIDER_ERRORS.labels(backend, status).inc()
+                first_error = first_error or e
+                logger.warning(f"🔀 AI Route: {agent_id} | backend {backend} недоступен: {e}")
+                continue
+            
+            elapsed = time.monotonic() - started
+            self.policy.record_success(backend, elapsed)
+            series = provider_series(backend)
+            series.ok.observe(elapsed)
+            series.input_tokens.inc(completion.input_tokens)
+            series.output_tokens.inc(completion.output_tokens)
+            agent_metrics.record_tokens(agent_id, completion.input_tokens, completion.output_tokens)
+            if backend != agent_id:
+                self.policy.failovers += 1
+            return AgentReply(completion.text, backend=backend)
+        
+        return AgentReply(str(first_error))
+    
+    async def _complete(self, backend: str, service, message: str, agent_context: str,
+                        user_id: str) -> Completion:
+        """Вызов backend'а с повторами, hedging и circuit breaker"""
+        caller = resilience.get(backend)
+        if caller is None:
+            return await self._governed_complete(backend, service, message, agent_context, user_id)
+        return await caller.call(lambda: self._governed_complete(backend, service, message, agent_context, user_id))
+    
+    async def _governed_complete(self, backend: str, service, message: str, agent_context: str,
+                                 user_id: str) -> Completion:
+        """Одна попытка через лимиты backend'а (RPM/TPM, параллельность, очередь по пользователям)"""
+        governor = rate_limits.get(backend)
+        if governor is None:
+            return await self._upstream_complete(service, message, agent_context)
+        
+        tokens = estimate_tokens(message, agent_context, service.params)
+        async with governor.acquire(user_id, tokens) as permit:
+            try:
+                completion = await self._upstream_complete(service, message, agent_context)
+            except ProviderError as e:
+                governor.observe(e.status_code, e.headers or {})
+                raise
+            governor.observe(200, completion.headers)
+            if completion.total_tokens:
+                permit.used_tokens = completion.total_tokens
+            return completion
+    
+    async def _upstream_complete(self, service, message: str, agent_context: str) -> Completion:
+        """HTTP вызов провайдера; TTFB (заголовки ответа) пишет event hook пула клиентов"""
+        attributes = {"gen_ai.system": service.provider, "gen_ai.request.model": service.model}
+        with tracer.span("ai.upstream", attributes, kind="client") as span:
+            completion = await service.complete(message, agent_context)
+            span.set_attributes({
+                "gen_ai.usage.input_tokens": completion.input_tokens,
+                "gen_ai.usage.output_tokens": completion.output_tokens
+            })
+            return completion
     
     async def get_agent_status(self) -> Dict[str, Any]:
         """Получение статуса всех агентов"""
@@ -190,18 +701,22 @@ class AIServiceRouter:
             if agent_id == 'claude':
                 status[agent_id] = {
                     "online": bool(self.claude.api_key),
-                    "type": "external_api"
+                    "type": "external_api",
+                    "circuit": resilience.get('claude').breaker.state
                 }
             elif agent_id == 'deepseek':
                 status[agent_id] = {
                     "online": bool(self.deepseek.api_key),
-                    "type": "external_api"
+                    "type": "external_api",
+                    "circuit": resilience.get('deepseek').breaker.state
                 }
             elif agent_id == 'dashka':
                 status[agent_id] = {
                     "online": True,
                     "type": "internal_logic"
                 }
+            # Измеренные по реальным вызовам задержка и доля успешных ответов
+            status[agent_id]["measured"] = agent_metrics.agent_status(agent_id)
         
         return status
 
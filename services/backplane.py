@@ -0,0 +1,194 @@
+# services/backplane.py
+"""
+Backplane для WebSocket доставок между воркерами и хостами
+"""
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+import os
+import socket
+import uuid
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# handler(kind, target, text): kind — "user" или "topic", text — готовый JSON кадр
+DeliveryHandler = Callable[[str, str, str], Awaitable[None]]
+
+
+class Backplane(ABC):
+    """Базовый интерфейс: публикация кадра и получение кадров других воркеров"""
+
+    def __init__(self):
+        self.origin = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._handler: Optional[DeliveryHandler] = None
+        # Адресаты с локальными сокетами: чужие кадры принимаем только для них
+        self.watched: Set[Tuple[str, str]] = set()
+
+    async def start(self, handler: DeliveryHandler):
+        self._handler = handler
+
+    async def watch(self, kind: str, target: str):
+        """Первый локальный сокет адресата: подписаться на его кадры"""
+        self.watched.add((kind, target))
+
+    async def unwatch(self, kind: str, target: str):
+        """Последний локальный сокет адресата ушел: отписаться"""
+        self.watched.discard((kind, target))
+
+    @abstractmethod
+    async def publish(self, kind: str, target: str, text: str):
+        """Отправить кадр адресату на других воркерах"""
+
+    async def stop(self):
+        self._handler = None
+
+
+class InProcessBroker:
+    """Общая шина для нескольких InProcessBackplane в одном процессе (тесты)"""
+
+    def __init__(self):
+        self.backplanes: List["InProcessBackplane"] = []
+
+
+class InProcessBackplane(Backplane):
+    """Backplane без внешних зависимостей: один процесс — один или несколько «воркеров»"""
+
+    def __init__(self, broker: Optional[InProcessBroker] = None):
+        super().__init__()
+        self.broker = broker or InProcessBroker()
+
+    async def start(self, handler: DeliveryHandler):
+        await super().start(handler)
+        self.broker.backplanes.append(self)
+
+    async def publish(self, kind: str, target: str, text: str):
+        for backplane in list(self.broker.backplanes):
+            if backplane is self or backplane._handler is None:
+                continue
+            if (kind, target) not in backplane.watched:
+                continue
+            try:
+                await backplane._handler(kind, target, text)
+            except Exception as e:
+                logger.error(f"Backplane delivery error: {e}")
+
+    async def stop(self):
+        if self in self.broker.backplanes:
+            self.broker.backplanes.remove(self)
+        await super().stop()
+
+
+class RedisBackplane(Backplane):
+    """
+    Redis pub/sub: канал несет адресата, сообщение — origin и кадр.
+    Подписка по каналу на каждого адресата с локальными сокетами,
+    а не на весь префикс: воркер не разбирает чужой трафик
+    """
+
+    def __init__(self, url: Optional[str] = None, prefix: str = "ai_pipeline:ws:"):
+        super().__init__()
+        self.url = url
+        self.prefix = prefix
+        self._redis = None
+        self._pubsub = None
+        self._subscribed: Optional[asyncio.Event] = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self, handler: DeliveryHandler):
+        from storage.redis.connector import get_async_redis
+
+        await super().start(handler)
+        self._redis = get_async_redis(self.url)
+        await self._redis.ping()
+        self._subscribed = asyncio.Event()
+        await self._open_pubsub()
+        self._listener = asyncio.create_task(self._listen())
+        logger.info(f"🔴 Redis backplane запущен: {self.origin}")
+
+    async def watch(self, kind: str, target: str):
+        # Подписка сразу при регистрации адресата: кадр, опубликованный после connect, не теряется
+        await super().watch(kind, target)
+        await self._pubsub_call("subscribe", self._channel(kind, target))
+
+    async def unwatch(self, kind: str, target: str):
+        await super().unwatch(kind, target)
+        await self._pubsub_call("unsubscribe", self._channel(kind, target))
+
+    async def publish(self, kind: str, target: str, text: str):
+        if self._redis is None:
+            return
+        try:
+            await self._redis.publish(self._channel(kind, target), f"{self.origin}\n{text}")
+        except Exception as e:
+            logger.error(f"Redis backplane publish error: {e}")
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        await self._close_pubsub()
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+        await super().stop()
+
+    def _channel(self, kind: str, target: str) -> str:
+        return f"{self.prefix}{kind}:{target}"
+
+    async def _pubsub_call(self, method: str, channel: str):
+        if self._pubsub is None:
+            # Нет соединения: слушатель подпишет весь watched после переподключения
+            return
+        try:
+            await getattr(self._pubsub, method)(channel)
+            if method == "subscribe":
+                self._subscribed.set()
+        except Exception as e:
+            logger.error(f"Redis backplane {method} error: {e}")
+
+    async def _open_pubsub(self):
+        self._pubsub = self._redis.pubsub()
+        channels = [self._channel(kind, target) for kind, target in self.watched]
+        if channels:
+            await self._pubsub.subscribe(*channels)
+            self._subscribed.set()
+
+    async def _close_pubsub(self):
+        pubsub, self._pubsub = self._pubsub, None
+        if self._subscribed is not None:
+            self._subscribed.clear()
+        if pubsub is not None:
+            try:
+                await pubsub.close()
+            except Exception:
+                pass
+
+    async def _listen(self):
+        while True:
+            try:
+                if self._pubsub is None:
+                    await self._open_pubsub()
+                if self._pubsub.connection is None:
+                    # Соединение pubsub открывается первой подпиской
+                    await self._subscribed.wait()
+                    continue
+                item = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if not item or item.get("type") != "message":
+                    continue
+                origin, _, text = item["data"].partition("\n")
+                if origin == self.origin:
+                    continue
+                kind, _, target = item["channel"][len(self.prefix):].partition(":")
+                try:
+                    await self._handler(kind, target, text)
+                except Exception as e:
+                    logger.error(f"Backplane delivery error: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Redis backplane connection lost: {e}")
+                await self._close_pubsub()
+                await asyncio.sleep(1.0)
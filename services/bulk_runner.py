@@ -0,0 +1,223 @@
+# services/bulk_runner.py
+"""
+Офлайн-прогон JSONL нагрузки через AIServiceRouter:
+потоковое чтение, параллельные воркеры, инкрементальная запись результатов и возобновление
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+BULK_CONCURRENCY = int(os.getenv('BULK_CONCURRENCY', 8))
+# fsync выходного файла каждые N результатов
+BULK_CHECKPOINT_EVERY = int(os.getenv('BULK_CHECKPOINT_EVERY', 50))
+
+# Поля с текстом запроса в порядке приоритета
+MESSAGE_FIELDS = ("message", "prompt", "body")
+ID_FIELDS = ("id", "request_id")
+
+
+@dataclass
+class BulkItem:
+    id: str
+    message: str
+    agent_id: str
+    context: str = ""
+
+
+def parse_item(line_no: int, data: Dict[str, Any], default_agent: str) -> BulkItem:
+    item_id = next((str(data[key]) for key in ID_FIELDS if data.get(key) is not None), f"line-{line_no}")
+    message = next((data[key] for key in MESSAGE_FIELDS if data.get(key)), None)
+    if message is None:
+        raise ValueError(f"line {line_no}: no message field ({', '.join(MESSAGE_FIELDS)})")
+    if data.get("title") and "message" not in data:
+        # Формат backlog'а: заголовок + описание
+        message = f"{data['title']}\n\n{message}"
+    return BulkItem(item_id, message, data.get("agent_id") or default_agent, data.get("context", ""))
+
+
+def iter_items(path: str, default_agent: str) -> Iterator[BulkItem]:
+    """Построчное чтение — файл целиком в память не загружается"""
+    with open(path, encoding="utf-8") as source:
+        for line_no, line in enumerate(source, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield parse_item(line_no, json.loads(line), default_agent)
+            except ValueError as e:
+                logger.warning(f"Пропуск строки {line_no}: {e}")
+
+
+def load_completed(output_path: str) -> Set[str]:
+    """
+    id успешно выполненных элементов из прошлых запусков.
+    Недописанная последняя строка (падение посреди записи) обрезается.
+    """
+    if not os.path.exists(output_path):
+        return set()
+
+    with open(output_path, "rb+") as output:
+        data = output.read()
+        if data and not data.endswith(b"\n"):
+            output.truncate(data.rfind(b"\n") + 1)
+            data = data[:data.rfind(b"\n") + 1]
+
+    completed = set()
+    for line in data.decode("utf-8").splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if record.get("success"):
+            completed.add(record["id"])
+        else:
+            # Неуспешные повторяем при следующем запуске
+            completed.discard(record.get("id"))
+    return completed
+
+
+def percentile(ordered: List[float], q: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class RunStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.latencies: List[float] = []
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def record(self, seconds: float, success: bool):
+        self.latencies.append(seconds)
+        if success:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        ordered = sorted(self.latencies)
+        done = self.succeeded + self.failed
+
+        def ms(value: Optional[float]) -> Optional[float]:
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "processed": done,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "elapsed_s": round(elapsed, 2),
+            "throughput_per_s": round(done / elapsed, 2) if elapsed > 0 else 0.0,
+            "latency_ms": {
+                "p50": ms(percentile(ordered, 0.50)),
+                "p90": ms(percentile(ordered, 0.90)),
+                "p95": ms(percentile(ordered, 0.95)),
+                "p99": ms(percentile(ordered, 0.99)),
+                "max": ms(ordered[-1] if ordered else None)
+            }
+        }
+
+
+class BulkRunner:
+    """Воркеры берут элементы из ограниченной очереди; результат пишется сразу после ответа"""
+
+    def __init__(self, router, concurrency: int = BULK_CONCURRENCY, use_cache: bool = True,
+                 user_id: str = "bulk", checkpoint_every: int = BULK_CHECKPOINT_EVERY):
+        self.router = router
+        self.concurrency = max(1, concurrency)
+        self.use_cache = use_cache
+        self.user_id = user_id
+        self.checkpoint_every = max(1, checkpoint_every)
+
+    async def run(self, input_path: str, output_path: str, default_agent: str = "deepseek",
+                  limit: Optional[int] = None) -> RunStats:
+        stats = RunStats()
+        completed = load_completed(output_path)
+        if completed:
+            logger.info(f"♻️ Возобновление: уже выполнено {len(completed)}")
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        with open(output_path, "a", encoding="utf-8") as output:
+            unsynced = 0
+
+            def write(record: Dict[str, Any]):
+                nonlocal unsynced
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+                unsynced += 1
+                if unsynced >= self.checkpoint_every:
+                    os.fsync(output.fileno())
+                    unsynced = 0
+
+            async def worker():
+                while True:
+                    item = await queue.get()
+                    try:
+                        if item is None:
+                            return
+                        write(await self._process(item, stats))
+                    finally:
+                        queue.task_done()
+
+            async def produce():
+                queued = 0
+                for item in iter_items(input_path, default_agent):
+                    if item.id in completed:
+                        stats.skipped += 1
+                        continue
+                    if limit is not None and queued >= limit:
+                        break
+                    await queue.put(item)
+                    queued += 1
+                for _ in workers:
+                    await queue.put(None)
+
+            workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+            # Продюсер вместе с воркерами: если воркер упал (например, ошибка записи),
+            # gather поднимет ошибку, а не оставит продюсера ждать место в очереди
+            producer = asyncio.create_task(produce())
+            try:
+                await asyncio.gather(producer, *workers)
+            finally:
+                for task in (producer, *workers):
+                    task.cancel()
+                await asyncio.gather(producer, *workers, return_exceptions=True)
+                output.flush()
+                os.fsync(output.fileno())
+
+        stats.finished = time.perf_counter()
+        return stats
+
+    async def _process(self, item: BulkItem, stats: RunStats) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            reply = await self.router.route(
+                item.message, item.agent_id, item.context,
+                use_cache=self.use_cache, user_id=self.user_id
+            )
+            success = reply.backend is not None
+            record = {"id": item.id, "agent_id": item.agent_id, "backend": reply.backend,
+                      "success": success, "response": reply.text}
+            if not success:
+                record["error"] = reply.text
+        except Exception as e:
+            success = False
+            record = {"id": item.id, "agent_id": item.agent_id, "backend": None,
+                      "success": False, "error": str(e)}
+        latency = time.perf_counter() - started
+        record["latency_ms"] = round(latency * 1000, 1)
+        stats.record(latency, success)
+        return record
@@ -0,0 +1,119 @@
+# services/http_pool.py
+"""
+Общий пул HTTP-клиентов для внешних AI API
+"""
+
+import logging
+import os
+from dataclasses import dataclass, fields
+from typing import Dict
+
+import httpx
+
+from utils.tracing import trace_request_hook, trace_response_hook
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+@dataclass
+class PoolConfig:
+    """Лимиты пула соединений одного провайдера"""
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    connect_timeout: float = 5.0
+    read_timeout: float = 30.0
+    write_timeout: float = 10.0
+    pool_timeout: float = 5.0
+    http2: bool = True
+
+    @classmethod
+    def from_env(cls, provider: str) -> "PoolConfig":
+        """Чтение лимитов из .env: сначала CLAUDE_HTTP_*, затем общие AI_HTTP_*"""
+        config = cls()
+        for field in fields(cls):
+            suffix = field.name.upper()
+            value = os.getenv(f"{provider.upper()}_HTTP_{suffix}", os.getenv(f"AI_HTTP_{suffix}"))
+            if value is None:
+                continue
+            if isinstance(field.default, bool):
+                setattr(config, field.name, value.lower() in ("1", "true", "yes"))
+            else:
+                setattr(config, field.name, type(field.default)(value))
+        return config
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry
+        )
+
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(
+            connect=self.connect_timeout,
+            read=self.read_timeout,
+            write=self.write_timeout,
+            pool=self.pool_timeout
+        )
+
+
+class HTTPClientPool:
+    """Долгоживущие httpx.AsyncClient — по одному на провайдера"""
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._configs: Dict[str, PoolConfig] = {}
+
+    def configure(self, provider: str, config: PoolConfig):
+        """Задать лимиты провайдера (до первого запроса)"""
+        self._configs[provider] = config
+
+    def get(self, provider: str) -> httpx.AsyncClient:
+        """Клиент провайдера; создается лениво, если пул еще не запущен"""
+        client = self._clients.get(provider)
+        if client is None or client.is_closed:
+            client = self._create_client(provider)
+            self._clients[provider] = client
+        return client
+
+    async def start(self, *providers: str):
+        """Прогрев клиентов при старте приложения"""
+        for provider in providers:
+            self.get(provider)
+        logger.info(f"🌐 HTTP пул запущен: {', '.join(providers)} (HTTP/2: {HTTP2_AVAILABLE})")
+
+    async def aclose(self):
+        """Закрытие всех соединений при остановке приложения"""
+        clients = list(self._clients.items())
+        self._clients.clear()
+        for provider, client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.error(f"Ошибка закрытия HTTP клиента {provider}: {e}")
+        if clients:
+            logger.info("🌐 HTTP пул закрыт")
+
+    def _create_client(self, provider: str) -> httpx.AsyncClient:
+        config = self._configs.get(provider)
+        if config is None:
+            config = PoolConfig.from_env(provider)
+            self._configs[provider] = config
+        return httpx.AsyncClient(
+            limits=config.limits(),
+            timeout=config.timeout(),
+            http2=config.http2 and HTTP2_AVAILABLE,
+            # traceparent к провайдеру и TTFB в текущий спан (при выключенной трассировке — no-op)
+            event_hooks={"request": [trace_request_hook], "response": [trace_response_hook]}
+        )
+
+
+# Глобальный пул клиентов
+http_clients = HTTPClientPool()
@@ -0,0 +1,115 @@
+# services/job_queue.py
+"""
+Очередь параллельных задач агентов для одного WebSocket соединения
+"""
+
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Dict
+
+from utils.logger import request_context
+from utils.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENT_JOBS_PER_USER = int(os.getenv('WS_MAX_CONCURRENT_JOBS', 4))
+MAX_PENDING_JOBS_PER_CONNECTION = int(os.getenv('WS_MAX_PENDING_JOBS', 16))
+
+
+class JobQueueFull(Exception):
+    """Превышен лимит задач в очереди соединения"""
+
+
+class UserConcurrencyLimiter:
+    """Общий лимит одновременных вызовов агентов на пользователя (все вкладки)"""
+
+    def __init__(self, limit: int = MAX_CONCURRENT_JOBS_PER_USER):
+        self.limit = limit
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        # Сколько соединений пользователя держат семафор
+        self._refs: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._semaphores)
+
+    def get(self, user_id: str) -> asyncio.Semaphore:
+        """Семафор пользователя для нового соединения; парный вызов — release(user_id)"""
+        semaphore = self._semaphores.get(user_id)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.limit)
+            self._semaphores[user_id] = semaphore
+        self._refs[user_id] = self._refs.get(user_id, 0) + 1
+        return semaphore
+
+    def release(self, user_id: str):
+        """Соединение закрыто: последний ушедший удаляет семафор, словарь не растет без предела"""
+        refs = self._refs.get(user_id, 0) - 1
+        if refs > 0:
+            self._refs[user_id] = refs
+            return
+        self._refs.pop(user_id, None)
+        self._semaphores.pop(user_id, None)
+
+
+class ConnectionJobQueue:
+    """Задачи в работе для одного соединения, адресуемые request_id клиента"""
+
+    def __init__(self, semaphore: asyncio.Semaphore, max_pending: int = MAX_PENDING_JOBS_PER_CONNECTION):
+        self.semaphore = semaphore
+        self.max_pending = max_pending
+        self._jobs: Dict[str, asyncio.Task] = {}
+
+    @property
+    def pending(self) -> int:
+        return len(self._jobs)
+
+    def submit(self, request_id: str, job: Callable[[], Awaitable[None]]) -> asyncio.Task:
+        """Поставить задачу в очередь; выполнение начнется при свободном слоте пользователя"""
+        if request_id in self._jobs:
+            raise ValueError(f"Duplicate request_id: {request_id}")
+        if len(self._jobs) >= self.max_pending:
+            raise JobQueueFull(f"Too many jobs in flight: {len(self._jobs)}")
+
+        # Задача наследует request id кадра: он уйдет в логи и в X-Request-ID к провайдерам
+        with request_context(request_id):
+            task = asyncio.create_task(self._run(request_id, job))
+        self._jobs[request_id] = task
+        return task
+
+    def cancel(self, request_id: str) -> bool:
+        """Отмена задачи; прерывает и запрос к провайдеру"""
+        task = self._jobs.get(request_id)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        return True
+
+    async def cancel_all(self):
+        """Отмена всех задач при закрытии соединения"""
+        tasks = list(self._jobs.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, request_id: str, job: Callable[[], Awaitable[None]]):
+        try:
+            # Кадр WebSocket — корень своей трассы: ожидание слота пользователя и сама задача
+            with tracer.span("ws.job", {"request.id": request_id}, root=True):
+                with tracer.span("ws.queue_wait"):
+                    await self.semaphore.acquire()
+                try:
+                    await job()
+                finally:
+                    self.semaphore.release()
+        except asyncio.CancelledError:
+            logger.info(f"WS job cancelled: {request_id}")
+        except Exception as e:
+            logger.error(f"WS job {request_id} failed: {e}")
+        finally:
+            self._jobs.pop(request_id, None)
+
+
+# Глобальный лимитер пользователей
+user_limiter = UserConcurrencyLimiter()
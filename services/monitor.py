@@ -1,84 +1,168 @@
 """
-Сервис мониторинга агентов
+Сервис мониторинга агентов: фоновые пробы по расписанию, история в кольцевом буфере,
+статус отдается из готового снимка без внешних вызовов
 """
 import asyncio
-import aiohttp
 import logging
+import os
+import random
+import time
+from array import array
 from datetime import datetime
-from typing import Dict, Any
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from services.http_pool import http_clients
 
 logger = logging.getLogger(__name__)
 
+MONITOR_INTERVAL = float(os.getenv('MONITOR_INTERVAL', 30))
+MONITOR_JITTER = float(os.getenv('MONITOR_JITTER', 0.1))  # доля интервала
+MONITOR_PROBE_TIMEOUT = float(os.getenv('MONITOR_PROBE_TIMEOUT', 5))
+MONITOR_HISTORY_SIZE = int(os.getenv('MONITOR_HISTORY_SIZE', 256))
+
+# Проба возвращает хотя бы {"is_online": bool}; задержку меряет планировщик
+Probe = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+class ProbeHistory:
+    """Последние N проб: задержки float32 и флаги успеха в кольцевых буферах"""
+
+    def __init__(self, size: int = MONITOR_HISTORY_SIZE):
+        self.size = size
+        self._latency = array('f', bytes(4 * size))
+        self._ok = bytearray(size)
+        self._next = 0
+        self.count = 0
+
+    def add(self, latency_ms: float, ok: bool):
+        self._latency[self._next] = latency_ms
+        self._ok[self._next] = ok
+        self._next = (self._next + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def summary(self) -> Dict[str, Any]:
+        if not self.count:
+            return {"samples": 0, "success_rate": 100.0, "p50_ms": None, "p95_ms": None, "p99_ms": None}
+        latencies = sorted(self._latency[:self.count])
+
+        def percentile(q: float) -> float:
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 1)
+
+        return {
+            "samples": self.count,
+            "success_rate": round(100.0 * sum(self._ok[:self.count]) / self.count, 1),
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99)
+        }
+
+
 class AgentMonitor:
-    def __init__(self):
-        self.agents_status = {}
-        self.check_interval = 30  # секунд
-        
+    def __init__(self, interval: float = MONITOR_INTERVAL, jitter: float = MONITOR_JITTER,
+                 probe_timeout: float = MONITOR_PROBE_TIMEOUT, history_size: int = MONITOR_HISTORY_SIZE):
+        self.check_interval = interval  # секунд
+        self.jitter = jitter
+        self.probe_timeout = probe_timeout
+        self.history_size = history_size
+        self._probes: Dict[str, Dict[str, Any]] = {}
+        self._history: Dict[str, ProbeHistory] = {}
+        # Снимок заменяется целиком после каждого раунда — чтение без блокировок
+        self.agents_status: Dict[str, Dict[str, Any]] = {}
+        self.last_round: Optional[str] = None
+        self.rounds = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, agent_id: str, name: str, probe: Probe, timeout: Optional[float] = None):
+        self._probes[agent_id] = {"name": name, "probe": probe, "timeout": timeout or self.probe_timeout}
+        self._history[agent_id] = ProbeHistory(self.history_size)
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.start_monitoring())
+            logger.info(f"🩺 Мониторинг агентов запущен: {len(self._probes)} проб, интервал {self.check_interval}с")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
     async def start_monitoring(self):
         """Запуск непрерывного мониторинга"""
         while True:
             await self.check_all_agents()
-            await asyncio.sleep(self.check_interval)
-    
+            # Джиттер разводит пробы нескольких воркеров во времени
+            delay = self.check_interval * (1 + random.uniform(-self.jitter, self.jitter))
+            await asyncio.sleep(max(0.0, delay))
+
     async def check_all_agents(self):
-        """Проверка всех агентов"""
-        try:
-            # Проверяем Telegram
-            telegram_status = await self._check_telegram()
-            self.agents_status['dashka'] = telegram_status
-            
-            # Проверяем Claude (упрощенно)
-            claude_status = self._check_claude()
-            self.agents_status['claude'] = claude_status
-            
-            # Проверяем DeepSeek (упрощенно)
-            deepseek_status = self._check_deepseek()
-            self.agents_status['deepseek'] = deepseek_status
-            
-            logger.info(f"Мониторинг завершен: {len(self.agents_status)} агентов")
-            
-        except Exception as e:
-            logger.error(f"Ошибка мониторинга: {e}")
-    
-    async def _check_telegram(self) -> Dict[str, Any]:
-        """Проверка Telegram API"""
-        import os
-        token = os.getenv('TELEGRAM_BOT_TOKEN')
-        
-        if not token:
-            return {"online": False, "error": "No token"}
-        
+        """Один раунд: все пробы параллельно, каждая со своим таймаутом"""
+        agent_ids = list(self._probes)
+        results = await asyncio.gather(*(self._run_probe(agent_id) for agent_id in agent_ids))
+        self.agents_status = dict(zip(agent_ids, results))
+        self.last_round = datetime.utcnow().isoformat()
+        self.rounds += 1
+        online = sum(status["is_online"] for status in results)
+        logger.info(f"Мониторинг завершен: {online}/{len(results)} агентов онлайн")
+
+    async def _run_probe(self, agent_id: str) -> Dict[str, Any]:
+        spec = self._probes[agent_id]
+        started = time.perf_counter()
+        error = None
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f'https://api.telegram.org/bot{token}/getMe') as resp:
-                    return {
-                        "online": resp.status == 200,
-                        "status_code": resp.status,
-                        "last_check": datetime.utcnow().isoformat()
-                    }
+            result = await asyncio.wait_for(spec["probe"](), timeout=spec["timeout"])
+        except asyncio.TimeoutError:
+            result, error = {"is_online": False}, f"timeout {spec['timeout']}s"
         except Exception as e:
-            return {"online": False, "error": str(e)}
-    
-    def _check_claude(self) -> Dict[str, Any]:
-        """Проверка Claude (упрощенная)"""
-        import os
-        api_key = os.getenv('ANTHROPIC_API_KEY')
-        return {
-            "online": bool(api_key),
-            "token_valid": len(api_key or '') > 20,
-            "last_check": datetime.utcnow().isoformat()
-        }
-    
-    def _check_deepseek(self) -> Dict[str, Any]:
-        """Проверка DeepSeek (упрощенная)"""
-        import os
-        api_key = os.getenv('DEEPSEEK_API_KEY')
+            result, error = {"is_online": False}, str(e)
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        history = self._history[agent_id]
+        history.add(latency_ms, bool(result.get("is_online")))
+        summary = history.summary()
         return {
-            "online": bool(api_key),
-            "token_valid": len(api_key or '') > 20,
-            "last_check": datetime.utcnow().isoformat()
+            "name": spec["name"],
+            "is_online": bool(result.get("is_online")),
+            "token_valid": bool(result.get("token_valid", False)),
+            "response_time_ms": round(latency_ms, 1),
+            "last_check": datetime.utcnow().isoformat(),
+            "success_rate": summary["success_rate"],
+            "error": error or result.get("error"),
+            "history": summary
         }
-    
+
     def get_status(self) -> Dict[str, Any]:
         """Получить текущий статус всех агентов"""
         return self.agents_status
+
+
+async def check_telegram() -> Dict[str, Any]:
+    """Проверка Telegram бота через общий пул соединений"""
+    token = os.getenv('TELEGRAM_BOT_TOKEN', '')
+    if not token or len(token) < 30:
+        return {"is_online": False, "token_valid": False, "error": "No token"}
+    resp = await http_clients.get("telegram").get(f'https://api.telegram.org/bot{token}/getMe')
+    return {"is_online": resp.status_code == 200, "token_valid": resp.status_code != 401}
+
+
+def key_probe(env_name: str) -> Probe:
+    """Проверка по наличию ключа API (упрощенная, без сетевого вызова)"""
+    async def probe() -> Dict[str, Any]:
+        api_key = os.getenv(env_name, '')
+        return {"is_online": bool(api_key), "token_valid": len(api_key) > 20}
+    return probe
+
+
+def default_monitor() -> AgentMonitor:
+    monitor = AgentMonitor()
+    monitor.register("dashka", "Dashka", check_telegram)
+    monitor.register("claude", "Claude", key_probe('CLAUDE_API_KEY'))
+    monitor.register("deepseek", "DeepSeek", key_probe('DEEPSEEK_API_KEY'))
+    return monitor
+
+
+# Глобальный экземпляр
+agent_monitor = default_monitor()
@@ -0,0 +1,258 @@
+# services/prometheus.py
+"""
+Метрики в формате Prometheus (text exposition 0.0.4) без внешних зависимостей.
+Горячий путь — изменение заранее созданных счетчиков и списка корзин без блокировок
+(один event loop); счетчики кэшей и глубины очередей читаются только при scrape
+"""
+
+import math
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# charset=utf-8 Starlette допишет сам для text/*
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Секунды: от 5 мс до 2 мин — HTTP и вызовы провайдеров
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class _HistogramChild:
+    """Некумулятивные счетчики корзин; кумулятивные считаются при scrape"""
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class _Metric:
+    kind = ""
+    child_class: type = _CounterChild
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        return self.child_class()
+
+    def labels(self, *values: str):
+        """Дочерняя серия; горячий код может сохранить ее и не искать повторно"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {values}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _series(self) -> Iterable[Tuple[Dict[str, str], object]]:
+        for values, child in list(self._children.items()):
+            yield dict(zip(self.labelnames, values)), child
+
+    def samples(self) -> List[Sample]:
+        return [(self.name, labels, child.value) for labels, child in self._series()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1):
+        self._children[()].inc(amount)
+
+    def samples(self) -> List[Sample]:
+        return [(f"{self.name}_total", labels, child.value) for labels, child in self._series()]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+    child_class = _GaugeChild
+
+    def inc(self, amount: float = 1):
+        self._children[()].inc(amount)
+
+    def dec(self, amount: float = 1):
+        self._children[()].dec(amount)
+
+    def set(self, value: float):
+        self._children[()].set(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._children[()].observe(value)
+
+    def samples(self) -> List[Sample]:
+        return histogram_samples(self.name, self.buckets,
+                                 ((labels, child.counts, child.sum) for labels, child in self._series()))
+
+
+def histogram_samples(name: str, bounds: Sequence[float],
+                      series: Iterable[Tuple[Dict[str, str], Sequence[int], float]]) -> List[Sample]:
+    """_bucket/_sum/_count из некумулятивных счетчиков (последний — корзина +Inf)"""
+    samples: List[Sample] = []
+    for labels, counts, total in series:
+        cumulative = 0
+        for bound, count in zip(list(bounds) + [math.inf], counts):
+            cumulative += count
+            samples.append((f"{name}_bucket", {**labels, "le": _number(float(bound))}, cumulative))
+        samples.append((f"{name}_sum", labels, total))
+        samples.append((f"{name}_count", labels, cumulative))
+    return samples
+
+
+class CollectorFamily:
+    """Метрика, значения которой вычисляются при scrape из существующих счетчиков"""
+
+    def __init__(self, name: str, kind: str, documentation: str, collect: Callable[[], List[Sample]]):
+        self.name = name
+        self.kind = kind
+        self.documentation = documentation
+        self._collect = collect
+
+    def samples(self) -> List[Sample]:
+        return self._collect()
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def collector(self, name: str, kind: str, documentation: str,
+                  collect: Callable[[], List[Sample]]) -> CollectorFamily:
+        return self.register(CollectorFamily(name, kind, documentation, collect))
+
+    def expose(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                # Сломанный сборщик не должен ронять весь scrape
+                lines.append(f"# collector {metric.name} failed: {_escape(str(e))}")
+                continue
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Глобальный реестр
+metrics_registry = MetricsRegistry()
+
+HTTP_REQUEST_DURATION = metrics_registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status")
+)
+WS_CONNECTIONS = metrics_registry.gauge("websocket_connections", "Open WebSocket connections", ("route",))
+WS_CONNECTIONS_OPENED = metrics_registry.counter(
+    "websocket_connections_opened", "WebSocket connections accepted", ("route",)
+)
+WS_MESSAGES = metrics_registry.counter(
+    "websocket_messages", "WebSocket messages by direction", ("route", "direction")
+)
+PROVIDER_CALL_DURATION = metrics_registry.histogram(
+    "ai_provider_call_duration_seconds", "Latency of a single backend completion", ("backend", "outcome")
+)
+PROVIDER_TOKENS = metrics_registry.counter(
+    "ai_provider_tokens", "Tokens reported by providers", ("backend", "direction")
+)
+PROVIDER_ERRORS = metrics_registry.counter(
+    "ai_provider_errors", "Failed backend completions by HTTP status", ("backend", "status")
+)
+
+
+
+class ProviderSeries:
+    """Серии backend'а, разрешенные один раз: путь ответа не ищет .labels() на каждый вызов"""
+    __slots__ = ("ok", "error", "input_tokens", "output_tokens")
+
+    def __init__(self, backend: str):
+        self.ok = PROVIDER_CALL_DURATION.labels(backend, "ok")
+        self.error = PROVIDER_CALL_DURATION.labels(backend, "error")
+        self.input_tokens = PROVIDER_TOKENS.labels(backend, "input")
+        self.output_tokens = PROVIDER_TOKENS.labels(backend, "output")
+
+
+_provider_series: Dict[str, ProviderSeries] = {}
+
+
+def provider_series(backend: str) -> ProviderSeries:
+    series = _provider_series.get(backend)
+    if series is None:
+        series = _provider_series[backend] = ProviderSeries(backend)
+    return series
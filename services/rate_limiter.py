@@ -0,0 +1,269 @@
+# services/rate_limiter.py
+"""
+Лимиты исходящих вызовов AI провайдеров: token bucket по запросам и токенам в минуту,
+ограничение параллельных вызовов и справедливая очередь по пользователям
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Deque, Dict, Mapping, Optional
+
+from utils.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Лимиты по умолчанию на backend (модель); переопределяются через CLAUDE_RPM, CLAUDE_HAIKU_TPM и т.д.
+DEFAULT_LIMITS = {
+    "claude": {"rpm": 50, "tpm": 40000, "concurrency": 8},
+    "claude-haiku": {"rpm": 50, "tpm": 50000, "concurrency": 8},
+    "deepseek": {"rpm": 60, "tpm": 100000, "concurrency": 16}
+}
+DEFAULT_429_BACKOFF = 1.0
+
+
+def estimate_tokens(message: str, context: str, params: Mapping[str, Any]) -> int:
+    """Грубая оценка: ~4 символа на токен промпта + максимум токенов ответа"""
+    return (len(message) + len(context)) // 4 + 1 + int(params.get("max_tokens", 0))
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """retry-after в секундах или HTTP-дате → секунды ожидания"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    """Классический token bucket; refill непрерывный, скорость — в минуту"""
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Сколько ждать, пока в ведре хватит amount (не больше емкости)"""
+        self.refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def take(self, amount: float):
+        self.tokens -= amount
+
+    def clamp(self, remaining: float):
+        """Провайдер сообщил остаток квоты — не рассчитываем на большее"""
+        self.refill()
+        self.tokens = min(self.tokens, remaining)
+
+
+class Permit:
+    """Разрешение на вызов; used_tokens уточняется по usage ответа"""
+
+    __slots__ = ("user_id", "reserved_tokens", "used_tokens", "future", "enqueued_at")
+
+    def __init__(self, user_id: str, tokens: int, future: asyncio.Future, enqueued_at: float):
+        self.user_id = user_id
+        self.reserved_tokens = tokens
+        self.used_tokens: Optional[int] = None
+        self.future = future
+        self.enqueued_at = enqueued_at
+
+
+class ProviderGovernor:
+    """Очередь вызовов одного провайдера: round-robin между пользователями"""
+
+    def __init__(self, provider: str, rpm: int, tpm: int, concurrency: int,
+                 clock: Callable[[], float] = time.monotonic):
+        self.provider = provider
+        self.clock = clock
+        self.requests = TokenBucket(rpm, clock)
+        self.tokens = TokenBucket(tpm, clock)
+        self.concurrency = concurrency
+        self.active = 0
+        self.blocked_until = 0.0
+
+        self._queues: "OrderedDict[str, Deque[Permit]]" = OrderedDict()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        self.granted = 0
+        self.throttled = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    @asynccontextmanager
+    async def acquire(self, user_id: str, tokens: int):
+        permit = Permit(user_id, tokens, asyncio.get_running_loop().create_future(), self.clock())
+        self._queues.setdefault(user_id, deque()).append(permit)
+        self._dispatch()
+
+        try:
+            with tracer.span("rate_limit.wait", {"ai.provider": self.provider, "rate_limit.tokens": tokens}):
+                await permit.future
+        except asyncio.CancelledError:
+            if permit.future.done() and not permit.future.cancelled():
+                self._release(permit)
+            else:
+                self._discard(permit)
+            raise
+
+        try:
+            yield permit
+        finally:
+            self._release(permit)
+
+    def observe(self, status_code: Optional[int], headers: Mapping[str, str]):
+        """Подстройка по ответу: retry-after и остатки квоты из rate-limit заголовков"""
+        headers = {key.lower(): value for key, value in (headers or {}).items()}
+
+        retry_after = parse_retry_after(headers.get("retry-after"))
+        if status_code == 429:
+            self.throttled += 1
+            retry_after = retry_after if retry_after is not None else DEFAULT_429_BACKOFF
+        if retry_after:
+            self.blocked_until = max(self.blocked_until, self.clock() + retry_after)
+            logger.warning(f"⏳ {self.provider}: пауза {retry_after:.1f}с по ответу провайдера")
+
+        for bucket, names in (
+            (self.requests, ("anthropic-ratelimit-requests-remaining", "x-ratelimit-remaining-requests")),
+            (self.tokens, ("anthropic-ratelimit-tokens-remaining", "x-ratelimit-remaining-tokens"))
+        ):
+            for name in names:
+                if name in headers:
+                    try:
+                        bucket.clamp(float(headers[name]))
+                    except ValueError:
+                        pass
+                    break
+
+        self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "concurrency": self.concurrency,
+            "requests_available": round(self.requests.tokens, 1),
+            "tokens_available": round(self.tokens.tokens, 1),
+            "blocked_for_s": round(max(0.0, self.blocked_until - self.clock()), 2),
+            "granted": self.granted,
+            "throttled": self.throttled,
+            "wait_avg_ms": round(self.wait_total / self.granted * 1000, 2) if self.granted else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 2)
+        }
+
+    def _dispatch(self):
+        """Выдать разрешения, пока есть слоты и квота; иначе — таймер до следующей попытки"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._queues and self.active < self.concurrency:
+            user_id, queue = next(iter(self._queues.items()))
+            permit = queue[0]
+
+            if permit.future.done():
+                # Ожидание уже отменено, задача еще не успела убрать себя из очереди
+                queue.popleft()
+                if not queue:
+                    del self._queues[user_id]
+                continue
+
+            delay = max(
+                self.blocked_until - self.clock(),
+                self.requests.wait_time(1),
+                self.tokens.wait_time(permit.reserved_tokens)
+            )
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+
+            queue.popleft()
+            # Пользователь уходит в конец очереди — справедливый round-robin
+            del self._queues[user_id]
+            if queue:
+                self._queues[user_id] = queue
+
+            self.requests.take(1)
+            self.tokens.take(min(permit.reserved_tokens, self.tokens.capacity))
+            self.active += 1
+
+            waited = self.clock() - permit.enqueued_at
+            self.granted += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            permit.future.set_result(None)
+
+    def _release(self, permit: Permit):
+        self.active -= 1
+        if permit.used_tokens is not None:
+            # Возвращаем неиспользованный резерв (или доплачиваем перерасход)
+            reserved = min(permit.reserved_tokens, self.tokens.capacity)
+            self.tokens.tokens = min(self.tokens.capacity, self.tokens.tokens + reserved - permit.used_tokens)
+        self._dispatch()
+
+    def _discard(self, permit: Permit):
+        queue = self._queues.get(permit.user_id)
+        if queue is not None and permit in queue:
+            queue.remove(permit)
+            if not queue:
+                del self._queues[permit.user_id]
+        self._dispatch()
+
+
+class RateLimitRegistry:
+    """Governor на каждый backend (модель): у моделей провайдера свои лимиты"""
+
+    def __init__(self):
+        self._governors: Dict[str, ProviderGovernor] = {}
+
+    def get(self, backend: str) -> Optional[ProviderGovernor]:
+        governor = self._governors.get(backend)
+        if governor is None and backend in DEFAULT_LIMITS:
+            limits = DEFAULT_LIMITS[backend]
+            prefix = backend.upper().replace("-", "_")
+            governor = ProviderGovernor(
+                backend,
+                rpm=int(os.getenv(f'{prefix}_RPM', limits["rpm"])),
+                tpm=int(os.getenv(f'{prefix}_TPM', limits["tpm"])),
+                concurrency=int(os.getenv(f'{prefix}_MAX_CONCURRENCY', limits["concurrency"]))
+            )
+            self._governors[backend] = governor
+        return governor
+
+    def stats(self) -> Dict[str, Any]:
+        return {provider: governor.stats() for provider, governor in self._governors.items()}
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Ожидающие разрешения запросы по провайдерам — для /metrics"""
+        return {provider: governor.queued for provider, governor in self._governors.items()}
+
+
+# Глобальный реестр лимитов
+rate_limits = RateLimitRegistry()
@@ -0,0 +1,270 @@
+# services/resilience.py
+"""
+Устойчивость вызовов AI провайдеров: повторы с backoff и jitter,
+hedged-запросы по p95 задержки и circuit breaker на провайдера
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, Optional, TypeVar
+
+import httpx
+
+from core.exceptions import CircuitOpenError, ProviderError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RETRY_ATTEMPTS = int(os.getenv('AI_RETRY_ATTEMPTS', 3))
+RETRY_BASE_DELAY = float(os.getenv('AI_RETRY_BASE_DELAY', 0.5))
+RETRY_MAX_DELAY = float(os.getenv('AI_RETRY_MAX_DELAY', 8.0))
+
+# Hedging удваивает нагрузку на хвосте — включается явно для провайдеров
+HEDGE_PROVIDERS = os.getenv('AI_HEDGE_PROVIDERS', '')
+HEDGE_MIN_DELAY = float(os.getenv('AI_HEDGE_MIN_DELAY', 0.5))
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+BREAKER_FAILURES = int(os.getenv('AI_BREAKER_FAILURES', 5))
+BREAKER_RESET_SECONDS = float(os.getenv('AI_BREAKER_RESET', 30))
+
+# 529 — перегрузка Anthropic
+RETRY_STATUSES = {429, 500, 502, 503, 504, 529}
+# 429 — провайдер жив, просто лимит; breaker на него не реагирует
+OUTAGE_STATUSES = RETRY_STATUSES - {429}
+
+
+def is_retryable(error: ProviderError) -> bool:
+    return error.transient or error.status_code in RETRY_STATUSES
+
+
+def is_outage(error: ProviderError) -> bool:
+    return error.transient or error.status_code in OUTAGE_STATUSES
+
+
+def backoff_delay(attempt: int, base: float = RETRY_BASE_DELAY, cap: float = RETRY_MAX_DELAY,
+                  rng: Callable[[], float] = random.random) -> float:
+    """Full jitter: случайная пауза в [0, min(cap, base * 2^attempt)]"""
+    return rng() * min(cap, base * (2 ** attempt))
+
+
+class LatencyWindow:
+    """Последние N успешных задержек для оценки перцентилей"""
+
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CircuitBreaker:
+    """
+    closed → open после N сбоев подряд; через reset_timeout — half_open,
+    где пропускается один пробный вызов: успех закрывает, сбой снова открывает
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURES,
+                 reset_timeout: float = BREAKER_RESET_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.opens = 0
+        self.rejected = 0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probe_in_flight or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self._probe_in_flight:
+                self.opens += 1
+            self.opened_at = self.clock()
+        self._probe_in_flight = False
+
+    def release(self):
+        """Вызов прерван без результата — пробный слот освобождается"""
+        self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "opens": self.opens,
+            "rejected": self.rejected
+        }
+
+
+class ResilientCaller:
+    """Обертка вызовов одного провайдера: breaker → попытка (с hedge) → повтор по backoff"""
+
+    def __init__(self, provider: str, attempts: int = RETRY_ATTEMPTS, hedge: bool = False,
+                 breaker: Optional[CircuitBreaker] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.provider = provider
+        self.attempts = max(1, attempts)
+        self.hedge = hedge
+        self.breaker = breaker or CircuitBreaker(clock=clock)
+        self.clock = clock
+        self.latency = LatencyWindow()
+
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        """Задержка второго запроса — p95 недавних ответов; без статистики не хеджируем"""
+        if not self.hedge or len(self.latency) < HEDGE_MIN_SAMPLES:
+            return None
+        return max(HEDGE_MIN_DELAY, self.latency.percentile(0.95))
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        self.calls += 1
+        for attempt in range(self.attempts):
+            if not self.breaker.allow():
+                raise CircuitOpenError(
+                    self.provider,
+                    f"❌ Провайдер {self.provider} временно недоступен, попробуйте позже"
+                )
+            try:
+                result = await self._attempt(fn)
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except ProviderError as e:
+                if is_outage(e):
+                    self.breaker.record_failure()
+                else:
+                    # 4xx/429: провайдер отвечает
+                    self.breaker.record_success()
+                if not is_retryable(e) or attempt + 1 >= self.attempts:
+                    raise
+                # retry-after соблюдает governor лимитов при следующем acquire
+                delay = backoff_delay(attempt)
+                self.retries += 1
+                logger.warning(f"🔁 {self.provider}: повтор {attempt + 1} через {delay:.2f}с ({e})")
+                await asyncio.sleep(delay)
+            except (httpx.TransportError, asyncio.TimeoutError):
+                self.breaker.record_failure()
+                raise
+            except Exception:
+                # Локальная ошибка (кодировка, TypeError) — не сбой провайдера, breaker не трогаем
+                self.breaker.release()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+
+    async def _attempt(self, fn: Callable[[], Awaitable[T]]) -> T:
+        started = self.clock()
+        delay = self.hedge_delay()
+        result = await (fn() if delay is None else self._hedged(fn, delay))
+        self.latency.add(self.clock() - started)
+        return result
+
+    async def _hedged(self, fn: Callable[[], Awaitable[T]], delay: float) -> T:
+        """Второй запрос, если первый не ответил за delay; побеждает первый успешный"""
+        primary = asyncio.ensure_future(fn())
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.hedges += 1
+                tasks.add(asyncio.ensure_future(fn()))
+
+            while True:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                error: Optional[BaseException] = None
+                for task in done:
+                    error = task.exception()
+                    if error is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                if not tasks:
+                    raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        p50 = self.latency.percentile(0.5)
+        p95 = self.latency.percentile(0.95)
+        return {
+            "circuit": self.breaker.stats(),
+            "calls": self.calls,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "latency_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None
+        }
+
+
+class ResilienceRegistry:
+    """
+    ResilientCaller на каждый внешний backend (модель): отказ основной модели
+    не должен закрывать fallback-модель того же провайдера
+    """
+
+    def __init__(self, backends: Iterable[str] = ("claude", "claude-haiku", "deepseek"),
+                 hedge_backends: Iterable[str] = tuple(p.strip() for p in HEDGE_PROVIDERS.split(',') if p.strip())):
+        hedge_backends = set(hedge_backends)
+        self._callers: Dict[str, ResilientCaller] = {
+            backend: ResilientCaller(backend, hedge=backend in hedge_backends)
+            for backend in backends
+        }
+
+    def get(self, backend: str) -> Optional[ResilientCaller]:
+        return self._callers.get(backend)
+
+    def stats(self) -> Dict[str, Any]:
+        return {provider: caller.stats() for provider, caller in self._callers.items()}
+
+
+# Глобальный реестр устойчивости вызовов
+resilience = ResilienceRegistry()
@@ -0,0 +1,144 @@
+# services/response_cache.py
+"""
+Кэш ответов агентов для детерминированных вызовов: LRU + TTL в памяти и опциональный Redis
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 2000))
+CACHE_TTL_SECONDS = float(os.getenv('RESPONSE_CACHE_TTL', 3600))
+# Кэш включается per-agent: DeepSeek работает с temperature 0.1
+CACHE_AGENTS = os.getenv('RESPONSE_CACHE_AGENTS', 'deepseek')
+
+# Заголовок запроса для обхода кэша
+BYPASS_HEADER = "x-cache-bypass"
+
+
+def normalize_prompt(text: str) -> str:
+    """Нормализация промпта для ключа: Unicode NFC и схлопнутые пробелы"""
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+
+def should_bypass(headers) -> bool:
+    """X-Cache-Bypass: 1 или Cache-Control: no-cache"""
+    if headers.get(BYPASS_HEADER, "").lower() in ("1", "true", "yes"):
+        return True
+    return "no-cache" in headers.get("cache-control", "").lower()
+
+
+class ResponseCache:
+    """LRU с TTL; при подключенном Redis — второй уровень, общий для воркеров"""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES,
+                 ttl: float = CACHE_TTL_SECONDS,
+                 agents: Iterable[str] = tuple(a.strip() for a in CACHE_AGENTS.split(',') if a.strip()),
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.agents = set(agents)
+        self.clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._redis = None
+        self.redis_prefix = "ai_pipeline:cache:"
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.redis_hits = 0
+
+    def is_enabled(self, agent_id: str) -> bool:
+        return agent_id in self.agents and self.max_entries > 0
+
+    @staticmethod
+    def make_key(agent_id: str, model: str, params: Dict[str, Any], context: str, message: str) -> str:
+        raw = json.dumps(
+            [agent_id, model, params, normalize_prompt(context), normalize_prompt(message)],
+            ensure_ascii=False,
+            sort_keys=True
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > self.clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+            self.expirations += 1
+
+        if self._redis is not None:
+            try:
+                value = await self._redis.get(self.redis_prefix + key)
+            except Exception as e:
+                logger.warning(f"Response cache Redis error: {e}")
+                value = None
+            if value is not None:
+                self.hits += 1
+                self.redis_hits += 1
+                self._store_local(key, value)
+                return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str):
+        self._store_local(key, value)
+        if self._redis is not None:
+            try:
+                await self._redis.set(self.redis_prefix + key, value, ex=max(1, int(self.ttl)))
+            except Exception as e:
+                logger.warning(f"Response cache Redis error: {e}")
+
+    def clear(self):
+        self._entries.clear()
+
+    async def attach_redis(self, url: Optional[str] = None):
+        """Подключение Redis как второго уровня кэша"""
+        from storage.redis.connector import get_async_redis
+
+        client = get_async_redis(url)
+        await client.ping()
+        self._redis = client
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "redis_hits": self.redis_hits,
+            "redis": self._redis is not None,
+            "agents": sorted(self.agents)
+        }
+
+    def _store_local(self, key: str, value: str):
+        self._entries[key] = (self.clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+# Глобальный кэш ответов
+response_cache = ResponseCache()
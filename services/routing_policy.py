@@ -0,0 +1,171 @@
+# services/routing_policy.py
+"""
+Политика выбора backend'а для агента: fallback-цепочки, живая статистика
+задержек и ошибок (EWMA) и стоимость моделей
+"""
+
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from services.resilience import LatencyWindow
+
+logger = logging.getLogger(__name__)
+
+# primary — по порядку цепочки; cheapest — дешевле всех в рамках p95; fastest — по EWMA задержки
+ROUTING_POLICY = os.getenv('AI_ROUTING_POLICY', 'primary')
+ROUTING_MAX_P95 = float(os.getenv('AI_ROUTING_MAX_P95', 2.0))
+# Формат: agent=backend1,backend2;agent2=backend3
+ROUTING_FALLBACKS = os.getenv('AI_FALLBACKS', 'claude=claude-haiku,deepseek;deepseek=claude-haiku')
+# Backend с долей ошибок выше порога уходит в конец очереди
+ERROR_RATE_THRESHOLD = float(os.getenv('AI_ROUTING_MAX_ERROR_RATE', 0.5))
+
+# Ориентировочная стоимость, $ за 1K токенов ответа; переопределяется <BACKEND>_COST_PER_1K
+DEFAULT_COSTS = {
+    "claude": 0.015,
+    "claude-haiku": 0.00125,
+    "deepseek": 0.0014,
+    "dashka": 0.0
+}
+
+LATENCY_ALPHA = 0.2
+ERROR_ALPHA = 0.1
+# Доля ошибок затухает со временем: backend в конце очереди трафика не получает
+ERROR_HALF_LIFE_SECONDS = 60.0
+
+POLICIES = ("primary", "cheapest", "fastest")
+
+
+def parse_fallbacks(spec: str) -> Dict[str, List[str]]:
+    fallbacks: Dict[str, List[str]] = {}
+    for item in spec.split(';'):
+        agent, _, backends = item.partition('=')
+        if agent.strip():
+            fallbacks[agent.strip()] = [b.strip() for b in backends.split(',') if b.strip()]
+    return fallbacks
+
+
+def backend_cost(name: str) -> float:
+    env_name = f"{name.upper().replace('-', '_')}_COST_PER_1K"
+    return float(os.getenv(env_name, DEFAULT_COSTS.get(name, 0.0)))
+
+
+class BackendStats:
+    """Живая статистика backend'а: EWMA задержки и доли ошибок, окно для p95"""
+
+    def __init__(self, name: str, cost_per_1k: float, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.cost_per_1k = cost_per_1k
+        self.clock = clock
+        self.latency_ewma: Optional[float] = None
+        self.window = LatencyWindow()
+        self.successes = 0
+        self.failures = 0
+        self._error_rate = 0.0
+        self._error_updated = clock()
+
+    @property
+    def p95(self) -> Optional[float]:
+        return self.window.percentile(0.95)
+
+    @property
+    def error_rate(self) -> float:
+        elapsed = self.clock() - self._error_updated
+        return self._error_rate * 0.5 ** (elapsed / ERROR_HALF_LIFE_SECONDS)
+
+    def _update_error_rate(self, sample: float):
+        self._error_rate = self.error_rate + ERROR_ALPHA * (sample - self.error_rate)
+        self._error_updated = self.clock()
+
+    def record_success(self, seconds: float):
+        self.successes += 1
+        self.window.add(seconds)
+        if self.latency_ewma is None:
+            self.latency_ewma = seconds
+        else:
+            self.latency_ewma += LATENCY_ALPHA * (seconds - self.latency_ewma)
+        self._update_error_rate(0.0)
+
+    def record_failure(self):
+        self.failures += 1
+        self._update_error_rate(1.0)
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.p95
+        return {
+            "cost_per_1k": self.cost_per_1k,
+            "latency_ewma_ms": round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None,
+            "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "error_rate": round(self.error_rate, 4),
+            "successes": self.successes,
+            "failures": self.failures
+        }
+
+
+class RoutingPolicy:
+    """Порядок backend'ов для запроса к агенту"""
+
+    def __init__(self, policy: str = ROUTING_POLICY, max_p95: float = ROUTING_MAX_P95,
+                 fallbacks: Optional[Dict[str, List[str]]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        if policy not in POLICIES:
+            logger.warning(f"Неизвестная политика маршрутизации {policy}, используем primary")
+            policy = "primary"
+        self.policy = policy
+        self.max_p95 = max_p95
+        self.fallbacks = parse_fallbacks(ROUTING_FALLBACKS) if fallbacks is None else fallbacks
+        self.clock = clock
+        self._stats: Dict[str, BackendStats] = {}
+        self.failovers = 0
+
+    def backend(self, name: str) -> BackendStats:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = BackendStats(name, backend_cost(name), self.clock)
+        return stats
+
+    def candidates(self, agent_id: str, known: Iterable[str],
+                   available: Callable[[str], bool] = lambda name: True) -> List[str]:
+        """
+        Основной backend агента и его fallback'и в порядке политики.
+        Недоступные и сбоящие backend'ы не исключаются, а идут последними —
+        если лежат все, пользователь получит ошибку основного.
+        """
+        known = set(known)
+        chain = [agent_id] + [name for name in self.fallbacks.get(agent_id, []) if name != agent_id]
+        chain = [name for name in chain if name in known]
+        position = {name: index for index, name in enumerate(chain)}
+
+        healthy = [name for name in chain
+                   if available(name) and self.backend(name).error_rate <= ERROR_RATE_THRESHOLD]
+        degraded = [name for name in chain if name not in healthy]
+
+        if self.policy == "cheapest":
+            within = [name for name in healthy if self._p95_or_zero(name) <= self.max_p95]
+            over = [name for name in healthy if name not in within]
+            healthy = (sorted(within, key=lambda name: (self.backend(name).cost_per_1k, position[name]))
+                       + sorted(over, key=lambda name: (self._p95_or_zero(name), position[name])))
+        elif self.policy == "fastest":
+            healthy.sort(key=lambda name: (self.backend(name).latency_ewma or 0.0, position[name]))
+
+        return healthy + degraded
+
+    def record_success(self, name: str, seconds: float):
+        self.backend(name).record_success(seconds)
+
+    def record_failure(self, name: str):
+        self.backend(name).record_failure()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "policy": self.policy,
+            "max_p95_s": self.max_p95,
+            "failovers": self.failovers,
+            "backends": {name: stats.stats() for name, stats in self._stats.items()}
+        }
+
+    def _p95_or_zero(self, name: str) -> float:
+        # Нет статистики — backend считается подходящим, иначе он никогда ее не наберет
+        p95 = self.backend(name).p95
+        return 0.0 if p95 is None else p95
@@ -0,0 +1,214 @@
+# services/ws_hub.py
+"""
+Хаб WebSocket подписок: несколько соединений на пользователя,
+подписки на проекты и рассылка с ограниченным буфером на сокет
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Dict, Iterable, Optional, Set
+
+from fastapi import WebSocket
+
+from services.backplane import Backplane, InProcessBackplane
+
+logger = logging.getLogger(__name__)
+
+SEND_BUFFER_SIZE = int(os.getenv('WS_SEND_BUFFER', 256))
+SEND_TIMEOUT = float(os.getenv('WS_SEND_TIMEOUT', 5.0))
+SLOW_CONSUMER_POLICY = os.getenv('WS_SLOW_CONSUMER_POLICY', 'drop')  # drop | disconnect
+
+# Код закрытия для медленного клиента (Try Again Later)
+CLOSE_SLOW_CONSUMER = 1013
+
+
+def project_topic(project_id: str) -> str:
+    return f"project:{project_id}"
+
+
+class SocketChannel:
+    """Одно WebSocket соединение с собственной очередью отправки"""
+
+    def __init__(self, websocket: WebSocket, user_id: str,
+                 buffer_size: int = SEND_BUFFER_SIZE,
+                 policy: str = SLOW_CONSUMER_POLICY):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.policy = policy
+        self.topics: Set[str] = set()
+        self.dropped = 0
+        self.closed = False
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write_loop())
+
+    async def send(self, text: str, wait: bool = True) -> bool:
+        """
+        Поставить кадр в очередь сокета.
+        wait=True — личные ответы: ждем место в буфере не дольше SEND_TIMEOUT.
+        wait=False — рассылки: при переполнении срабатывает политика медленного клиента.
+        """
+        if self.closed:
+            return False
+
+        if wait:
+            try:
+                await asyncio.wait_for(self._queue.put(text), timeout=SEND_TIMEOUT)
+                return True
+            except asyncio.TimeoutError:
+                logger.warning(f"WS send timeout, отключаем медленного клиента {self.user_id}")
+                await self.close(CLOSE_SLOW_CONSUMER)
+                return False
+
+        try:
+            self._queue.put_nowait(text)
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        if self.policy == 'disconnect':
+            logger.warning(f"WS буфер переполнен, отключаем клиента {self.user_id}")
+            await self.close(CLOSE_SLOW_CONSUMER)
+            return False
+
+        # Политика drop: вытесняем самый старый кадр
+        self.dropped += 1
+        try:
+            self._queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+        self._queue.put_nowait(text)
+        return True
+
+    async def close(self, code: int = 1000):
+        if self.closed:
+            return
+        self.closed = True
+        if self._writer and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def _write_loop(self):
+        try:
+            while True:
+                text = await self._queue.get()
+                await self.websocket.send_text(text)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.info(f"WS writer stopped for {self.user_id}: {e}")
+            self.closed = True
+
+
+class ConnectionManager:
+    """Реестр соединений: пользователь → сокеты, топик → сокеты"""
+
+    def __init__(self, backplane: Optional[Backplane] = None):
+        self.user_connections: Dict[str, Set[SocketChannel]] = {}
+        self.topic_subscribers: Dict[str, Set[SocketChannel]] = {}
+        self.backplane = backplane or InProcessBackplane()
+
+    async def start(self):
+        await self.backplane.start(self._deliver_remote)
+
+    async def use_backplane(self, backplane: Backplane):
+        """Переключение backplane при старте приложения (например, на Redis)"""
+        await backplane.start(self._deliver_remote)
+        for user_id in list(self.user_connections):
+            await backplane.watch("user", user_id)
+        for topic in list(self.topic_subscribers):
+            await backplane.watch("topic", topic)
+        await self.backplane.stop()
+        self.backplane = backplane
+
+    async def stop(self):
+        await self.backplane.stop()
+
+    async def connect(self, websocket: WebSocket, user_id: str) -> SocketChannel:
+        await websocket.accept()
+        channel = SocketChannel(websocket, user_id)
+        channel.start()
+        first = user_id not in self.user_connections
+        self.user_connections.setdefault(user_id, set()).add(channel)
+        if first:
+            await self.backplane.watch("user", user_id)
+        return channel
+
+    async def disconnect(self, channel: SocketChannel):
+        for topic in list(channel.topics):
+            await self.unsubscribe(channel, topic)
+
+        user_channels = self.user_connections.get(channel.user_id)
+        if user_channels is not None:
+            user_channels.discard(channel)
+            if not user_channels:
+                del self.user_connections[channel.user_id]
+                await self.backplane.unwatch("user", channel.user_id)
+
+        await channel.close()
+
+    async def subscribe(self, channel: SocketChannel, topic: str):
+        first = topic not in self.topic_subscribers
+        self.topic_subscribers.setdefault(topic, set()).add(channel)
+        channel.topics.add(topic)
+        if first:
+            await self.backplane.watch("topic", topic)
+
+    async def unsubscribe(self, channel: SocketChannel, topic: str):
+        subscribers = self.topic_subscribers.get(topic)
+        if subscribers is not None:
+            subscribers.discard(channel)
+            if not subscribers:
+                del self.topic_subscribers[topic]
+                await self.backplane.unwatch("topic", topic)
+        channel.topics.discard(topic)
+
+    async def send_personal_message(self, message: str, user_id: str) -> int:
+        """Отправить кадр во все соединения пользователя (на всех воркерах)"""
+        delivered = await self._fan_out(self.user_connections.get(user_id, ()), message, wait=True)
+        await self.backplane.publish("user", user_id, message)
+        return delivered
+
+    async def publish(self, topic: str, payload: Dict[str, Any],
+                      exclude: Optional[SocketChannel] = None) -> int:
+        """Рассылка события всем подписчикам топика; медленные клиенты не тормозят остальных"""
+        text = json.dumps(payload, default=str)
+        subscribers = self.topic_subscribers.get(topic, ())
+        targets = [channel for channel in subscribers if channel is not exclude]
+        delivered = await self._fan_out(targets, text, wait=False)
+        await self.backplane.publish("topic", topic, text)
+        return delivered
+
+    async def _deliver_remote(self, kind: str, target: str, text: str):
+        """Кадр от другого воркера: только локальная доставка, без повторной публикации"""
+        if kind == "user":
+            channels = self.user_connections.get(target, ())
+        elif kind == "topic":
+            channels = self.topic_subscribers.get(target, ())
+        else:
+            return
+        await self._fan_out(channels, text, wait=False)
+
+    async def _fan_out(self, channels: Iterable[SocketChannel], text: str, wait: bool) -> int:
+        channels = list(channels)
+        if not channels:
+            return 0
+        results = await asyncio.gather(
+            *(channel.send(text, wait=wait) for channel in channels),
+            return_exceptions=True
+        )
+        return sum(1 for result in results if result is True)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "users": len(self.user_connections),
+            "connections": sum(len(channels) for channels in self.user_connections.values()),
+            "topics": len(self.topic_subscribers)
+        }
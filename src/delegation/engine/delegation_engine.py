@@ -2,60 +2,227 @@
 🚀 Level 7: DelegationEngine v1.0
 Умная маршрутизация задач между AI агентами
 """
-from typing import Dict, List, Optional
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional
 from enum import Enum
-import re
+import logging
+import os
+
+from core.routing_rules import ROUTING_KEYWORDS, routing_rules
+from services.response_cache import normalize_prompt
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+if NUMPY_AVAILABLE:
+    from src.delegation.engine.task_classifier import MIN_CONFIDENCE, load_classifier
+else:
+    MIN_CONFIDENCE = 1.0
+
+logger = logging.getLogger(__name__)
+
+ROUTE_CACHE_SIZE = int(os.getenv('DELEGATION_ROUTE_CACHE_SIZE', 4096))
+
+# Признаки матрицы route_batch и веса индикаторов сложности (как в _analyze_complexity)
+BATCH_FEATURES = ('complexity:build', 'complexity:analysis', 'complexity:integration',
+                  'agent:dashka', 'agent:claude', 'chain:coding')
+COMPLEXITY_WEIGHTS = (2, 1, 2)
+
+# Все цепочки, которые может выдать _generate_chain
+CHAINS = (
+    ('COMPLEX', ['dashka', 'claude', 'deepseek', 'dashka']),
+    ('MEDIUM', ['claude', 'deepseek']),
+    ('MEDIUM', ['dashka', 'claude']),
+    ('SIMPLE', ['dashka']),
+    ('SIMPLE', ['claude']),
+    ('SIMPLE', ['deepseek'])
+)
 
 class TaskComplexity(Enum):
     SIMPLE = 1      # Один агент
     MEDIUM = 2      # Два агента  
     COMPLEX = 3     # Полная цепочка
 
+class RouteCache:
+    """💾 LRU решений маршрутизации по нормализованному тексту задачи"""
+    
+    def __init__(self, max_entries: int = ROUTE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def key(task_text: str) -> str:
+        # Маршрутизация не зависит от регистра и пробелов
+        return normalize_prompt(task_text).lower()
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        decision = self._entries.get(key)
+        if decision is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return {**decision, 'recommended_chain': list(decision['recommended_chain'])}
+    
+    def set(self, key: str, decision: Dict[str, Any]):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = decision
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
 class DelegationEngine:
-    def __init__(self):
+    def __init__(self, classifier=None, min_confidence: float = MIN_CONFIDENCE):
         self.agent_capabilities = {
             'dashka': {
                 'skills': ['coordination', 'ui_design', 'project_management', 'presentation'],
-                'keywords': ['координация', 'ui', 'дизайн', 'интерфейс', 'управление']
+                'keywords': ROUTING_KEYWORDS['agent:dashka']
             },
             'claude': {
                 'skills': ['analysis', 'architecture', 'planning', 'documentation'],
-                'keywords': ['анализ', 'архитектура', 'план', 'структура', 'документация']
+                'keywords': ROUTING_KEYWORDS['agent:claude']
             },
             'deepseek': {
                 'skills': ['coding', 'implementation', 'debugging', 'optimization'],
-                'keywords': ['код', 'программирование', 'реализация', 'разработка', 'баг']
+                'keywords': ROUTING_KEYWORDS['agent:deepseek']
             }
         }
+        self.cache = RouteCache()
+        # Обученный TaskClassifier (необязателен): уверенные предсказания заменяют ключевые слова
+        self.classifier = classifier
+        self.min_confidence = min_confidence
+        # Готовые решения для каждой возможной цепочки — route_batch только выбирает индекс
+        self._chain_decisions = [self._decision(complexity, chain) for complexity, chain in CHAINS]
         
     async def route_task(self, task_text: str) -> Dict:
         """🎯 Определяет оптимальную цепочку агентов для задачи"""
-        complexity = self._analyze_complexity(task_text)
-        chain = self._generate_chain(task_text, complexity)
+        key = self.cache.key(task_text)
+        decision = self.cache.get(key)
+        if decision is None:
+            decision = self._classify(key)
+            if decision is None:
+                # Один проход по тексту на все наборы ключевых слов
+                categories = routing_rules.match(key)
+                complexity = self._analyze_complexity(key, categories)
+                chain = self._generate_chain(key, complexity, categories)
+                decision = self._decision(complexity.name, chain)
+            self.cache.set(key, decision)
         
+        return {'task': task_text, **decision, 'recommended_chain': list(decision['recommended_chain'])}
+    
+    async def route_batch(self, tasks: List[str]) -> List[Dict]:
+        """📦 Маршрутизация множества задач: одинаковые тексты считаются один раз, новые — матрицей признаков"""
+        keys = [self.cache.key(task) for task in tasks]
+        decisions: Dict[str, Dict[str, Any]] = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            decision = self.cache.get(key)
+            if decision is None:
+                decision = self._classify(key)
+                if decision is None:
+                    missing.append(key)
+                    continue
+                self.cache.set(key, decision)
+            decisions[key] = decision
+        
+        for key, chain_index in zip(missing, self._score_batch(missing)):
+            decision = self._chain_decisions[chain_index]
+            self.cache.set(key, decision)
+            decisions[key] = decision
+        
+        return [
+            {'task': task, **decisions[key], 'recommended_chain': list(decisions[key]['recommended_chain'])}
+            for task, key in zip(tasks, keys)
+        ]
+    
+    def _score_batch(self, texts: List[str]) -> List[int]:
+        """🧮 Индексы CHAINS для текстов: матрица наличия признаков × веса сложности"""
+        if not texts:
+            return []
+        matches = [routing_rules.match(text) for text in texts]
+        
+        if not NUMPY_AVAILABLE:
+            return [self._chain_index(categories) for categories in matches]
+        
+        presence = np.array([[feature in categories for feature in BATCH_FEATURES] for categories in matches],
+                            dtype=bool)
+        score = presence[:, :3].astype(np.int8) @ np.array(COMPLEXITY_WEIGHTS, dtype=np.int8)
+        complex_, medium = score >= 3, (score >= 1) & (score < 3)
+        chain_index = np.select(
+            [complex_, medium & presence[:, 5], medium, presence[:, 3], presence[:, 4]],
+            [0, 1, 2, 3, 4],
+            default=5
+        )
+        return chain_index.tolist()
+    
+    def _classify(self, key: str) -> Optional[Dict[str, Any]]:
+        """🤖 Решение классификатора; None при низкой уверенности — тогда работают ключевые слова"""
+        if self.classifier is None:
+            return None
+        predictions = self.classifier.predict(key)
+        agent, confidence = predictions.get('agent', (None, 0.0))
+        if agent not in self.agent_capabilities or confidence < self.min_confidence:
+            return None
+        
+        complexity_label, complexity_confidence = predictions.get('complexity', (None, 0.0))
+        if complexity_label in TaskComplexity.__members__ and complexity_confidence >= self.min_confidence:
+            complexity = TaskComplexity[complexity_label]
+        else:
+            complexity = self._analyze_complexity(key)
+        
+        if complexity == TaskComplexity.SIMPLE:
+            chain = [agent]
+        elif complexity == TaskComplexity.MEDIUM:
+            chain = ['claude', 'deepseek'] if agent in ('claude', 'deepseek') else ['dashka', 'claude']
+        else:
+            chain = ['dashka', 'claude', 'deepseek', 'dashka']
+        return {**self._decision(complexity.name, chain), 'router': 'classifier', 'confidence': round(confidence, 3)}
+    
+    def _chain_index(self, categories: FrozenSet[str]) -> int:
+        complexity = self._analyze_complexity("", categories)
+        chain = self._generate_chain("", complexity, categories)
+        return next(index for index, (_, candidate) in enumerate(CHAINS) if candidate == chain)
+    
+    def _decision(self, complexity: str, chain: List[str]) -> Dict[str, Any]:
         return {
-            'task': task_text,
-            'complexity': complexity.name,
-            'recommended_chain': chain,
-            'reasoning': self._explain_routing(task_text, chain),
+            'complexity': complexity,
+            'recommended_chain': list(chain),
+            'reasoning': self._explain_routing("", chain),
             'estimated_time': len(chain) * 5,  # 5 мин на агента
-            'level': 7
+            'level': 7,
+            'router': 'keywords'
         }
     
-    def _analyze_complexity(self, task: str) -> TaskComplexity:
+    def _analyze_complexity(self, task: str, categories: Optional[FrozenSet[str]] = None) -> TaskComplexity:
         """📊 Анализ сложности задачи"""
-        task_lower = task.lower()
+        if categories is None:
+            categories = routing_rules.match(task)
         
         # Подсчитываем ключевые слова
         complexity_indicators = 0
         
-        if any(word in task_lower for word in ['создать', 'построить', 'разработать', 'implement']):
+        if 'complexity:build' in categories:
             complexity_indicators += 2
             
-        if any(word in task_lower for word in ['анализ', 'план', 'архитектура', 'analyze']):
+        if 'complexity:analysis' in categories:
             complexity_indicators += 1
             
-        if any(word in task_lower for word in ['интеграция', 'система', 'полный', 'complete']):
+        if 'complexity:integration' in categories:
             complexity_indicators += 2
             
         if complexity_indicators >= 3:
@@ -65,22 +232,24 @@ class DelegationEngine:
         else:
             return TaskComplexity.SIMPLE
     
-    def _generate_chain(self, task: str, complexity: TaskComplexity) -> List[str]:
+    def _generate_chain(self, task: str, complexity: TaskComplexity,
+                        categories: Optional[FrozenSet[str]] = None) -> List[str]:
         """🔗 Генерация цепочки агентов"""
-        task_lower = task.lower()
+        if categories is None:
+            categories = routing_rules.match(task)
         
         if complexity == TaskComplexity.SIMPLE:
             # Выбираем лучшего агента для простой задачи
-            if any(word in task_lower for word in self.agent_capabilities['dashka']['keywords']):
+            if 'agent:dashka' in categories:
                 return ['dashka']
-            elif any(word in task_lower for word in self.agent_capabilities['claude']['keywords']):
+            elif 'agent:claude' in categories:
                 return ['claude']
             else:
                 return ['deepseek']
                 
         elif complexity == TaskComplexity.MEDIUM:
             # Комбинация двух агентов
-            if any(word in task_lower for word in ['код', 'разработка', 'implementation']):
+            if 'chain:coding' in categories:
                 return ['claude', 'deepseek']  # Анализ + Реализация
             else:
                 return ['dashka', 'claude']   # Координация + Планирование
@@ -104,5 +273,15 @@ class DelegationEngine:
         else:
             return "Комплексная задача → полный цикл делегирования"
 
-# Создаем глобальный экземпляр
-delegation_engine = DelegationEngine()
+def default_classifier():
+    """Классификатор из DELEGATION_CLASSIFIER_PATH; битый или старый файл — только ключевые слова"""
+    if not NUMPY_AVAILABLE:
+        return None
+    try:
+        return load_classifier()
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"⚠️ Классификатор задач не загружен, маршрутизация по ключевым словам: {e}")
+        return None
+
+# Создаем глобальный экземпляр (классификатор — если есть файл DELEGATION_CLASSIFIER_PATH)
+delegation_engine = DelegationEngine(classifier=default_classifier())
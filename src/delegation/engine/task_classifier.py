@@ -0,0 +1,160 @@
+"""
+🚀 Level 7: TaskClassifier v1.0
+Линейный классификатор задач на хэшированных n-граммах: первый агент и сложность.
+Обучается на журнале делегирований, хранится компактным .npz, работает на CPU за доли миллисекунды
+"""
+import json
+import math
+import os
+import re
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+CLASSIFIER_PATH = os.getenv('DELEGATION_CLASSIFIER_PATH', 'data/task_classifier.npz')
+MIN_CONFIDENCE = float(os.getenv('DELEGATION_CLASSIFIER_MIN_CONFIDENCE', 0.6))
+
+N_FEATURES = 2 ** 14
+CHAR_NGRAMS = (3, 4)
+FORMAT_VERSION = 1
+
+WORD_RE = re.compile(r"\w+")
+
+Features = Tuple[np.ndarray, np.ndarray]
+
+
+class HashedNgramFeaturizer:
+    """Слова + символьные n-граммы внутри слов → crc32 → индекс; значения log(1+tf), L2-норма"""
+
+    def __init__(self, n_features: int = N_FEATURES, ngrams: Sequence[int] = CHAR_NGRAMS):
+        self.n_features = n_features
+        self.ngrams = tuple(ngrams)
+
+    def transform(self, text: str) -> Features:
+        counts: Dict[int, int] = {}
+        n_features = self.n_features
+        for word in WORD_RE.findall(text.lower().replace("ё", "е")):
+            index = zlib.crc32(f"w:{word}".encode()) % n_features
+            counts[index] = counts.get(index, 0) + 1
+            padded = f" {word} "
+            for n in self.ngrams:
+                for start in range(len(padded) - n + 1):
+                    index = zlib.crc32(padded[start:start + n].encode()) % n_features
+                    counts[index] = counts.get(index, 0) + 1
+
+        if not counts:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        indices = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+        values = np.log1p(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+        values /= np.linalg.norm(values)
+        return indices, values
+
+
+class LinearHead:
+    """Мультиклассовая логистическая регрессия по разреженным признакам"""
+
+    def __init__(self, classes: Sequence[str], n_features: int,
+                 weights: Optional[np.ndarray] = None, bias: Optional[np.ndarray] = None):
+        self.classes = list(classes)
+        self.weights = weights if weights is not None else np.zeros((n_features, len(self.classes)), np.float32)
+        self.bias = bias if bias is not None else np.zeros(len(self.classes), np.float32)
+
+    def probabilities(self, features: Features) -> np.ndarray:
+        indices, values = features
+        logits = values @ self.weights[indices] + self.bias
+        logits -= logits.max()
+        exp = np.exp(logits)
+        return exp / exp.sum()
+
+    def predict(self, features: Features) -> Tuple[str, float]:
+        probabilities = self.probabilities(features)
+        best = int(probabilities.argmax())
+        return self.classes[best], float(probabilities[best])
+
+    def fit(self, samples: List[Features], labels: List[str], epochs: int = 15,
+            learning_rate: float = 0.5, l2: float = 1e-4, seed: int = 0):
+        """SGD по примерам; обновляются только строки весов присутствующих признаков"""
+        targets = np.array([self.classes.index(label) for label in labels])
+        rng = np.random.default_rng(seed)
+        for epoch in range(epochs):
+            step = learning_rate / math.sqrt(epoch + 1)
+            for i in rng.permutation(len(samples)):
+                indices, values = samples[i]
+                gradient = self.probabilities(samples[i])
+                gradient[targets[i]] -= 1.0
+                rows = self.weights[indices]
+                self.weights[indices] = rows * (1 - step * l2) - step * np.outer(values, gradient)
+                self.bias -= step * gradient
+
+
+class TaskClassifier:
+    """Головы: agent (первый агент цепочки) и, если есть разметка, complexity"""
+
+    def __init__(self, featurizer: Optional[HashedNgramFeaturizer] = None,
+                 heads: Optional[Dict[str, LinearHead]] = None):
+        self.featurizer = featurizer or HashedNgramFeaturizer()
+        self.heads = heads or {}
+
+    def predict(self, text: str) -> Dict[str, Tuple[str, float]]:
+        features = self.featurizer.transform(text)
+        return {name: head.predict(features) for name, head in self.heads.items()}
+
+    @classmethod
+    def train(cls, examples: Iterable[Dict[str, str]], epochs: int = 15,
+              featurizer: Optional[HashedNgramFeaturizer] = None) -> "TaskClassifier":
+        """examples: {'text', 'agent', 'complexity'?}; голова обучается на примерах со своей меткой"""
+        classifier = cls(featurizer)
+        examples = list(examples)
+        features = [classifier.featurizer.transform(example["text"]) for example in examples]
+
+        for name in ("agent", "complexity"):
+            labelled = [(f, e[name]) for f, e in zip(features, examples) if e.get(name)]
+            classes = sorted({label for _, label in labelled})
+            if len(classes) < 2:
+                continue
+            head = LinearHead(classes, classifier.featurizer.n_features)
+            head.fit([f for f, _ in labelled], [label for _, label in labelled], epochs=epochs)
+            classifier.heads[name] = head
+        return classifier
+
+    def save(self, path: str):
+        """Веса в float16 и сжатый npz: десятки–сотни КБ"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        arrays = {
+            "meta": np.array(json.dumps({
+                "version": FORMAT_VERSION,
+                "n_features": self.featurizer.n_features,
+                "ngrams": list(self.featurizer.ngrams),
+                "heads": list(self.heads)
+            }))
+        }
+        for name, head in self.heads.items():
+            arrays[f"{name}_weights"] = head.weights.astype(np.float16)
+            arrays[f"{name}_bias"] = head.bias.astype(np.float32)
+            arrays[f"{name}_classes"] = np.array(head.classes)
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "TaskClassifier":
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("version") != FORMAT_VERSION:
+                raise ValueError(f"Unsupported classifier format: {meta.get('version')}")
+            featurizer = HashedNgramFeaturizer(meta["n_features"], meta["ngrams"])
+            heads = {}
+            for name in meta["heads"]:
+                classes = [str(label) for label in data[f"{name}_classes"]]
+                weights = data[f"{name}_weights"].astype(np.float32)
+                bias = data[f"{name}_bias"]
+                if weights.shape != (meta["n_features"], len(classes)) or bias.shape != (len(classes),):
+                    raise ValueError(f"Classifier head {name}: shape {weights.shape} does not match meta")
+                heads[name] = LinearHead(classes, meta["n_features"], weights=weights, bias=bias)
+        return cls(featurizer, heads)
+
+
+def load_classifier(path: str = CLASSIFIER_PATH) -> Optional[TaskClassifier]:
+    """Классификатор, если файл модели есть; иначе None — работают ключевые слова"""
+    if not path or not os.path.exists(path):
+        return None
+    return TaskClassifier.load(path)
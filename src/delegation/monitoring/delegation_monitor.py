@@ -0,0 +1,64 @@
+"""
+🚀 Level 7: DelegationMonitor v1.0
+Наблюдение за выполнением workflow: активные цепочки, последние запуски, время шагов по агентам
+"""
+from collections import deque
+from typing import Any, Deque, Dict
+
+RECENT_WORKFLOWS = 100
+
+
+class DelegationMonitor:
+    def __init__(self, recent: int = RECENT_WORKFLOWS):
+        self.active: Dict[str, Dict[str, Any]] = {}
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=recent)
+        self.workflows_by_status: Dict[str, int] = {}
+        self.steps_by_status: Dict[str, int] = {}
+        self._agent_time: Dict[str, Dict[str, float]] = {}
+
+    def record(self, event: Dict[str, Any]):
+        """📈 Событие WorkflowOrchestrator (workflow_started / workflow_step / workflow_completed)"""
+        workflow_id = event.get("workflow_id")
+        event_type = event.get("type")
+
+        if event_type == "workflow_started":
+            self.active[workflow_id] = {
+                "workflow_id": workflow_id,
+                "task": event.get("task"),
+                "steps": {step["step_id"]: "pending" for step in event.get("steps", [])}
+            }
+
+        elif event_type == "workflow_step":
+            workflow = self.active.get(workflow_id)
+            if workflow is not None:
+                workflow["steps"][event["step_id"]] = event["status"]
+            if event["status"] not in ("running", "pending"):
+                self.steps_by_status[event["status"]] = self.steps_by_status.get(event["status"], 0) + 1
+            if event["status"] == "completed":
+                agent = self._agent_time.setdefault(event["agent_id"], {"steps": 0, "total_ms": 0.0})
+                agent["steps"] += 1
+                agent["total_ms"] += event.get("duration_ms", 0.0)
+
+        elif event_type == "workflow_completed":
+            workflow = self.active.pop(workflow_id, {"workflow_id": workflow_id, "steps": {}})
+            workflow.update(status=event.get("status"), duration_ms=event.get("duration_ms"))
+            self.recent.append(workflow)
+            self.workflows_by_status[event["status"]] = self.workflows_by_status.get(event["status"], 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": len(self.active),
+            "workflows": dict(self.workflows_by_status),
+            "steps": dict(self.steps_by_status),
+            "agents": {
+                agent_id: {
+                    "steps": data["steps"],
+                    "avg_ms": round(data["total_ms"] / data["steps"], 1) if data["steps"] else 0.0
+                }
+                for agent_id, data in self._agent_time.items()
+            }
+        }
+
+
+# Создаем глобальный экземпляр
+delegation_monitor = DelegationMonitor()
@@ -0,0 +1,330 @@
+"""
+🚀 Level 7: WorkflowOrchestrator v1.0
+Выполнение цепочки агентов как DAG: передача результатов между шагами,
+параллельные шаги без взаимных зависимостей, дедлайны на шаг и на весь workflow
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from utils.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+STEP_TIMEOUT = float(os.getenv('DELEGATION_STEP_TIMEOUT', 60))
+WORKFLOW_TIMEOUT = float(os.getenv('DELEGATION_WORKFLOW_TIMEOUT', 180))
+
+# Роль агента в цепочке — подсказка в промпте шага
+AGENT_ROLES = {
+    'dashka': 'координация и управление проектом',
+    'claude': 'анализ и архитектурное планирование',
+    'deepseek': 'техническая реализация и разработка'
+}
+# Координатор в начале цепочки составляет план, в конце — сводит результаты
+COORDINATOR = 'dashka'
+# Чьи результаты нужны агенту: deepseek реализует план claude.
+# Специалисты без таких входов зависят только от плана и идут параллельно
+HANDOFFS = {
+    'deepseek': ('claude',)
+}
+
+EventCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+@dataclass
+class WorkflowStep:
+    id: str
+    agent_id: str
+    depends_on: List[str] = field(default_factory=list)
+    instruction: str = ""
+    timeout: float = STEP_TIMEOUT
+
+
+@dataclass
+class Workflow:
+    task: str
+    steps: List[WorkflowStep]
+    timeout: float = WORKFLOW_TIMEOUT
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+
+    @classmethod
+    def from_chain(cls, task: str, chain: List[str], step_timeout: float = STEP_TIMEOUT,
+                   timeout: float = WORKFLOW_TIMEOUT) -> "Workflow":
+        """
+        Цепочка DelegationEngine → DAG по реальным входам шагов.
+        Шаг зависит от последнего предыдущего шага агента из HANDOFFS (claude → deepseek),
+        иначе — только от плана координатора в начале цепочки; без плана шаг независим.
+        В цепочке dashka → ... → dashka финальный шаг сводит результаты всех специалистов.
+        """
+        steps = [
+            WorkflowStep(id=f"{index + 1}_{agent_id}", agent_id=agent_id, timeout=step_timeout)
+            for index, agent_id in enumerate(chain)
+        ]
+        plan = steps[0] if steps and chain[0] == COORDINATOR else None
+        coordinated = plan is not None and len(steps) > 2 and chain[-1] == COORDINATOR
+        specialists = steps[1:-1] if coordinated else steps[1:]
+        for index, step in enumerate(specialists, 1):
+            inputs = [s.id for s in steps[:index] if s.agent_id in HANDOFFS.get(step.agent_id, ())]
+            if inputs:
+                step.depends_on = [inputs[-1]]
+            elif plan is not None:
+                step.depends_on = [plan.id]
+        if coordinated:
+            steps[-1].depends_on = [s.id for s in specialists]
+            plan.instruction = "Составь план и распредели работу между специалистами."
+            steps[-1].instruction = "Сведи результаты специалистов в итоговый ответ."
+        return cls(task=task, steps=steps, timeout=timeout)
+
+    @classmethod
+    def from_steps(cls, task: str, steps: List[Dict[str, Any]], step_timeout: float = STEP_TIMEOUT,
+                   timeout: float = WORKFLOW_TIMEOUT) -> "Workflow":
+        """Явный DAG от вызывающего: [{"id", "agent_id", "depends_on", "instruction"}]"""
+        workflow = cls(task=task, steps=[
+            WorkflowStep(
+                id=str(step["id"]),
+                agent_id=step["agent_id"],
+                depends_on=[str(dep) for dep in step.get("depends_on") or ()],
+                instruction=step.get("instruction") or "",
+                timeout=step_timeout
+            )
+            for step in steps
+        ], timeout=timeout)
+        workflow.validate()
+        return workflow
+
+    def validate(self):
+        ids = {step.id for step in self.steps}
+        if len(ids) != len(self.steps):
+            raise ValueError("Duplicate step ids")
+        for step in self.steps:
+            missing = [dep for dep in step.depends_on if dep not in ids]
+            if missing:
+                raise ValueError(f"Step {step.id} depends on unknown steps: {missing}")
+
+        # Проверка на циклы (алгоритм Кана)
+        indegree = {step.id: len(step.depends_on) for step in self.steps}
+        dependents: Dict[str, List[str]] = {step.id: [] for step in self.steps}
+        for step in self.steps:
+            for dep in step.depends_on:
+                dependents[dep].append(step.id)
+        ready = [step_id for step_id, degree in indegree.items() if degree == 0]
+        visited = 0
+        while ready:
+            step_id = ready.pop()
+            visited += 1
+            for child in dependents[step_id]:
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    ready.append(child)
+        if visited != len(self.steps):
+            raise ValueError("Workflow has a dependency cycle")
+
+
+@dataclass
+class StepResult:
+    step_id: str
+    agent_id: str
+    status: str = "pending"  # pending | running | completed | failed | timeout | skipped
+    output: str = ""
+    backend: Optional[str] = None
+    duration_ms: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "step_id": self.step_id,
+            "agent_id": self.agent_id,
+            "status": self.status,
+            "output": self.output,
+            "backend": self.backend,
+            "duration_ms": round(self.duration_ms, 1)
+        }
+
+
+@dataclass
+class WorkflowResult:
+    workflow_id: str
+    task: str
+    status: str
+    steps: List[StepResult]
+    output: str
+    duration_ms: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "workflow_id": self.workflow_id,
+            "task": self.task,
+            "status": self.status,
+            "steps": [step.to_dict() for step in self.steps],
+            "output": self.output,
+            "duration_ms": round(self.duration_ms, 1)
+        }
+
+
+class WorkflowOrchestrator:
+    def __init__(self, router, monitor=None):
+        self.router = router
+        self.monitor = monitor
+
+    async def run(self, workflow: Workflow, on_event: Optional[EventCallback] = None,
+                  user_id: str = "default") -> WorkflowResult:
+        """⚙️ Выполнение DAG: шаг стартует, как только готовы все его зависимости"""
+        attributes = {"workflow.id": workflow.id, "workflow.steps": len(workflow.steps)}
+        with tracer.span("workflow.run", attributes) as span:
+            workflow_result = await self._execute(workflow, on_event, user_id)
+            span.set_attribute("workflow.status", workflow_result.status)
+            return workflow_result
+
+    async def _execute(self, workflow: Workflow, on_event: Optional[EventCallback],
+                       user_id: str) -> WorkflowResult:
+        workflow.validate()
+        results = {step.id: StepResult(step.id, step.agent_id) for step in workflow.steps}
+        started = time.perf_counter()
+        deadline = started + workflow.timeout
+        running: Dict[asyncio.Task, str] = {}
+        step_started: Dict[str, float] = {}
+
+        async def emit(event: Dict[str, Any]):
+            event = {"workflow_id": workflow.id, **event}
+            if self.monitor is not None:
+                self.monitor.record(event)
+            if on_event is not None:
+                await on_event(event)
+
+        async def step_event(result: StepResult):
+            await emit({"type": "workflow_step", **result.to_dict()})
+
+        await emit({
+            "type": "workflow_started",
+            "task": workflow.task,
+            "steps": [{"step_id": s.id, "agent_id": s.agent_id, "depends_on": s.depends_on} for s in workflow.steps]
+        })
+
+        try:
+            while True:
+                # Шаги, у которых упала зависимость, не запускаются
+                for step in workflow.steps:
+                    result = results[step.id]
+                    if result.status == "pending" and any(
+                        results[dep].status in ("failed", "timeout", "skipped") for dep in step.depends_on
+                    ):
+                        result.status = "skipped"
+                        await step_event(result)
+
+                for step in workflow.steps:
+                    result = results[step.id]
+                    if result.status == "pending" and all(
+                        results[dep].status == "completed" for dep in step.depends_on
+                    ):
+                        result.status = "running"
+                        step_started[step.id] = time.perf_counter()
+                        await step_event(result)
+                        task = asyncio.create_task(self._run_step(workflow, step, results, deadline, user_id))
+                        running[task] = step.id
+
+                if not running:
+                    break
+
+                remaining = deadline - time.perf_counter()
+                done, _ = await asyncio.wait(
+                    running, timeout=max(0.0, remaining), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # Общий дедлайн: останавливаем все, что еще выполняется
+                    for task, step_id in running.items():
+                        task.cancel()
+                        results[step_id].status = "timeout"
+                        results[step_id].duration_ms = (time.perf_counter() - step_started[step_id]) * 1000
+                        await step_event(results[step_id])
+                    running.clear()
+                    continue
+
+                for task in done:
+                    step_id = running.pop(task)
+                    await step_event(results[step_id])
+        finally:
+            for task in running:
+                task.cancel()
+
+        # Зависимость упала позже по порядку списка — оставшиеся шаги тоже не выполнялись
+        for step in workflow.steps:
+            if results[step.id].status == "pending":
+                results[step.id].status = "skipped"
+                await step_event(results[step.id])
+
+        sinks = [step for step in workflow.steps
+                 if not any(step.id in other.depends_on for other in workflow.steps)]
+        outputs = [results[step.id].output for step in sinks if results[step.id].status == "completed"]
+        statuses = {result.status for result in results.values()}
+        if statuses == {"completed"}:
+            status = "completed"
+        elif "completed" in statuses:
+            status = "partial"
+        else:
+            status = "failed"
+
+        workflow_result = WorkflowResult(
+            workflow_id=workflow.id,
+            task=workflow.task,
+            status=status,
+            steps=[results[step.id] for step in workflow.steps],
+            output="\n\n".join(outputs),
+            duration_ms=(time.perf_counter() - started) * 1000
+        )
+        await emit({
+            "type": "workflow_completed",
+            "status": status,
+            "output": workflow_result.output,
+            "duration_ms": round(workflow_result.duration_ms, 1)
+        })
+        return workflow_result
+
+    async def _run_step(self, workflow: Workflow, step: WorkflowStep, results: Dict[str, StepResult],
+                        deadline: float, user_id: str):
+        result = results[step.id]
+        started = time.perf_counter()
+        timeout = min(step.timeout, max(0.0, deadline - started))
+        with tracer.span("workflow.step", {"workflow.step_id": step.id, "ai.agent": step.agent_id}) as span:
+            try:
+                reply = await asyncio.wait_for(
+                    self.router.route(
+                        self._build_prompt(workflow, step, results),
+                        step.agent_id,
+                        user_id=user_id
+                    ),
+                    timeout=timeout
+                )
+            except asyncio.TimeoutError:
+                result.status = "timeout"
+                result.output = f"❌ Шаг {step.id} не уложился в {timeout:.0f}с"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Ошибка шага не должна остаться в задаче: шаг падает, зависимые пропускаются
+                logger.error(f"❌ Workflow step {step.id} error: {e}")
+                result.status = "failed"
+                result.output = f"❌ Шаг {step.id} завершился ошибкой: {e}"
+            else:
+                result.output = reply.text
+                result.backend = reply.backend
+                result.status = "completed" if reply.backend is not None else "failed"
+            span.set_attribute("workflow.step_status", result.status)
+            if result.status != "completed":
+                span.set_status("error", result.status)
+        result.duration_ms = (time.perf_counter() - started) * 1000
+
+    def _build_prompt(self, workflow: Workflow, step: WorkflowStep, results: Dict[str, StepResult]) -> str:
+        parts = [f"Задача: {workflow.task}"]
+        role = AGENT_ROLES.get(step.agent_id)
+        if role:
+            parts.append(f"Твоя роль: {role}.")
+        if step.instruction:
+            parts.append(step.instruction)
+        if step.depends_on:
+            parts.append("Результаты предыдущих шагов:")
+            for dep in step.depends_on:
+                parts.append(f"[{results[dep].agent_id.upper()}]: {results[dep].output}")
+        return "\n\n".join(parts)
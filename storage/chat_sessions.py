@@ -0,0 +1,119 @@
+# storage/chat_sessions.py
+"""
+Репозиторий чат-сессий со вторичными индексами
+"""
+
+from itertools import islice
+from typing import Any, Dict, List, Optional
+
+from models.chat_models import ChatSession
+
+# Индексируемые поля сессии
+INDEXED_FIELDS = ("project_id", "agent_id", "is_active")
+
+
+class ChatSessionRepository:
+    """
+    Сессии по id + индексы project_id → сессии, agent_id → сессии, активные сессии.
+    Индексы — упорядоченные dict (порядок создания), поэтому листинг и подсчет без сканов.
+    """
+
+    def __init__(self):
+        self._sessions: Dict[str, ChatSession] = {}
+        self._by_project: Dict[str, Dict[str, None]] = {}
+        self._by_agent: Dict[str, Dict[str, None]] = {}
+        self._active_by_project: Dict[str, Dict[str, None]] = {}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        return self._sessions.get(session_id)
+
+    def create(self, session: ChatSession) -> ChatSession:
+        if session.id in self._sessions:
+            raise ValueError(f"Chat session already exists: {session.id}")
+        self._sessions[session.id] = session
+        self._index(session)
+        return session
+
+    def update(self, session_id: str, **changes: Any) -> Optional[ChatSession]:
+        """Изменение полей сессии: трогаем только индексы измененных полей, порядок листинга сохраняется"""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+
+        before = {field: getattr(session, field) for field in INDEXED_FIELDS}
+        for field, value in changes.items():
+            setattr(session, field, value)
+
+        if session.project_id != before["project_id"]:
+            self._remove(self._by_project, before["project_id"], session.id)
+            self._remove(self._active_by_project, before["project_id"], session.id)
+            self._by_project.setdefault(session.project_id, {})[session.id] = None
+            if session.is_active:
+                self._activate(session)
+        elif session.is_active != before["is_active"]:
+            if session.is_active:
+                self._activate(session)
+            else:
+                self._remove(self._active_by_project, session.project_id, session.id)
+
+        if session.agent_id != before["agent_id"]:
+            self._remove(self._by_agent, before["agent_id"], session.id)
+            self._by_agent.setdefault(session.agent_id, {})[session.id] = None
+        return session
+
+    def delete(self, session_id: str) -> Optional[ChatSession]:
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._unindex(session.id, session.project_id, session.agent_id)
+        return session
+
+    def list_by_project(self, project_id: str, offset: int = 0, limit: int = 50,
+                        active_only: bool = False) -> List[ChatSession]:
+        index = self._active_by_project if active_only else self._by_project
+        return self._page(index.get(project_id), offset, limit)
+
+    def list_by_agent(self, agent_id: str, offset: int = 0, limit: int = 50) -> List[ChatSession]:
+        return self._page(self._by_agent.get(agent_id), offset, limit)
+
+    def count_by_project(self, project_id: str, active_only: bool = False) -> int:
+        index = self._active_by_project if active_only else self._by_project
+        return len(index.get(project_id, ()))
+
+    def count_by_agent(self, agent_id: str) -> int:
+        return len(self._by_agent.get(agent_id, ()))
+
+    def _page(self, ids: Optional[Dict[str, None]], offset: int, limit: int) -> List[ChatSession]:
+        if not ids or limit <= 0:
+            return []
+        return [self._sessions[session_id] for session_id in islice(ids, max(offset, 0), max(offset, 0) + limit)]
+
+    def _index(self, session: ChatSession):
+        self._by_project.setdefault(session.project_id, {})[session.id] = None
+        self._by_agent.setdefault(session.agent_id, {})[session.id] = None
+        if session.is_active:
+            self._active_by_project.setdefault(session.project_id, {})[session.id] = None
+
+    def _activate(self, session: ChatSession):
+        """Активная сессия встает на свое место в порядке создания, а не в конец"""
+        active = self._active_by_project.get(session.project_id, {})
+        self._active_by_project[session.project_id] = {
+            session_id: None for session_id in self._by_project[session.project_id]
+            if session_id == session.id or session_id in active
+        }
+
+    def _unindex(self, session_id: str, project_id: str, agent_id: str):
+        self._remove(self._by_project, project_id, session_id)
+        self._remove(self._by_agent, agent_id, session_id)
+        self._remove(self._active_by_project, project_id, session_id)
+
+    @staticmethod
+    def _remove(index: Dict[str, Dict[str, None]], key: str, session_id: str):
+        ids = index.get(key)
+        if ids is None:
+            return
+        ids.pop(session_id, None)
+        if not ids:
+            del index[key]
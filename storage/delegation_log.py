@@ -0,0 +1,323 @@
+# storage/delegation_log.py
+"""
+Журнал делегирований: сегменты фиксированного размера (старые вытесняются целиком),
+монотонные id, индексы по паре агентов / получателю / пользователю,
+запросы по времени и курсору, append-only JSONL по файлу на сегмент
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import deque
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SIZE = int(os.getenv('DELEGATION_LOG_SEGMENT_SIZE', 1024))
+MAX_SEGMENTS = int(os.getenv('DELEGATION_LOG_MAX_SEGMENTS', 64))
+# Пусто — только память
+LOG_DIR = os.getenv('DELEGATION_LOG_DIR', '')
+MAX_PAGE_SIZE = 500
+
+
+@dataclass
+class DelegationEntry:
+    id: int
+    ts: float
+    from_agent: str
+    to_agent: str
+    message: str
+    user_id: Any
+    complexity: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "timestamp": datetime.utcfromtimestamp(self.ts).isoformat(),
+            "from_agent": self.from_agent,
+            "to_agent": self.to_agent,
+            "message": self.message,
+            "user_id": self.user_id,
+            "complexity": self.complexity
+        }
+
+
+class _Segment:
+    """Непрерывный диапазон id; ts растут вместе с id"""
+
+    def __init__(self, first_id: int):
+        self.first_id = first_id
+        self.entries: List[DelegationEntry] = []
+        self.timestamps: List[float] = []
+        self.path: Optional[str] = None
+        self.file = None
+
+
+class _IdIndex:
+    """Возрастающие id одного ключа; вытесненные срезаются с головы"""
+
+    def __init__(self):
+        self.ids: List[int] = []
+        self.head = 0
+
+    def __len__(self) -> int:
+        return len(self.ids) - self.head
+
+    def trim(self, min_id: int):
+        self.head = bisect_left(self.ids, min_id, self.head)
+        # Компактируем, когда мертвая голова больше живой части
+        if self.head > len(self.ids) // 2:
+            del self.ids[:self.head]
+            self.head = 0
+
+    def between(self, lo: int, hi: int) -> List[int]:
+        start = bisect_left(self.ids, lo, self.head)
+        end = bisect_right(self.ids, hi, start)
+        return self.ids[start:end]
+
+
+class DelegationLog:
+    def __init__(self, segment_size: int = SEGMENT_SIZE, max_segments: int = MAX_SEGMENTS,
+                 log_dir: str = LOG_DIR):
+        self.segment_size = segment_size
+        self.max_segments = max(1, max_segments)
+        self.log_dir = log_dir
+        self._segments: Deque[_Segment] = deque()
+        self._next_id = 1
+        self._last_ts = 0.0
+        self._lock = threading.RLock()
+        self._by_pair: Dict[Tuple[str, str], _IdIndex] = {}
+        self._by_to_agent: Dict[str, _IdIndex] = {}
+        self._by_user: Dict[str, _IdIndex] = {}
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return sum(len(segment.entries) for segment in self._segments)
+
+    # --- запись ---
+
+    def append(self, from_agent: str, to_agent: str, message: str, user_id: Any,
+               complexity: Optional[str] = None, ts: Optional[float] = None) -> DelegationEntry:
+        with self._lock:
+            # Время не идет назад, даже если системные часы скорректировали
+            ts = max(self._last_ts, time.time() if ts is None else ts)
+            entry = DelegationEntry(self._next_id, ts, from_agent, to_agent, message, user_id, complexity)
+            self._next_id += 1
+            if not self._segments or len(self._segments[-1].entries) >= self.segment_size:
+                self._roll(self._new_segment(entry.id))
+            self._add(entry)
+            self._persist(entry)
+            return entry
+
+    def _roll(self, segment: _Segment):
+        self._segments.append(segment)
+        while len(self._segments) > self.max_segments:
+            self._evict()
+
+    def _add(self, entry: DelegationEntry):
+        segment = self._segments[-1]
+        segment.entries.append(entry)
+        segment.timestamps.append(entry.ts)
+        self._last_ts = entry.ts
+
+        self._by_pair.setdefault((entry.from_agent, entry.to_agent), _IdIndex()).ids.append(entry.id)
+        self._by_to_agent.setdefault(entry.to_agent, _IdIndex()).ids.append(entry.id)
+        self._by_user.setdefault(str(entry.user_id), _IdIndex()).ids.append(entry.id)
+
+    def _new_segment(self, first_id: int) -> _Segment:
+        segment = _Segment(first_id)
+        if self.log_dir:
+            segment.path = os.path.join(self.log_dir, f"delegations-{first_id:012d}.jsonl")
+            segment.file = open(segment.path, "a", encoding="utf-8")
+        return segment
+
+    def _evict(self):
+        segment = self._segments.popleft()
+        self.evicted += len(segment.entries)
+        if segment.file is not None:
+            segment.file.close()
+        if segment.path is not None:
+            try:
+                os.remove(segment.path)
+            except FileNotFoundError:
+                pass
+        min_id = self._segments[0].first_id
+        for indexes in (self._by_pair, self._by_to_agent, self._by_user):
+            for key in list(indexes):
+                indexes[key].trim(min_id)
+                if not indexes[key]:
+                    del indexes[key]
+
+    def _persist(self, entry: DelegationEntry):
+        segment = self._segments[-1]
+        if segment.file is not None:
+            segment.file.write(json.dumps(asdict(entry), ensure_ascii=False) + "\n")
+            segment.file.flush()
+
+    # --- диск ---
+
+    def open(self):
+        """Восстановление из файлов сегментов; новые записи продолжают последний сегмент"""
+        if not self.log_dir:
+            return
+        os.makedirs(self.log_dir, exist_ok=True)
+        names = sorted(name for name in os.listdir(self.log_dir)
+                       if name.startswith("delegations-") and name.endswith(".jsonl"))
+        # Лишние старые сегменты (уменьшили MAX_SEGMENTS) удаляем сразу
+        for name in names[:-self.max_segments]:
+            os.remove(os.path.join(self.log_dir, name))
+        names = names[-self.max_segments:]
+
+        with self._lock:
+            restored = 0
+            for name in names:
+                path = os.path.join(self.log_dir, name)
+                # Сегмент в памяти = файл на диске, даже если размер сегмента с тех пор меняли
+                segment = None
+                for entry in self._read_segment(path):
+                    if entry.id < self._next_id:
+                        continue
+                    if segment is None:
+                        segment = _Segment(entry.id)
+                        segment.path = path
+                        self._roll(segment)
+                    self._next_id = entry.id + 1
+                    self._add(entry)
+                    restored += 1
+                if segment is None:
+                    os.remove(path)
+            if self._segments:
+                last = self._segments[-1]
+                last.file = open(last.path, "a", encoding="utf-8")
+        if restored:
+            logger.info(f"📋 Журнал делегирований восстановлен: {restored} записей, следующий id {self._next_id}")
+
+    def _read_segment(self, path: str) -> Iterator[DelegationEntry]:
+        with open(path, "r+", encoding="utf-8") as f:
+            valid = 0
+            for line in f:
+                # Оборванная последняя строка после падения процесса
+                if not line.endswith("\n"):
+                    break
+                try:
+                    entry = DelegationEntry(**json.loads(line))
+                except (json.JSONDecodeError, TypeError):
+                    break
+                yield entry
+                valid += len(line.encode("utf-8"))
+            f.truncate(valid)
+
+    def close(self):
+        with self._lock:
+            for segment in self._segments:
+                if segment.file is not None:
+                    segment.file.close()
+                    segment.file = None
+
+    # --- чтение ---
+
+    def get(self, entry_id: int) -> Optional[DelegationEntry]:
+        with self._lock:
+            index = bisect_right(self._segments, entry_id, key=lambda segment: segment.first_id) - 1
+            if index < 0:
+                return None
+            segment = self._segments[index]
+            position = entry_id - segment.first_id
+            return segment.entries[position] if position < len(segment.entries) else None
+
+    def query(self, to_agent: Optional[str] = None, from_agent: Optional[str] = None,
+              user_id: Any = None, since: Optional[float] = None, until: Optional[float] = None,
+              before_id: Optional[int] = None, limit: int = 50) -> Tuple[List[DelegationEntry], Optional[int]]:
+        """
+        Самые новые записи (по убыванию id), удовлетворяющие фильтрам; since ≤ ts < until.
+        Возвращает страницу и курсор для следующей (before_id) или None.
+        """
+        limit = max(0, min(limit, MAX_PAGE_SIZE))
+        with self._lock:
+            if not self._segments or limit == 0:
+                return [], None
+            lo = self._segments[0].first_id
+            hi = self._next_id - 1
+            if since is not None:
+                lo = max(lo, self._first_id_at(since))
+            if until is not None:
+                hi = min(hi, self._first_id_at(until) - 1)
+            if before_id is not None:
+                hi = min(hi, before_id - 1)
+            if lo > hi:
+                return [], None
+
+            index = self._pick_index(to_agent, from_agent, user_id)
+            if index is False:
+                return [], None
+            ids = range(hi, lo - 1, -1) if index is None else reversed(index.between(lo, hi))
+
+            page: List[DelegationEntry] = []
+            for entry_id in ids:
+                entry = self.get(entry_id)
+                if (to_agent is not None and entry.to_agent != to_agent) \
+                        or (from_agent is not None and entry.from_agent != from_agent) \
+                        or (user_id is not None and str(entry.user_id) != str(user_id)):
+                    continue
+                if len(page) == limit:
+                    return page, page[-1].id
+                page.append(entry)
+            return page, None
+
+    def recent(self, limit: int = 50) -> List[DelegationEntry]:
+        """Последние записи в хронологическом порядке"""
+        page, _ = self.query(limit=limit)
+        return page[::-1]
+
+    def iter_all(self) -> Iterator[DelegationEntry]:
+        with self._lock:
+            segments = [list(segment.entries) for segment in self._segments]
+        for entries in segments:
+            yield from entries
+
+    def _first_id_at(self, ts: float) -> int:
+        """Первый id с временем ≥ ts (или следующий id, если таких нет)"""
+        starts = [segment.timestamps[0] for segment in self._segments]
+        index = max(0, bisect_left(starts, ts) - 1)
+        for segment in list(self._segments)[index:]:
+            position = bisect_left(segment.timestamps, ts)
+            if position < len(segment.entries):
+                return segment.first_id + position
+        return self._next_id
+
+    def _pick_index(self, to_agent, from_agent, user_id):
+        """Самый короткий подходящий индекс; False — фильтру ничего не соответствует"""
+        candidates = []
+        if to_agent is not None and from_agent is not None:
+            candidates.append(self._by_pair.get((from_agent, to_agent)))
+        elif to_agent is not None:
+            candidates.append(self._by_to_agent.get(to_agent))
+        if user_id is not None:
+            candidates.append(self._by_user.get(str(user_id)))
+        if not candidates:
+            # Только from_agent: объединения индексов не держим, сканируем диапазон
+            return None
+        if any(index is None for index in candidates):
+            return False
+        return min(candidates, key=len)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self),
+                "segments": len(self._segments),
+                "segment_size": self.segment_size,
+                "max_segments": self.max_segments,
+                "next_id": self._next_id,
+                "evicted": self.evicted,
+                "persistent": bool(self.log_dir)
+            }
+
+
+# Глобальный экземпляр
+delegation_log = DelegationLog()
@@ -0,0 +1,184 @@
+# storage/message_store.py
+"""
+Хранилище сообщений чата: in-memory и SQL (SQLite локально, PostgreSQL в production)
+"""
+
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, create_engine, delete, insert, or_, select
+from sqlalchemy.orm import Session
+
+from models.chat_models import Message
+from storage.models import Base, ChatMessageRecord
+
+logger = logging.getLogger(__name__)
+
+MAX_PAGE_SIZE = 500
+MEMORY_MESSAGES_PER_PROJECT = int(os.getenv('MEMORY_MESSAGES_PER_PROJECT', 10000))
+
+
+class MessageStore:
+    """Интерфейс хранилища: запись пачками и постраничная история проекта"""
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def add(self, message: Message):
+        await self.add_many([message])
+
+    async def add_many(self, messages: List[Message]):
+        raise NotImplementedError
+
+    async def list(self, project_id: str, limit: int = 50, before: Optional[str] = None) -> List[Message]:
+        """Последние limit сообщений (по возрастанию времени), строго раньше сообщения before"""
+        raise NotImplementedError
+
+    async def clear(self, project_id: str):
+        raise NotImplementedError
+
+
+class _ProjectLog:
+    """Сообщения проекта с порядковыми номерами для курсора"""
+
+    def __init__(self):
+        self.messages: List[Message] = []
+        self.first_seq = 0
+        self.positions: Dict[str, int] = {}
+
+
+class InMemoryMessageStore(MessageStore):
+    """Хранилище в памяти процесса с ограничением истории на проект"""
+
+    def __init__(self, max_per_project: int = MEMORY_MESSAGES_PER_PROJECT):
+        self.max_per_project = max_per_project
+        self._projects: Dict[str, _ProjectLog] = {}
+
+    async def add_many(self, messages: List[Message]):
+        for message in messages:
+            log = self._projects.get(message.project_id)
+            if log is None:
+                log = self._projects[message.project_id] = _ProjectLog()
+            log.positions[message.id] = log.first_seq + len(log.messages)
+            log.messages.append(message)
+            if len(log.messages) > self.max_per_project:
+                self._trim(log)
+
+    async def list(self, project_id: str, limit: int = 50, before: Optional[str] = None) -> List[Message]:
+        log = self._projects.get(project_id)
+        if log is None or limit <= 0:
+            return []
+
+        end = len(log.messages)
+        if before is not None:
+            seq = log.positions.get(before)
+            if seq is None:
+                return []
+            end = seq - log.first_seq
+
+        # Копируем только запрошенную страницу
+        return log.messages[max(0, end - min(limit, MAX_PAGE_SIZE)):end]
+
+    async def clear(self, project_id: str):
+        self._projects.pop(project_id, None)
+
+    def _trim(self, log: _ProjectLog):
+        # Срезаем сразу четверть лимита, чтобы не сдвигать список на каждое сообщение
+        excess = len(log.messages) - self.max_per_project + self.max_per_project // 4
+        for message in log.messages[:excess]:
+            log.positions.pop(message.id, None)
+        del log.messages[:excess]
+        log.first_seq += excess
+
+
+class SQLMessageStore(MessageStore):
+    """SQLAlchemy хранилище; синхронный драйвер выполняется в пуле потоков"""
+
+    def __init__(self, url: str):
+        connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+        self.engine = create_engine(url, pool_pre_ping=True, connect_args=connect_args)
+
+    async def start(self):
+        await asyncio.to_thread(Base.metadata.create_all, self.engine, tables=[ChatMessageRecord.__table__])
+
+    async def close(self):
+        await asyncio.to_thread(self.engine.dispose)
+
+    async def add_many(self, messages: List[Message]):
+        if messages:
+            await asyncio.to_thread(self._add_many, messages)
+
+    async def list(self, project_id: str, limit: int = 50, before: Optional[str] = None) -> List[Message]:
+        if limit <= 0:
+            return []
+        return await asyncio.to_thread(self._list, project_id, min(limit, MAX_PAGE_SIZE), before)
+
+    async def clear(self, project_id: str):
+        await asyncio.to_thread(self._clear, project_id)
+
+    def _add_many(self, messages: List[Message]):
+        rows = [
+            {
+                "id": message.id,
+                "project_id": message.project_id,
+                "sender": message.sender,
+                "text": message.text,
+                "agent_id": message.agent_id,
+                "agent_name": message.agent_name,
+                "timestamp": message.timestamp
+            }
+            for message in messages
+        ]
+        with Session(self.engine) as session, session.begin():
+            session.execute(insert(ChatMessageRecord), rows)
+
+    def _list(self, project_id: str, limit: int, before: Optional[str]) -> List[Message]:
+        with Session(self.engine) as session:
+            query = select(ChatMessageRecord).where(ChatMessageRecord.project_id == project_id)
+
+            if before is not None:
+                anchor = session.execute(
+                    select(ChatMessageRecord.timestamp, ChatMessageRecord.id).where(
+                        ChatMessageRecord.id == before,
+                        ChatMessageRecord.project_id == project_id
+                    )
+                ).first()
+                if anchor is None:
+                    return []
+                # Keyset: (timestamp, id) < (anchor.timestamp, anchor.id)
+                query = query.where(or_(
+                    ChatMessageRecord.timestamp < anchor.timestamp,
+                    and_(ChatMessageRecord.timestamp == anchor.timestamp, ChatMessageRecord.id < anchor.id)
+                ))
+
+            query = query.order_by(ChatMessageRecord.timestamp.desc(), ChatMessageRecord.id.desc()).limit(limit)
+            records = session.execute(query).scalars().all()
+
+        return [
+            Message(
+                id=record.id,
+                sender=record.sender,
+                text=record.text,
+                timestamp=record.timestamp,
+                agent_id=record.agent_id,
+                agent_name=record.agent_name,
+                project_id=record.project_id
+            )
+            for record in reversed(records)
+        ]
+
+    def _clear(self, project_id: str):
+        with Session(self.engine) as session, session.begin():
+            session.execute(delete(ChatMessageRecord).where(ChatMessageRecord.project_id == project_id))
+
+
+def create_message_store(database_url: Optional[str] = None) -> MessageStore:
+    """SQL хранилище при наличии DATABASE_URL, иначе in-memory"""
+    if database_url:
+        return SQLMessageStore(database_url)
+    return InMemoryMessageStore()
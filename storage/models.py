@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -8,3 +8,17 @@ class Task(Base):
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer)
     ai_type = Column(String(20))
+
+class ChatMessageRecord(Base):
+    __tablename__ = 'chat_messages'
+    id = Column(String(36), primary_key=True)
+    project_id = Column(String(64), nullable=False)
+    sender = Column(String(10), nullable=False)
+    text = Column(Text, nullable=False)
+    agent_id = Column(String(20))
+    agent_name = Column(String(50))
+    timestamp = Column(DateTime, nullable=False)
+    __table_args__ = (
+        # История проекта и keyset-пагинация (timestamp, id)
+        Index('ix_chat_messages_project_ts', 'project_id', 'timestamp', 'id'),
+    )
@@ -1,4 +1,10 @@
+import os
+
 import redis
+import redis.asyncio as aioredis
 
 def get_redis():
     return redis.Redis(host='redis', port=6379)
+
+def get_async_redis(url: str = None):
+    return aioredis.from_url(url or os.getenv('REDIS_URL', 'redis://redis:6379'), decode_responses=True)
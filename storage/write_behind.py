@@ -0,0 +1,188 @@
+# storage/write_behind.py
+"""
+Write-behind очередь: сообщения чата пишутся в хранилище пачками вне пути запроса
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from models.chat_models import Message
+from storage.message_store import MessageStore
+from utils.tracing import detached, tracer
+
+logger = logging.getLogger(__name__)
+
+WRITE_BATCH_SIZE = int(os.getenv('MESSAGE_WRITE_BATCH', 100))
+WRITE_FLUSH_INTERVAL = float(os.getenv('MESSAGE_WRITE_INTERVAL', 0.05))
+WRITE_QUEUE_LIMIT = int(os.getenv('MESSAGE_WRITE_QUEUE_LIMIT', 10000))
+WRITE_RETRIES = 3
+
+
+class WriteBehindQueue:
+    """Копит сообщения и сбрасывает их в store.add_many по размеру пачки или по таймеру"""
+
+    def __init__(self, store: MessageStore,
+                 batch_size: int = WRITE_BATCH_SIZE,
+                 flush_interval: float = WRITE_FLUSH_INTERVAL,
+                 max_queue: int = WRITE_QUEUE_LIMIT):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+
+        self._queue: Deque[Tuple[Message, asyncio.Future]] = deque()
+        self._pending_by_project: Dict[str, int] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._space: Optional[asyncio.Condition] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        self.max_depth = 0
+        self.batches_flushed = 0
+        self.messages_flushed = 0
+        self.failed_messages = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._space = asyncio.Condition()
+            self._flush_lock = asyncio.Lock()
+            # Фоновые сбросы — свои трассы, а не часть запроса, который первым запустил очередь
+            with detached():
+                self._task = asyncio.create_task(self._run())
+
+    async def submit(self, messages: List[Message]) -> asyncio.Future:
+        """
+        Поставить сообщения в очередь записи.
+        Возвращает future, который завершается, когда все сообщения записаны;
+        await его только там, где нужна гарантия durability.
+        """
+        await self.start()
+
+        with tracer.span("message_writer.submit", {"messages": len(messages), "queue.depth": len(self._queue)}):
+            async with self._space:
+                while len(self._queue) + len(messages) > self.max_queue and self._queue:
+                    await self._space.wait()
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for message in messages:
+            future = loop.create_future()
+            self._queue.append((message, future))
+            self._pending_by_project[message.project_id] = self._pending_by_project.get(message.project_id, 0) + 1
+            futures.append(future)
+
+        self.max_depth = max(self.max_depth, len(self._queue))
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+
+        durable = asyncio.gather(*futures)
+        # Ошибку записи уже залогировали; не ругаемся на неполученное исключение
+        durable.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return durable
+
+    def has_pending(self, project_id: str) -> bool:
+        return self._pending_by_project.get(project_id, 0) > 0
+
+    async def flush(self):
+        """Записать все, что сейчас в очереди (read-your-writes, очистка, остановка)"""
+        if self._flush_lock is None:
+            return
+        # Фоновый сброс мог уже забрать пачку из очереди и ждать store.add_many —
+        # дожидаемся и ее, иначе чтение или очистка увидят хранилище без этой пачки
+        while self._queue or self._flush_lock.locked():
+            await self._flush_batch()
+
+    async def stop(self):
+        """Гарантированный сброс очереди при остановке приложения"""
+        if self._task is not None:
+            # Не отменяем задачу посреди записи: пачка в потоке БД могла бы записаться дважды
+            self._stopping = True
+            self._wakeup.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            self._stopping = False
+        await self.flush()
+        if self.failed_messages:
+            logger.error(f"Write-behind: не записано сообщений: {self.failed_messages}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "batches_flushed": self.batches_flushed,
+            "messages_flushed": self.messages_flushed,
+            "failed_messages": self.failed_messages,
+            "last_flush_ms": round(self.last_flush_ms, 2)
+        }
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def _flush_batch(self):
+        async with self._flush_lock:
+            if not self._queue:
+                return
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            messages = [message for message, _ in batch]
+
+            error: Optional[Exception] = None
+            started = time.perf_counter()
+            with tracer.span("message_writer.flush", {"messages": len(messages)}) as span:
+                for attempt in range(WRITE_RETRIES):
+                    try:
+                        await self.store.add_many(messages)
+                        error = None
+                        break
+                    except asyncio.CancelledError:
+                        # Пачка не потеряна: возвращаем в начало очереди
+                        self._queue.extendleft(reversed(batch))
+                        raise
+                    except Exception as e:
+                        error = e
+                        logger.warning(f"Write-behind batch failed (attempt {attempt + 1}): {e}")
+                        if attempt + 1 < WRITE_RETRIES:
+                            await asyncio.sleep(0.1 * (2 ** attempt))
+                span.set_attribute("attempts", attempt + 1)
+                if error is not None:
+                    span.record_exception(error)
+            self.last_flush_ms = (time.perf_counter() - started) * 1000
+
+            for message, future in batch:
+                remaining = self._pending_by_project.get(message.project_id, 1) - 1
+                if remaining > 0:
+                    self._pending_by_project[message.project_id] = remaining
+                else:
+                    self._pending_by_project.pop(message.project_id, None)
+                if future.done():
+                    continue
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+
+            if error is None:
+                self.batches_flushed += 1
+                self.messages_flushed += len(batch)
+            else:
+                self.failed_messages += len(batch)
+                logger.error(f"Write-behind: пачка из {len(batch)} сообщений не записана: {error}")
+
+        async with self._space:
+            self._space.notify_all()
@@ -0,0 +1,110 @@
+import unittest
+from unittest import mock
+
+from services import ai_integrations
+from services.agent_metrics import AgentMetrics, LatencyHistogram, MetricsCollector
+from services.ai_integrations import AgentReply, AIServiceRouter, Completion
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_percentiles_within_bucket_width(self):
+        histogram = LatencyHistogram()
+        for latency in range(1, 1001):
+            histogram.record(float(latency))
+        # Шаг корзин ×√2: оценка не дальше ~41% от истинного значения
+        self.assertAlmostEqual(histogram.percentile(0.5), 500, delta=500 * 0.42)
+        self.assertAlmostEqual(histogram.percentile(0.99), 990, delta=990 * 0.42)
+        self.assertEqual(histogram.summary()["avg_ms"], 500.5)
+
+
+class TestAgentMetrics(unittest.TestCase):
+    def test_sliding_windows_drop_old_slots(self):
+        metrics = AgentMetrics(slot_seconds=10, windows=(60, 300))
+        metrics.record_request(0.1, ok=False, now=990)
+        metrics.record_request(0.2, ok=True, now=1250)
+        metrics.record_request(0.3, ok=True, now=1295)
+        metrics.record_tokens(600, 300, now=1295)
+
+        last_minute = metrics.window(60, now=1299)
+        self.assertEqual((last_minute["requests"], last_minute["errors"]), (2, 0))
+        self.assertEqual(last_minute["tokens_per_second"], 15.0)
+        self.assertEqual(metrics.window(300, now=1299)["requests"], 2)
+        self.assertEqual(metrics.snapshot(now=1299)["requests"], 3)
+
+    def test_cached_replies_skip_latency_histogram(self):
+        metrics = AgentMetrics()
+        metrics.record_request(0.001, ok=True, cached=True)
+        self.assertEqual((metrics.requests, metrics.histogram.count), (1, 0))
+
+    def test_agent_status_ignores_cache_hits(self):
+        collector = MetricsCollector()
+        collector.record_request("claude", 0.001, ok=True, cached=True)
+        self.assertIsNone(collector.agent_status("claude"))
+
+        metrics = collector.get("claude")
+        metrics.record_request(0.2, ok=False, now=0)
+        metrics.record_request(0.2, ok=True, now=0)
+        status = collector.agent_status("claude")
+        # Свежее окно — только кэш-хиты: время и доля успеха из итогов по провайдеру
+        self.assertGreater(status["response_time_ms"], 100)
+        self.assertEqual(status["success_rate"], 50.0)
+
+
+class FakeService:
+    provider = "fake"
+    model = "fake"
+    params = {}
+    api_key = "key"
+
+    def __init__(self, error=None):
+        self.error = error
+
+    async def complete(self, message, context=""):
+        if self.error:
+            raise self.error
+        return Completion(text="ok", input_tokens=10, output_tokens=5)
+
+    async def stream_message(self, message, context="", usage=None):
+        if self.error:
+            yield str(self.error)
+            return
+        yield "o"
+        yield "k"
+        usage.input_tokens, usage.output_tokens = 8, 2
+
+
+class TestRouterFeedsMetrics(unittest.IsolatedAsyncioTestCase):
+    async def test_route_records_latency_tokens_and_errors(self):
+        collector = MetricsCollector()
+        router = AIServiceRouter()
+        router.services["deepseek"] = router.backends["deepseek"] = FakeService()
+        with mock.patch.object(ai_integrations, "agent_metrics", collector):
+            await router.route_message("hi", "deepseek", use_cache=False)
+            await router.route_message("hi", "unknown", use_cache=False)
+
+        snapshot = collector.stats()
+        self.assertEqual(list(snapshot), ["deepseek"])
+        self.assertEqual(snapshot["deepseek"]["requests"], 1)
+        self.assertEqual((snapshot["deepseek"]["input_tokens"], snapshot["deepseek"]["output_tokens"]), (10, 5))
+        self.assertEqual(collector.agent_status("deepseek")["success_rate"], 100.0)
+
+    async def test_stream_records_latency_tokens_and_errors(self):
+        collector = MetricsCollector()
+        router = AIServiceRouter()
+        router.services["deepseek"] = router.backends["deepseek"] = FakeService()
+        with mock.patch.object(ai_integrations, "agent_metrics", collector):
+            reply = AgentReply("")
+            chunks = [chunk async for chunk in router.stream_message("hi", "deepseek", use_cache=False, reply=reply)]
+            router.services["deepseek"] = router.backends["deepseek"] = FakeService(error="❌ upstream")
+            async for _ in router.stream_message("hi", "deepseek", use_cache=False):
+                pass
+
+        self.assertEqual(chunks, ["o", "k"])
+        self.assertEqual((reply.text, reply.backend), ("ok", "deepseek"))
+        snapshot = collector.stats()["deepseek"]
+        self.assertEqual((snapshot["requests"], snapshot["errors"]), (2, 1))
+        self.assertEqual((snapshot["input_tokens"], snapshot["output_tokens"]), (8, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import json
+import os
+import unittest
+from unittest import mock
+
+import httpx
+
+from services.ai_integrations import ClaudeService, Completion, DeepSeekService, iter_sse_events
+from services.http_pool import http_clients
+
+
+def sse_body(events):
+    return "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+
+
+class TestProviderStreaming(unittest.IsolatedAsyncioTestCase):
+    async def asyncTearDown(self):
+        await http_clients.aclose()
+
+    def mock_provider(self, provider, body, status_code=200):
+        def handler(request):
+            self.assertTrue(json.loads(request.content)["stream"])
+            return httpx.Response(status_code, text=body, headers={"content-type": "text/event-stream"})
+        http_clients._clients[provider] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    async def test_iter_sse_events_skips_comments_and_stops_on_done(self):
+        response = httpx.Response(200, text=": ping\n\ndata: {\"a\": 1}\n\ndata: [DONE]\n\ndata: {\"b\": 2}\n\n")
+        events = [event async for event in iter_sse_events(response)]
+        self.assertEqual(events, [{"a": 1}])
+
+    async def test_claude_stream_yields_text_deltas(self):
+        with mock.patch.dict(os.environ, {"CLAUDE_API_KEY": "test-key"}):
+            service = ClaudeService()
+        self.mock_provider("claude", sse_body([
+            {"type": "message_start", "message": {"usage": {"input_tokens": 12, "output_tokens": 1}}},
+            {"type": "content_block_delta", "delta": {"type": "text_delta", "text": "При"}},
+            {"type": "content_block_delta", "delta": {"type": "text_delta", "text": "вет"}},
+            {"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": 4}},
+            {"type": "message_stop"},
+        ]))
+        usage = Completion("")
+        chunks = [chunk async for chunk in service.stream_message("hi", usage=usage)]
+        self.assertEqual(chunks, ["При", "вет"])
+        self.assertEqual((usage.input_tokens, usage.output_tokens), (12, 4))
+
+    async def test_deepseek_stream_yields_content_deltas(self):
+        with mock.patch.dict(os.environ, {"DEEPSEEK_API_KEY": "test-key"}):
+            service = DeepSeekService()
+        self.mock_provider("deepseek", sse_body([
+            {"choices": [{"delta": {"role": "assistant"}}]},
+            {"choices": [{"delta": {"content": "def "}}]},
+            {"choices": [{"delta": {"content": "f()"}, "finish_reason": "stop"}]},
+            {"choices": [], "usage": {"prompt_tokens": 7, "completion_tokens": 3}},
+        ]))
+        usage = Completion("")
+        chunks = [chunk async for chunk in service.stream_message("code", usage=usage)]
+        self.assertEqual(chunks, ["def ", "f()"])
+        self.assertEqual((usage.input_tokens, usage.output_tokens), (7, 3))
+
+    async def test_stream_error_status_becomes_error_chunk(self):
+        with mock.patch.dict(os.environ, {"DEEPSEEK_API_KEY": "test-key"}):
+            service = DeepSeekService()
+        self.mock_provider("deepseek", "overloaded", status_code=503)
+        usage = Completion("")
+        chunks = [chunk async for chunk in service.stream_message("code", usage=usage)]
+        self.assertEqual(chunks, ["❌ DeepSeek API ошибка: 503"])
+        self.assertEqual(usage.error.status_code, 503)
+
+
+if __name__ == "__main__":
+    unittest.main()
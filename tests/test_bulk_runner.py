@@ -0,0 +1,88 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from services.ai_integrations import AgentReply
+from services.bulk_runner import BulkRunner, load_completed, parse_item
+
+
+class FakeRouter:
+    def __init__(self, fail=()):
+        self.calls = []
+        self.fail = set(fail)
+
+    async def route(self, message, agent_id, context="", **kwargs):
+        self.calls.append(message)
+        await asyncio.sleep(0)
+        if message in self.fail:
+            return AgentReply("❌ down")
+        return AgentReply(f"answer {message}", backend=agent_id)
+
+
+class TestBulkRunner(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.input = os.path.join(self.tmp.name, "prompts.jsonl")
+        self.output = os.path.join(self.tmp.name, "results.jsonl")
+        with open(self.input, "w", encoding="utf-8") as f:
+            for i in range(10):
+                f.write(json.dumps({"id": f"p{i}", "message": f"m{i}"}) + "\n")
+            f.write("not json\n")
+
+    def read_output(self):
+        with open(self.output, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    async def test_runs_all_items_and_reports_percentiles(self):
+        router = FakeRouter()
+        stats = await BulkRunner(router, concurrency=3).run(self.input, self.output)
+
+        records = self.read_output()
+        self.assertEqual(sorted(r["id"] for r in records), sorted(f"p{i}" for i in range(10)))
+        summary = stats.summary()
+        self.assertEqual(summary["succeeded"], 10)
+        self.assertIsNotNone(summary["latency_ms"]["p95"])
+
+    async def test_resume_skips_completed_and_retries_failed(self):
+        await BulkRunner(FakeRouter(fail={"m3"}), concurrency=2).run(self.input, self.output, limit=5)
+
+        router = FakeRouter()
+        stats = await BulkRunner(router, concurrency=2).run(self.input, self.output)
+
+        self.assertEqual(sorted(router.calls), sorted(["m3", "m5", "m6", "m7", "m8", "m9"]))
+        self.assertEqual(stats.skipped, 4)
+        self.assertEqual(len(load_completed(self.output)), 10)
+
+    async def test_worker_failure_does_not_hang_producer(self):
+        class UnwritableRouter(FakeRouter):
+            async def route(self, message, agent_id, context="", **kwargs):
+                return AgentReply(object(), backend=agent_id)
+
+        with self.assertRaises(TypeError):
+            await asyncio.wait_for(BulkRunner(UnwritableRouter(), concurrency=1).run(self.input, self.output), 2)
+
+    async def test_partial_last_line_is_truncated(self):
+        with open(self.output, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"id": "p0", "success": True}) + "\n")
+            f.write('{"id": "p1", "succ')
+
+        self.assertEqual(load_completed(self.output), {"p0"})
+        with open(self.output, encoding="utf-8") as f:
+            self.assertTrue(f.read().endswith("\n"))
+
+
+class TestParseItem(unittest.TestCase):
+    def test_backlog_format(self):
+        item = parse_item(1, {"request_id": "user-1", "title": "T", "body": "B"}, "claude")
+        self.assertEqual((item.id, item.message, item.agent_id), ("user-1", "T\n\nB", "claude"))
+
+    def test_missing_message(self):
+        with self.assertRaises(ValueError):
+            parse_item(3, {"id": "x"}, "claude")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+from models.chat_models import ChatSession
+from storage.chat_sessions import ChatSessionRepository
+
+
+def make_session(project_id="p1", agent_id="claude", **fields):
+    return ChatSession(project_id=project_id, agent_id=agent_id, agent_name=agent_id.title(), **fields)
+
+
+class TestChatSessionRepository(unittest.TestCase):
+    def setUp(self):
+        self.repo = ChatSessionRepository()
+
+    def test_lists_and_counts_by_project_and_agent(self):
+        sessions = [self.repo.create(make_session("p1", "claude")) for _ in range(3)]
+        self.repo.create(make_session("p2", "deepseek"))
+
+        self.assertEqual(self.repo.count_by_project("p1"), 3)
+        self.assertEqual(self.repo.count_by_agent("deepseek"), 1)
+        self.assertEqual(self.repo.list_by_project("p1", offset=1, limit=5), sessions[1:])
+
+    def test_update_moves_session_between_indexes(self):
+        session = self.repo.create(make_session("p1", "claude"))
+
+        self.repo.update(session.id, project_id="p2", agent_id="deepseek", is_active=False)
+
+        self.assertEqual(self.repo.count_by_project("p1"), 0)
+        self.assertEqual(self.repo.count_by_agent("claude"), 0)
+        self.assertEqual(self.repo.list_by_project("p2"), [session])
+        self.assertEqual(self.repo.count_by_project("p2", active_only=True), 0)
+
+    def test_active_index_follows_is_active(self):
+        first = self.repo.create(make_session())
+        second = self.repo.create(make_session())
+
+        self.repo.update(first.id, is_active=False)
+
+        self.assertEqual(self.repo.list_by_project("p1", active_only=True), [second])
+        self.repo.update(first.id, is_active=True)
+        self.assertEqual(self.repo.list_by_project("p1", active_only=True), [first, second])
+        self.assertEqual(self.repo.list_by_project("p1"), [first, second])
+
+    def test_delete_cleans_every_index(self):
+        session = self.repo.create(make_session())
+
+        self.assertIs(self.repo.delete(session.id), session)
+
+        self.assertEqual(len(self.repo), 0)
+        self.assertEqual(self.repo._by_project, {})
+        self.assertEqual(self.repo._by_agent, {})
+        self.assertEqual(self.repo._active_by_project, {})
+
+    def test_duplicate_id_is_rejected(self):
+        session = self.repo.create(make_session())
+        with self.assertRaises(ValueError):
+            self.repo.create(make_session(id=session.id))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from unittest import mock
+
+from src.delegation.engine import delegation_engine as engine_module
+from src.delegation.engine.delegation_engine import DelegationEngine, RouteCache
+
+TASKS = [
+    "Создать полную систему интеграции платежей",
+    "Исправить баг в функции авторизации",
+    "Проанализировать архитектуру и составить план",
+    "Напиши код для парсера",
+    "Анализ кода",
+    "Обнови дизайн интерфейса",
+    "Опиши структуру документации",
+    "Привет",
+    "",
+]
+
+
+class TestRouteCache(unittest.TestCase):
+    def test_lru_eviction_and_normalized_key(self):
+        cache = RouteCache(max_entries=2)
+        self.assertEqual(cache.key("  Исправить   БАГ "), "исправить баг")
+        for key in ("a", "b", "c"):
+            cache.set(key, {"recommended_chain": [key]})
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("c"), {"recommended_chain": ["c"]})
+
+
+class TestDelegationEngine(unittest.IsolatedAsyncioTestCase):
+    async def test_route_task_is_cached_by_normalized_text(self):
+        engine = DelegationEngine()
+        first = await engine.route_task("Исправить баг")
+        first["recommended_chain"].append("mutated")
+        second = await engine.route_task("  исправить   баг ")
+
+        self.assertEqual(second["task"], "  исправить   баг ")
+        self.assertNotIn("mutated", second["recommended_chain"])
+        self.assertEqual(engine.cache.stats()["hits"], 1)
+
+    async def test_route_batch_matches_route_task(self):
+        expected = [await DelegationEngine().route_task(task) for task in TASKS]
+        self.assertEqual(await DelegationEngine().route_batch(TASKS), expected)
+
+    async def test_route_batch_without_numpy(self):
+        expected = [await DelegationEngine().route_task(task) for task in TASKS]
+        with mock.patch.object(engine_module, "NUMPY_AVAILABLE", False):
+            self.assertEqual(await DelegationEngine().route_batch(TASKS), expected)
+
+    async def test_route_batch_scores_duplicates_once(self):
+        engine = DelegationEngine()
+        with mock.patch.object(engine, "_score_batch", wraps=engine._score_batch) as score:
+            results = await engine.route_batch(["Напиши код", "напиши  код", "Напиши код"])
+        score.assert_called_once_with(["напиши код"])
+        self.assertEqual([r["task"] for r in results], ["Напиши код", "напиши  код", "Напиши код"])
+
+
+if __name__ == "__main__":
+    unittest.main()
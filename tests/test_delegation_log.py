@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+
+from storage.delegation_log import DelegationLog
+
+AGENTS = ["claude", "deepseek", "dashka"]
+
+
+def fill(log, count, start=1000.0):
+    for i in range(count):
+        log.append("dashka", AGENTS[i % 3], f"m{i}", user_id=i % 2, ts=start + i)
+
+
+class TestDelegationLog(unittest.TestCase):
+    def test_segments_evicted_whole_and_indexes_trimmed(self):
+        log = DelegationLog(segment_size=4, max_segments=3, log_dir="")
+        fill(log, 20)
+
+        self.assertEqual(len(log), 12)
+        self.assertEqual(log.stats()["evicted"], 8)
+        self.assertIsNone(log.get(8))
+        self.assertEqual(log.get(9).message, "m8")
+        entries, _ = log.query(to_agent="claude", limit=100)
+        self.assertEqual([e.id for e in entries], [19, 16, 13, 10])
+
+    def test_time_range_filters_and_cursor(self):
+        log = DelegationLog(segment_size=5, max_segments=10, log_dir="")
+        fill(log, 30)
+
+        # deepseek и user 1 — каждое шестое сообщение: m1, m7, m13, m19, m25
+        entries, cursor = log.query(to_agent="deepseek", user_id=1, since=1010, until=1025, limit=1)
+        self.assertEqual([e.message for e in entries], ["m19"])
+        entries, cursor = log.query(to_agent="deepseek", user_id=1, since=1010, until=1025,
+                                    before_id=cursor, limit=1)
+        self.assertEqual([e.message for e in entries], ["m13"])
+        self.assertIsNone(cursor)
+
+        self.assertEqual(log.query(to_agent="nobody")[0], [])
+        self.assertEqual([e.message for e in log.recent(3)], ["m27", "m28", "m29"])
+
+    def test_ids_and_time_are_monotonic(self):
+        log = DelegationLog(log_dir="")
+        first = log.append("a", "b", "x", 1, ts=2000.0)
+        second = log.append("a", "b", "y", 1, ts=1000.0)
+        self.assertEqual((first.id, second.id), (1, 2))
+        self.assertEqual(second.ts, 2000.0)
+
+    def test_persistence_restores_segments_and_drops_evicted_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log = DelegationLog(segment_size=4, max_segments=2, log_dir=tmp)
+            log.open()
+            fill(log, 10)
+            log.close()
+            self.assertEqual(len(os.listdir(tmp)), 2)
+
+            # Оборванная запись в конце последнего сегмента
+            last = sorted(os.listdir(tmp))[-1]
+            with open(os.path.join(tmp, last), "a", encoding="utf-8") as f:
+                f.write('{"id": 11, "ts"')
+
+            restored = DelegationLog(segment_size=4, max_segments=2, log_dir=tmp)
+            restored.open()
+            self.assertEqual([e.id for e in restored.iter_all()], [5, 6, 7, 8, 9, 10])
+            self.assertEqual(restored.append("a", "b", "next", 1).id, 11)
+            restored.close()
+
+            again = DelegationLog(segment_size=4, max_segments=2, log_dir=tmp)
+            again.open()
+            self.assertEqual(again.get(11).message, "next")
+            again.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
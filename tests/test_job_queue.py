@@ -0,0 +1,25 @@
+import asyncio
+import unittest
+
+from services.job_queue import ConnectionJobQueue, UserConcurrencyLimiter
+
+
+class TestUserConcurrencyLimiter(unittest.IsolatedAsyncioTestCase):
+    async def test_connections_share_semaphore_until_last_one_leaves(self):
+        limiter = UserConcurrencyLimiter(limit=1)
+        first = limiter.get("u1")
+        second = limiter.get("u1")
+        self.assertIs(first, second)
+
+        await ConnectionJobQueue(first).submit("r1", lambda: asyncio.sleep(0))
+        limiter.release("u1")
+        self.assertIs(limiter.get("u1"), first)
+
+        limiter.release("u1")
+        limiter.release("u1")
+        self.assertEqual(len(limiter), 0)
+        self.assertIsNot(limiter.get("u1"), first)
+
+
+if __name__ == "__main__":
+    unittest.main()
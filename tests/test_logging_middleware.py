@@ -0,0 +1,114 @@
+import asyncio
+import json
+import logging
+import unittest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from middleware.logging import LoggingMiddleware
+from services.job_queue import ConnectionJobQueue
+from utils.logger import (
+    JsonFormatter, accept_request_id, get_json_logger, get_request_id, request_context, stop_json_loggers,
+    with_request_id
+)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def make_client(**options):
+    handler = ListHandler()
+    logger = logging.getLogger(f"test.access.{id(handler)}")
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    app = FastAPI()
+    app.add_middleware(LoggingMiddleware, logger=logger, **options)
+
+    @app.get("/ok")
+    async def ok():
+        return {"headers": dict(with_request_id({"x-api-key": "k"}))}
+
+    @app.get("/slow")
+    async def slow():
+        await asyncio.sleep(0.05)
+        return {}
+
+    @app.get("/boom")
+    async def boom():
+        raise RuntimeError("boom")
+
+    return TestClient(app, raise_server_exceptions=False), handler.records
+
+
+class TestLoggingMiddleware(unittest.TestCase):
+    def test_successful_requests_are_sampled_slow_and_errors_always_logged(self):
+        client, records = make_client(sample_rate=0.0, slow_ms=20)
+        client.get("/ok")
+        self.assertEqual(records, [])
+
+        client.get("/slow")
+        client.get("/boom")
+        self.assertEqual([(r.levelname, r.fields["path"]) for r in records],
+                         [("WARNING", "/slow"), ("ERROR", "/boom")])
+        self.assertIn("RuntimeError", records[1].fields["error"])
+
+    def test_request_id_reaches_response_and_provider_headers(self):
+        client, records = make_client(sample_rate=1.0)
+        response = client.get("/ok", headers={"X-Request-ID": "abc-123"})
+        self.assertEqual(response.headers["x-request-id"], "abc-123")
+        self.assertEqual(response.json()["headers"]["X-Request-ID"], "abc-123")
+        self.assertEqual(records[0].request_id, "abc-123")
+
+        response = client.get("/ok", headers={"X-Request-ID": "bad id\n"})
+        self.assertNotEqual(response.headers["x-request-id"], "bad id\n")
+
+
+class TestRequestContext(unittest.IsolatedAsyncioTestCase):
+    async def test_ws_jobs_inherit_frame_request_id(self):
+        seen = []
+
+        async def job():
+            seen.append(get_request_id())
+
+        jobs = ConnectionJobQueue(asyncio.Semaphore(2))
+        with request_context("connection"):
+            await jobs.submit("frame-1", job)
+            self.assertEqual(get_request_id(), "connection")
+        self.assertEqual(seen, ["frame-1"])
+
+    def test_unsafe_frame_ids_never_reach_provider_headers(self):
+        for raw in ("запрос-1", "bad id\n", 42, None, ""):
+            self.assertRegex(accept_request_id(raw), r"^[0-9a-f]{32}$")
+        self.assertEqual(accept_request_id("frame-1"), "frame-1")
+
+        with request_context("запрос-1"):
+            self.assertEqual(with_request_id({"x-api-key": "k"}), {"x-api-key": "k"})
+
+    def test_stop_detaches_queue_handler(self):
+        handler = ListHandler()
+        logger = get_json_logger("test.json.stop", handler=handler)
+        logger.info("before")
+        stop_json_loggers()
+        self.assertEqual([r.getMessage() for r in handler.records], ["before"])
+        self.assertEqual(logger.handlers, [])
+        self.assertTrue(logger.propagate)
+
+    def test_json_formatter(self):
+        record = logging.LogRecord("access", logging.INFO, __file__, 1, "request", None, None)
+        record.fields = {"status": 200}
+        with request_context("rid"):
+            payload = json.loads(JsonFormatter().format(record))
+        self.assertEqual((payload["request_id"], payload["status"], payload["message"]), ("rid", 200, "request"))
+
+
+if __name__ == "__main__":
+    unittest.main()
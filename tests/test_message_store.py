@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from models.chat_models import Message
+from storage.message_store import InMemoryMessageStore, SQLMessageStore
+
+
+def make_messages(project_id, count, start=datetime(2026, 1, 1)):
+    return [
+        Message(text=f"m{i}", project_id=project_id, timestamp=start + timedelta(seconds=i))
+        for i in range(count)
+    ]
+
+
+class MessageStoreContract:
+    async def test_latest_page_in_chronological_order(self):
+        await self.store.add_many(make_messages("p1", 10))
+        page = await self.store.list("p1", limit=3)
+        self.assertEqual([m.text for m in page], ["m7", "m8", "m9"])
+
+    async def test_before_cursor_walks_back_through_history(self):
+        await self.store.add_many(make_messages("p1", 10))
+        texts = []
+        before = None
+        while True:
+            page = await self.store.list("p1", limit=4, before=before)
+            if not page:
+                break
+            texts = [m.text for m in page] + texts
+            before = page[0].id
+        self.assertEqual(texts, [f"m{i}" for i in range(10)])
+
+    async def test_projects_are_isolated(self):
+        await self.store.add_many(make_messages("p1", 3) + make_messages("p2", 2))
+        other = await self.store.list("p2")
+        self.assertEqual(len(other), 2)
+        self.assertEqual(await self.store.list("p1", before=other[-1].id), [])
+
+    async def test_clear_removes_project_history(self):
+        await self.store.add_many(make_messages("p1", 3))
+        await self.store.clear("p1")
+        self.assertEqual(await self.store.list("p1"), [])
+
+
+class TestInMemoryMessageStore(MessageStoreContract, unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.store = InMemoryMessageStore()
+
+    async def test_history_is_bounded_per_project(self):
+        store = InMemoryMessageStore(max_per_project=8)
+        messages = make_messages("p1", 20)
+        await store.add_many(messages)
+        page = await store.list("p1", limit=100)
+        self.assertLessEqual(len(page), 8)
+        self.assertEqual(page[-1].text, "m19")
+        self.assertEqual(await store.list("p1", before=messages[0].id), [])
+
+
+class TestSQLMessageStore(MessageStoreContract, unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = SQLMessageStore(f"sqlite:///{os.path.join(self.tmpdir.name, 'chat.db')}")
+        await self.store.start()
+
+    async def asyncTearDown(self):
+        await self.store.close()
+        self.tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()
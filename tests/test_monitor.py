@@ -0,0 +1,66 @@
+import asyncio
+import time
+import unittest
+
+from services.monitor import AgentMonitor, ProbeHistory
+
+
+def sleeping_probe(delay, calls):
+    async def probe():
+        calls.append(delay)
+        await asyncio.sleep(delay)
+        return {"is_online": True, "token_valid": True}
+    return probe
+
+
+async def failing_probe():
+    raise RuntimeError("boom")
+
+
+class TestProbeHistory(unittest.TestCase):
+    def test_ring_keeps_last_samples(self):
+        history = ProbeHistory(size=4)
+        for latency, ok in [(1000, False), (10, True), (20, True), (30, True), (40, False)]:
+            history.add(latency, ok)
+        summary = history.summary()
+        self.assertEqual(summary["samples"], 4)
+        self.assertEqual(summary["success_rate"], 75.0)
+        self.assertEqual(summary["p99_ms"], 40.0)
+
+
+class TestAgentMonitor(unittest.IsolatedAsyncioTestCase):
+    async def test_round_runs_probes_concurrently_with_timeouts(self):
+        calls = []
+        monitor = AgentMonitor(probe_timeout=0.05)
+        monitor.register("a", "A", sleeping_probe(0.03, calls))
+        monitor.register("b", "B", sleeping_probe(0.03, calls))
+        monitor.register("slow", "Slow", sleeping_probe(1.0, calls))
+        monitor.register("bad", "Bad", failing_probe)
+
+        started = time.perf_counter()
+        await monitor.check_all_agents()
+        self.assertLess(time.perf_counter() - started, 0.5)
+
+        status = monitor.get_status()
+        self.assertTrue(status["a"]["is_online"])
+        self.assertFalse(status["slow"]["is_online"])
+        self.assertIn("timeout", status["slow"]["error"])
+        self.assertEqual(status["bad"]["error"], "boom")
+        self.assertEqual(status["bad"]["history"]["success_rate"], 0.0)
+
+    async def test_status_reads_do_not_probe(self):
+        calls = []
+        monitor = AgentMonitor(interval=60)
+        monitor.register("a", "A", sleeping_probe(0, calls))
+        await monitor.start()
+        await asyncio.sleep(0.05)
+        for _ in range(100):
+            monitor.get_status()
+        await monitor.stop()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(monitor.rounds, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+
+from middleware.metrics import MetricsMiddleware
+from services.prometheus import (
+    HTTP_REQUEST_DURATION, PROVIDER_CALL_DURATION, PROVIDER_TOKENS, WS_CONNECTIONS, WS_MESSAGES,
+    MetricsRegistry, provider_series
+)
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def test_text_exposition(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("jobs", "Jobs done", ("queue",))
+        histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+        registry.collector("depth", "gauge", "Queue depth", lambda: [("depth", {"queue": 'a"b'}, 3)])
+
+        counter.labels("fast").inc()
+        counter.labels("fast").inc(2)
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value)
+
+        text = registry.expose()
+        self.assertIn("# TYPE jobs counter\njobs_total{queue=\"fast\"} 3\n", text)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1\n', text)
+        self.assertIn('latency_seconds_bucket{le="1"} 2\n', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 3\n', text)
+        self.assertIn("latency_seconds_count 3\n", text)
+        self.assertIn('depth{queue="a\\"b"} 3\n', text)
+
+    def test_failing_collector_does_not_break_scrape(self):
+        registry = MetricsRegistry()
+        registry.collector("broken", "gauge", "x", lambda: 1 / 0)
+        registry.counter("ok", "ok").inc()
+        self.assertIn("ok_total 1", registry.expose())
+
+    def test_label_count_checked(self):
+        with self.assertRaises(ValueError):
+            MetricsRegistry().counter("c", "c", ("a", "b")).labels("only-one")
+
+    def test_provider_series_resolved_once(self):
+        series = provider_series("claude")
+        self.assertIs(provider_series("claude"), series)
+        self.assertIs(series.ok, PROVIDER_CALL_DURATION.labels("claude", "ok"))
+        self.assertIs(series.output_tokens, PROVIDER_TOKENS.labels("claude", "output"))
+
+
+class TestMetricsMiddleware(unittest.TestCase):
+    def setUp(self):
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware)
+
+        @app.get("/items/{item_id}")
+        async def get_item(item_id: int):
+            return {"id": item_id}
+
+        @app.websocket("/ws/echo")
+        async def echo(websocket: WebSocket):
+            await websocket.accept()
+            text = await websocket.receive_text()
+            await websocket.send_text(text)
+            await websocket.close()
+
+        self.client = TestClient(app)
+
+    def test_http_latency_labelled_by_route_template(self):
+        child = HTTP_REQUEST_DURATION.labels("GET", "/items/{item_id}", "200")
+        before = sum(child.counts)
+        self.client.get("/items/1")
+        self.client.get("/items/2")
+        self.assertEqual(sum(child.counts) - before, 2)
+
+        missing = HTTP_REQUEST_DURATION.labels("GET", "unmatched", "404")
+        before = sum(missing.counts)
+        self.client.get("/nope")
+        self.assertEqual(sum(missing.counts) - before, 1)
+
+    def test_websocket_connections_and_messages(self):
+        received = WS_MESSAGES.labels("/ws/echo", "in")
+        sent = WS_MESSAGES.labels("/ws/echo", "out")
+        before = (received.value, sent.value)
+        with self.client.websocket_connect("/ws/echo") as websocket:
+            websocket.send_text("hi")
+            self.assertEqual(websocket.receive_text(), "hi")
+        self.assertEqual((received.value - before[0], sent.value - before[1]), (1, 1))
+        self.assertEqual(WS_CONNECTIONS.labels("/ws/echo").value, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
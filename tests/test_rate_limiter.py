@@ -0,0 +1,127 @@
+import asyncio
+import unittest
+
+from services.rate_limiter import ProviderGovernor, TokenBucket, estimate_tokens, parse_retry_after
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_refill_is_continuous_and_capped(self):
+        clock = FakeClock()
+        bucket = TokenBucket(60, clock)
+        bucket.take(60)
+        self.assertAlmostEqual(bucket.wait_time(1), 1.0)
+
+        clock.now = 30
+        self.assertEqual(bucket.wait_time(1), 0.0)
+        self.assertAlmostEqual(bucket.tokens, 30)
+
+        clock.now = 1000
+        bucket.refill()
+        self.assertEqual(bucket.tokens, 60)
+
+    def test_clamp_to_provider_remaining(self):
+        bucket = TokenBucket(100, FakeClock())
+        bucket.clamp(5)
+        self.assertEqual(bucket.tokens, 5)
+
+
+class TestHelpers(unittest.TestCase):
+    def test_estimate_tokens_includes_max_tokens(self):
+        self.assertEqual(estimate_tokens("a" * 40, "", {"max_tokens": 100}), 111)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after("2"), 2.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+
+
+class TestProviderGovernor(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrency_limit(self):
+        governor = ProviderGovernor("test", rpm=1000, tpm=100000, concurrency=2)
+        peak = 0
+
+        async def call():
+            nonlocal peak
+            async with governor.acquire("u", 1):
+                peak = max(peak, governor.active)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(call() for _ in range(6)))
+        self.assertEqual(peak, 2)
+        self.assertEqual(governor.active, 0)
+        self.assertEqual(governor.granted, 6)
+
+    async def test_round_robin_between_users(self):
+        governor = ProviderGovernor("test", rpm=1000, tpm=100000, concurrency=1)
+        order = []
+        gate = asyncio.Event()
+
+        async def call(user_id):
+            async with governor.acquire(user_id, 1):
+                order.append(user_id)
+                await gate.wait()
+
+        # Слот занят — все запросы ждут в очереди
+        holder = asyncio.create_task(call("holder"))
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(call("heavy")) for _ in range(3)]
+        tasks.append(asyncio.create_task(call("light")))
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(holder, *tasks)
+
+        # Легкий пользователь не ждет всю очередь тяжелого
+        self.assertEqual(order, ["holder", "heavy", "light", "heavy", "heavy"])
+
+    async def test_retry_after_blocks_dispatch(self):
+        governor = ProviderGovernor("test", rpm=1000, tpm=100000, concurrency=4)
+        governor.observe(429, {"Retry-After": "0.05"})
+        self.assertEqual(governor.throttled, 1)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        async with governor.acquire("u", 1):
+            waited = loop.time() - started
+        self.assertGreaterEqual(waited, 0.04)
+
+    async def test_cancelled_waiter_leaves_queue(self):
+        governor = ProviderGovernor("test", rpm=1000, tpm=100000, concurrency=1)
+        gate = asyncio.Event()
+
+        async def hold():
+            async with governor.acquire("a", 1):
+                await gate.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        self.assertEqual(governor.queued, 1)
+
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        self.assertEqual(governor.queued, 0)
+
+        gate.set()
+        await holder
+        self.assertEqual(governor.active, 0)
+
+    async def test_used_tokens_refund_reservation(self):
+        governor = ProviderGovernor("test", rpm=1000, tpm=1000, concurrency=1)
+        async with governor.acquire("u", 500) as permit:
+            self.assertAlmostEqual(governor.tokens.tokens, 500, places=0)
+            permit.used_tokens = 100
+        self.assertAlmostEqual(governor.tokens.tokens, 900, places=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from core.exceptions import CircuitOpenError, ProviderError
+from services.resilience import CircuitBreaker, ResilientCaller, backoff_delay
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def provider_error(status_code=None, transient=False):
+    return ProviderError("test", f"❌ test: {status_code}", status_code=status_code, transient=transient)
+
+
+class TestBackoff(unittest.TestCase):
+    def test_full_jitter_is_capped(self):
+        self.assertEqual(backoff_delay(0, base=0.5, cap=8, rng=lambda: 1.0), 0.5)
+        self.assertEqual(backoff_delay(3, base=0.5, cap=8, rng=lambda: 1.0), 4.0)
+        self.assertEqual(backoff_delay(10, base=0.5, cap=8, rng=lambda: 1.0), 8.0)
+        self.assertEqual(backoff_delay(5, rng=lambda: 0.0), 0.0)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_after_consecutive_failures_and_probes(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "closed")
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow())
+
+        clock.now = 10
+        self.assertEqual(breaker.state, "half_open")
+        self.assertTrue(breaker.allow())
+        # Только один пробный вызов
+        self.assertFalse(breaker.allow())
+
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertEqual(breaker.opens, 2)
+
+        clock.now = 20
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+
+
+class TestResilientCaller(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        patcher = mock.patch("services.resilience.backoff_delay", return_value=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_retries_transient_errors(self):
+        caller = ResilientCaller("test", attempts=3)
+        results = [provider_error(503), provider_error(transient=True), "ok"]
+
+        async def fn():
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        self.assertEqual(await caller.call(fn), "ok")
+        self.assertEqual(caller.retries, 2)
+        self.assertEqual(caller.breaker.state, "closed")
+
+    async def test_client_errors_are_not_retried(self):
+        caller = ResilientCaller("test", attempts=3)
+        calls = 0
+
+        async def fn():
+            nonlocal calls
+            calls += 1
+            raise provider_error(400)
+
+        with self.assertRaises(ProviderError):
+            await caller.call(fn)
+        self.assertEqual(calls, 1)
+
+    async def test_open_circuit_fails_fast(self):
+        caller = ResilientCaller("test", attempts=1, breaker=CircuitBreaker(failure_threshold=1))
+        calls = 0
+
+        async def fn():
+            nonlocal calls
+            calls += 1
+            raise provider_error(502)
+
+        with self.assertRaises(ProviderError):
+            await caller.call(fn)
+        with self.assertRaises(CircuitOpenError):
+            await caller.call(fn)
+        self.assertEqual(calls, 1)
+
+    async def test_local_errors_do_not_trip_breaker(self):
+        caller = ResilientCaller("test", attempts=1, breaker=CircuitBreaker(failure_threshold=1))
+
+        async def fn():
+            "запрос".encode("ascii")
+
+        for _ in range(3):
+            with self.assertRaises(UnicodeEncodeError):
+                await caller.call(fn)
+        self.assertEqual(caller.breaker.state, "closed")
+
+    async def test_hedge_wins_when_primary_is_slow(self):
+        caller = ResilientCaller("test", attempts=1, hedge=True)
+        for _ in range(20):
+            caller.latency.add(0.01)
+        calls = 0
+
+        async def fn():
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                await asyncio.sleep(10)
+                return "slow"
+            return "fast"
+
+        with mock.patch("services.resilience.HEDGE_MIN_DELAY", 0.01):
+            self.assertEqual(await asyncio.wait_for(caller.call(fn), 1), "fast")
+        self.assertEqual(caller.hedges, 1)
+        self.assertEqual(caller.hedge_wins, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+
+from services.response_cache import ResponseCache, should_bypass
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResponseCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = ResponseCache(max_entries=2, ttl=60, agents=["deepseek"], clock=self.clock)
+
+    def test_key_ignores_whitespace_but_not_params(self):
+        params = {"max_tokens": 2000, "temperature": 0.1}
+        key = ResponseCache.make_key("deepseek", "deepseek-coder", params, "ctx", "Напиши  функцию\n")
+        self.assertEqual(key, ResponseCache.make_key("deepseek", "deepseek-coder", params, "ctx", " Напиши функцию"))
+        self.assertNotEqual(key, ResponseCache.make_key("deepseek", "deepseek-coder", {**params, "temperature": 0.7}, "ctx", "Напиши функцию"))
+        self.assertNotEqual(key, ResponseCache.make_key("claude", "deepseek-coder", params, "ctx", "Напиши функцию"))
+
+    def test_agent_opt_in(self):
+        self.assertTrue(self.cache.is_enabled("deepseek"))
+        self.assertFalse(self.cache.is_enabled("claude"))
+
+    async def test_entries_expire_after_ttl(self):
+        await self.cache.set("k", "v")
+        self.assertEqual(await self.cache.get("k"), "v")
+
+        self.clock.now = 61
+        self.assertIsNone(await self.cache.get("k"))
+        self.assertEqual(self.cache.stats()["expirations"], 1)
+
+    async def test_least_recently_used_entry_is_evicted(self):
+        await self.cache.set("a", "1")
+        await self.cache.set("b", "2")
+        await self.cache.get("a")
+        await self.cache.set("c", "3")
+
+        self.assertIsNone(await self.cache.get("b"))
+        self.assertEqual(await self.cache.get("a"), "1")
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"]), (2, 1, 1))
+
+    def test_bypass_headers(self):
+        self.assertTrue(should_bypass({"x-cache-bypass": "1"}))
+        self.assertTrue(should_bypass({"cache-control": "no-cache"}))
+        self.assertFalse(should_bypass({}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+import unittest
+from unittest import mock
+
+from core.exceptions import ProviderError
+from services import ai_integrations
+from services.ai_integrations import AIServiceRouter, Completion
+from services.rate_limiter import RateLimitRegistry
+from services.resilience import ResilienceRegistry
+from services.routing_policy import RoutingPolicy
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+FALLBACKS = {"claude": ["claude-haiku", "deepseek"]}
+BACKENDS = ("claude", "claude-haiku", "deepseek")
+
+
+class TestRoutingPolicy(unittest.TestCase):
+    def test_primary_policy_keeps_chain_order(self):
+        policy = RoutingPolicy("primary", fallbacks=FALLBACKS)
+        self.assertEqual(policy.candidates("claude", BACKENDS), ["claude", "claude-haiku", "deepseek"])
+        self.assertEqual(policy.candidates("deepseek", BACKENDS), ["deepseek"])
+
+    def test_unavailable_backend_goes_last(self):
+        policy = RoutingPolicy("primary", fallbacks=FALLBACKS)
+        order = policy.candidates("claude", BACKENDS, available=lambda name: name != "claude")
+        self.assertEqual(order, ["claude-haiku", "deepseek", "claude"])
+
+    def test_cheapest_under_p95(self):
+        policy = RoutingPolicy("cheapest", max_p95=2.0, fallbacks=FALLBACKS)
+        policy.backend("claude").cost_per_1k = 0.015
+        policy.backend("claude-haiku").cost_per_1k = 0.001
+        policy.backend("deepseek").cost_per_1k = 0.002
+        for _ in range(10):
+            policy.record_success("claude", 1.0)
+            policy.record_success("claude-haiku", 5.0)
+            policy.record_success("deepseek", 1.5)
+
+        # Haiku дешевле всех, но не укладывается в p95
+        self.assertEqual(policy.candidates("claude", BACKENDS), ["deepseek", "claude", "claude-haiku"])
+
+    def test_error_rate_demotes_and_decays(self):
+        clock = FakeClock()
+        policy = RoutingPolicy("primary", fallbacks=FALLBACKS, clock=clock)
+        for _ in range(10):
+            policy.record_failure("claude")
+        self.assertEqual(policy.candidates("claude", BACKENDS)[-1], "claude")
+
+        clock.now = 600
+        self.assertEqual(policy.candidates("claude", BACKENDS)[0], "claude")
+
+
+class FakeService:
+    def __init__(self, provider, text=None, error=None):
+        self.provider = provider
+        self.model = provider
+        self.params = {}
+        self.api_key = "key"
+        self.text = text
+        self.error = error
+        self.calls = 0
+
+    async def complete(self, message, context=""):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return Completion(text=self.text)
+
+    async def stream_message(self, message, context="", usage=None):
+        self.calls += 1
+        if self.error:
+            usage.error = self.error
+            yield str(self.error)
+            return
+        yield self.text
+
+
+class TestRouterFailover(unittest.IsolatedAsyncioTestCase):
+    def make_router(self, primary, fallback):
+        router = AIServiceRouter()
+        router.services["claude"] = router.backends["claude"] = primary
+        router.backends["claude-haiku"] = fallback
+        router.policy = RoutingPolicy("primary", fallbacks={"claude": ["claude-haiku"]})
+        return router
+
+    async def test_fails_over_and_reports_backend(self):
+        primary = FakeService("fake-a", error=ProviderError("fake-a", "❌ down", status_code=400))
+        fallback = FakeService("fake-b", text="from haiku")
+        router = self.make_router(primary, fallback)
+
+        reply = await router.route("hi", "claude", use_cache=False)
+
+        self.assertEqual((reply.text, reply.backend), ("from haiku", "claude-haiku"))
+        self.assertEqual(router.policy.failovers, 1)
+
+    async def test_all_backends_failing_returns_primary_error(self):
+        primary = FakeService("fake-a", error=ProviderError("fake-a", "❌ primary down", status_code=400))
+        fallback = FakeService("fake-b", error=ProviderError("fake-b", "❌ fallback down", status_code=400))
+        router = self.make_router(primary, fallback)
+
+        reply = await router.route("hi", "claude", use_cache=False)
+
+        self.assertEqual(reply.text, "❌ primary down")
+        self.assertIsNone(reply.backend)
+
+    async def test_fallback_serves_while_primary_circuit_is_open(self):
+        primary = FakeService("claude", text="from sonnet")
+        fallback = FakeService("claude", text="from haiku")
+        router = self.make_router(primary, fallback)
+        registry = ResilienceRegistry()
+        breaker = registry.get("claude").breaker
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+
+        with mock.patch.object(ai_integrations, "resilience", registry), \
+                mock.patch.object(ai_integrations, "rate_limits", RateLimitRegistry()):
+            reply = await router.route("hi", "claude", use_cache=False)
+
+        self.assertEqual((reply.text, reply.backend), ("from haiku", "claude-haiku"))
+        self.assertEqual((primary.calls, fallback.calls), (0, 1))
+
+    async def test_stream_outcomes_feed_breaker_and_governor(self):
+        outage = ProviderError("claude", "❌ Claude API ошибка: 503", status_code=503)
+        primary = FakeService("claude", error=outage)
+        router = self.make_router(primary, FakeService("claude", text="from haiku"))
+        registry, limits = ResilienceRegistry(), RateLimitRegistry()
+        breaker = registry.get("claude").breaker
+
+        async def stream():
+            return [chunk async for chunk in router.stream_message("hi", "claude", use_cache=False)]
+
+        with mock.patch.object(ai_integrations, "resilience", registry), \
+                mock.patch.object(ai_integrations, "rate_limits", limits):
+            for _ in range(breaker.failure_threshold):
+                self.assertEqual(await stream(), ["❌ Claude API ошибка: 503"])
+            self.assertEqual(breaker.state, breaker.OPEN)
+            # Открытый breaker: поток уходит на fallback
+            self.assertEqual(await stream(), ["from haiku"])
+
+            breaker.record_success()
+            primary.error = ProviderError("claude", "❌ 429", status_code=429, headers={"retry-after": "30"})
+            await stream()
+            self.assertEqual(breaker.failures, 0)
+            self.assertEqual(limits.get("claude").throttled, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+from api.delegation_v7 import SimpleDelegationEngine
+from core.routing_rules import ROUTING_KEYWORDS, KeywordMatcher, routing_rules, stem
+from services.ai_integrations import DashkaService
+from src.delegation.engine.delegation_engine import DelegationEngine
+
+CORPUS = [
+    "Создать полную систему интеграции платежей",
+    "Исправить баг в функции авторизации",
+    "Проанализировать архитектуру и составить план",
+    "Напиши код для парсера CSV",
+    "Обнови дизайн интерфейса",
+    "Implement the analyze step and complete the API",
+    "Подготовь документацию и структуру проекта",
+    "Привет, как дела?",
+]
+
+
+class TestKeywordMatcher(unittest.TestCase):
+    def test_superset_of_legacy_substring_loops(self):
+        for text in CORPUS:
+            legacy = {category for category, words in ROUTING_KEYWORDS.items()
+                      if any(word in text.lower() for word in words if len(word) > 3)}
+            self.assertLessEqual(legacy, routing_rules.match(text), text)
+
+    def test_stems_match_inflections(self):
+        self.assertEqual(stem("архитектура"), "архитектур")
+        self.assertIn("agent:claude", routing_rules.match("Опиши архитектуру"))
+        self.assertIn("simple:system", routing_rules.match("Система логов"))
+
+    def test_short_and_stemmed_keys_need_word_start(self):
+        self.assertEqual(routing_rules.match("build a guide"), frozenset())
+        self.assertNotIn("complexity:integration", routing_rules.match("дополнительно"))
+        self.assertIn("complexity:integration", routing_rules.match("полностью"))
+        # Полный ключ по-прежнему ищется подстрокой
+        self.assertIn("agent:claude", routing_rules.match("проанализировать"))
+
+    def test_overlapping_keys_keep_all_categories(self):
+        matcher = KeywordMatcher({"short": ["программ"], "long": ["программирование"]})
+        self.assertEqual(matcher.match("программирование"), frozenset({"short", "long"}))
+
+
+class TestCallSites(unittest.IsolatedAsyncioTestCase):
+    async def test_delegation_engine_chains(self):
+        engine = DelegationEngine()
+        self.assertEqual((await engine.route_task("Создать полную систему"))["recommended_chain"],
+                         ["dashka", "claude", "deepseek", "dashka"])
+        self.assertEqual((await engine.route_task("Анализ кода"))["recommended_chain"],
+                         ["claude", "deepseek"])
+        self.assertEqual((await engine.route_task("Обнови дизайн"))["recommended_chain"], ["dashka"])
+
+    async def test_simple_engine_and_dashka(self):
+        engine = SimpleDelegationEngine()
+        self.assertEqual((await engine.route_task("Исправить баг"))["complexity"], "MEDIUM")
+        self.assertEqual((await engine.route_task("Создать систему"))["complexity"], "COMPLEX")
+        self.assertIn("техническую задачу", await DashkaService().send_message("Напиши функцию"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api import chat_endpoints
+from services.ai_integrations import AgentReply
+
+
+class TestSendBatch(unittest.TestCase):
+    def setUp(self):
+        app = FastAPI()
+        app.include_router(chat_endpoints.router)
+        self.client = TestClient(app)
+
+        self.store = chat_endpoints.InMemoryMessageStore()
+        self.writer = chat_endpoints.WriteBehindQueue(self.store)
+        for name, value in (("message_store", self.store), ("message_writer", self.writer)):
+            patcher = mock.patch.object(chat_endpoints, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def post_batch(self, payload, **params):
+        response = self.client.post("/api/chat/send_batch", json=payload, params=params)
+        lines = [json.loads(line) for line in response.text.splitlines() if line]
+        return response, lines
+
+    def test_streams_ndjson_as_items_complete(self):
+        active = 0
+        peak = 0
+
+        async def fake_route(message, agent_id, **kwargs):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            # Первый элемент самый медленный
+            await asyncio.sleep(0.05 if message == "0" else 0.01)
+            active -= 1
+            return AgentReply(f"answer {message}", backend=agent_id)
+
+        payload = [
+            {"message": str(i), "agent_id": "deepseek", "project_id": "batch", "user_id": "tool"}
+            for i in range(6)
+        ]
+        with mock.patch.object(chat_endpoints.ai_router, "route", side_effect=fake_route):
+            response, lines = self.post_batch(payload, concurrency=2)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], "application/x-ndjson")
+        self.assertEqual(sorted(line["index"] for line in lines), list(range(6)))
+        self.assertNotEqual(lines[0]["index"], 0)
+        self.assertTrue(all(line["success"] and line["backend"] == "deepseek" for line in lines))
+        self.assertEqual(peak, 2)
+
+    def test_unknown_agent_reported_per_item(self):
+        payload = [{"message": "hi", "agent_id": "nobody", "project_id": "batch"}]
+        response, lines = self.post_batch(payload)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(lines, [{"index": 0, "agent_id": "nobody", "success": False, "error": "Unknown agent"}])
+
+    def test_rejects_oversized_batch(self):
+        payload = [{"message": "hi", "agent_id": "dashka", "project_id": "batch"}] * 3
+        with mock.patch.object(chat_endpoints, "BATCH_MAX_SIZE", 2):
+            response = self.client.post("/api/chat/send_batch", json=payload)
+        self.assertEqual(response.status_code, 413)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import asyncio
+import unittest
+
+from services.single_flight import SingleFlight
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_duplicates_share_one_call(self):
+        flights = SingleFlight()
+        calls = 0
+        release = asyncio.Event()
+
+        async def upstream():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return "answer"
+
+        waiters = [asyncio.create_task(flights.do("k", upstream)) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+
+        self.assertEqual(await asyncio.gather(*waiters), ["answer"] * 5)
+        self.assertEqual(calls, 1)
+        self.assertEqual(flights.stats(), {"in_flight": 0, "leaders": 1, "shared": 4, "abandoned": 0})
+
+    async def test_leader_cancellation_does_not_cancel_other_waiters(self):
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def upstream():
+            await release.wait()
+            return "answer"
+
+        leader = asyncio.create_task(flights.do("k", upstream))
+        follower = asyncio.create_task(flights.do("k", upstream))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        self.assertEqual(await follower, "answer")
+        with self.assertRaises(asyncio.CancelledError):
+            await leader
+
+    async def test_upstream_cancelled_when_every_waiter_leaves(self):
+        flights = SingleFlight()
+        upstream_cancelled = asyncio.Event()
+
+        async def upstream():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                upstream_cancelled.set()
+                raise
+
+        waiters = [asyncio.create_task(flights.do("k", upstream)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+
+        await asyncio.wait_for(upstream_cancelled.wait(), timeout=1)
+        self.assertEqual(flights.in_flight, 0)
+        self.assertEqual(flights.abandoned, 1)
+
+    async def test_errors_reach_every_waiter_and_are_not_remembered(self):
+        flights = SingleFlight()
+
+        async def failing():
+            await asyncio.sleep(0)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(
+            flights.do("k", failing), flights.do("k", failing), return_exceptions=True
+        )
+
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+        self.assertEqual(flights.in_flight, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from src.delegation.engine import delegation_engine
+from src.delegation.engine.delegation_engine import DelegationEngine
+from src.delegation.engine.task_classifier import TaskClassifier, load_classifier
+
+EXAMPLES = [
+    {"text": "Сверстать экран настроек", "agent": "dashka", "complexity": "SIMPLE"},
+    {"text": "Согласовать сроки релиза с командой", "agent": "dashka", "complexity": "SIMPLE"},
+    {"text": "Подготовить презентацию для заказчика", "agent": "dashka", "complexity": "SIMPLE"},
+    {"text": "Оценить риски миграции базы", "agent": "claude", "complexity": "SIMPLE"},
+    {"text": "Сравнить подходы к кэшированию", "agent": "claude", "complexity": "SIMPLE"},
+    {"text": "Продумать схему модулей сервиса", "agent": "claude", "complexity": "MEDIUM"},
+    {"text": "Починить падение парсера CSV", "agent": "deepseek", "complexity": "SIMPLE"},
+    {"text": "Ускорить SQL запрос отчета", "agent": "deepseek", "complexity": "SIMPLE"},
+    {"text": "Написать тесты для парсера", "agent": "deepseek", "complexity": "MEDIUM"},
+] * 3
+
+
+class TestTaskClassifier(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.classifier = TaskClassifier.train(EXAMPLES)
+
+    def test_learns_labels_missing_from_keyword_rules(self):
+        self.assertEqual(self.classifier.predict("Починить падение парсера JSON")["agent"][0], "deepseek")
+        self.assertEqual(self.classifier.predict("Подготовить презентацию релиза")["agent"][0], "dashka")
+
+    def test_save_load_roundtrip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "model.npz")
+            self.classifier.save(path)
+            loaded = TaskClassifier.load(path)
+            self.assertLess(os.path.getsize(path), 512 * 1024)
+
+        text = "Оценить риски кэширования"
+        for head, (label, confidence) in self.classifier.predict(text).items():
+            self.assertEqual(loaded.predict(text)[head][0], label)
+            self.assertAlmostEqual(loaded.predict(text)[head][1], confidence, places=2)
+
+    def test_corrupt_model_file_falls_back_to_keywords(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "model.npz")
+            with open(path, "wb") as f:
+                f.write(b"not a model")
+            with mock.patch.object(delegation_engine, "load_classifier", lambda: load_classifier(path)), \
+                    self.assertLogs(delegation_engine.logger, "WARNING"):
+                self.assertIsNone(delegation_engine.default_classifier())
+
+    def test_predict_under_a_millisecond(self):
+        text = "Ускорить SQL запрос отчета по продажам за квартал"
+        started = time.perf_counter()
+        for _ in range(200):
+            self.classifier.predict(text)
+        self.assertLess((time.perf_counter() - started) / 200, 0.001)
+
+
+class TestEngineWithClassifier(unittest.IsolatedAsyncioTestCase):
+    async def test_confident_prediction_overrides_keywords(self):
+        engine = DelegationEngine(classifier=TaskClassifier.train(EXAMPLES), min_confidence=0.5)
+        result = await engine.route_task("Починить падение парсера")
+        self.assertEqual(result["router"], "classifier")
+        self.assertEqual(result["recommended_chain"], ["deepseek"])
+        self.assertEqual(await engine.route_batch(["Починить падение парсера"]), [result])
+
+    async def test_low_confidence_falls_back_to_keywords(self):
+        engine = DelegationEngine(classifier=TaskClassifier.train(EXAMPLES), min_confidence=1.01)
+        expected = await DelegationEngine().route_task("Исправить баг")
+        self.assertEqual(await engine.route_task("Исправить баг"), expected)
+        self.assertEqual(expected["router"], "keywords")
+
+
+if __name__ == "__main__":
+    unittest.main()
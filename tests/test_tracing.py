@@ -0,0 +1,190 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import services.job_queue as job_queue
+import services.rate_limiter as rate_limiter
+from middleware.tracing import TracingMiddleware
+from services.job_queue import ConnectionJobQueue
+from services.rate_limiter import ProviderGovernor
+from utils.tracing import (
+    NOOP_SPAN, BatchSpanProcessor, FileSpanExporter, OTLPHttpExporter, Tracer,
+    current_span, parse_traceparent, trace_request_hook, trace_response_hook
+)
+
+
+class ListExporter:
+    def __init__(self):
+        self.spans = []
+
+    async def export(self, spans):
+        self.spans.extend(spans)
+
+    async def shutdown(self):
+        pass
+
+
+def make_tracer(**options):
+    exporter = ListExporter()
+    return Tracer(enabled=True, processor=BatchSpanProcessor([exporter]), **options), exporter
+
+
+class TestTracer(unittest.IsolatedAsyncioTestCase):
+    async def test_nested_spans_share_trace_and_survive_tasks(self):
+        tracer, exporter = make_tracer()
+        with tracer.span("root") as root:
+            with tracer.span("child"):
+                await asyncio.create_task(asyncio.sleep(0))
+                task_span = await asyncio.create_task(self._span_in_task(tracer))
+        await tracer.processor.flush()
+
+        spans = {span.name: span for span in exporter.spans}
+        self.assertEqual(set(spans), {"root", "child", "task"})
+        self.assertEqual({span.trace_id for span in exporter.spans}, {root.trace_id})
+        self.assertIsNone(spans["root"].parent_id)
+        self.assertEqual(spans["child"].parent_id, root.span_id)
+        self.assertEqual(task_span.parent_id, spans["child"].span_id)
+        self.assertIs(current_span(), NOOP_SPAN)
+
+    async def _span_in_task(self, tracer):
+        with tracer.span("task") as span:
+            return span
+
+    async def test_errors_and_sampling(self):
+        tracer, exporter = make_tracer()
+        with self.assertRaises(ValueError):
+            with tracer.span("failing"):
+                raise ValueError("boom")
+        await tracer.processor.flush()
+        self.assertEqual(exporter.spans[0].status, "error")
+        self.assertEqual(exporter.spans[0].events[0][1], "exception")
+
+        unsampled, exporter = make_tracer(sample_rate=0.0)
+        with unsampled.span("root") as root:
+            with unsampled.span("child") as child:
+                self.assertIs(child, NOOP_SPAN)
+        self.assertIs(root, NOOP_SPAN)
+        self.assertEqual(unsampled.processor.stats()["queued"], 0)
+
+        disabled = Tracer(enabled=False)
+        with disabled.span("anything") as span:
+            span.set_attribute("ignored", True)
+        self.assertIs(span, NOOP_SPAN)
+
+    async def test_job_queue_and_rate_limit_wait_spans(self):
+        tracer, exporter = make_tracer()
+        original = job_queue.tracer, rate_limiter.tracer
+        job_queue.tracer = rate_limiter.tracer = tracer
+        try:
+            governor = ProviderGovernor("claude", rpm=100, tpm=100000, concurrency=1)
+
+            async def job():
+                async with governor.acquire("user", 10):
+                    pass
+
+            jobs = ConnectionJobQueue(asyncio.Semaphore(1))
+            await jobs.submit("frame-1", job)
+        finally:
+            job_queue.tracer, rate_limiter.tracer = original
+        await tracer.processor.flush()
+
+        spans = {span.name: span for span in exporter.spans}
+        self.assertEqual(set(spans), {"ws.job", "ws.queue_wait", "rate_limit.wait"})
+        self.assertEqual(spans["ws.job"].attributes["request.id"], "frame-1")
+        self.assertEqual(spans["rate_limit.wait"].parent_id, spans["ws.job"].span_id)
+
+    async def test_httpx_hooks_propagate_traceparent_and_record_ttfb(self):
+        tracer, _ = make_tracer()
+        seen = {}
+
+        def handler(request):
+            seen["traceparent"] = request.headers.get("traceparent")
+            return httpx.Response(200, json={})
+
+        client = httpx.AsyncClient(
+            transport=httpx.MockTransport(handler),
+            event_hooks={"request": [trace_request_hook], "response": [trace_response_hook]}
+        )
+        with tracer.span("ai.upstream", kind="client") as span:
+            await client.get("http://provider/v1")
+        await client.aclose()
+
+        self.assertEqual(parse_traceparent(seen["traceparent"]), (span.trace_id, span.span_id, True))
+        self.assertEqual(span.attributes["http.status_code"], 200)
+        self.assertIn("http.ttfb_ms", span.attributes)
+        self.assertIs(current_span(), NOOP_SPAN)
+
+
+class TestExporters(unittest.IsolatedAsyncioTestCase):
+    async def test_file_exporter_writes_jsonl(self):
+        tracer, _ = make_tracer()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "traces", "spans.jsonl")
+            tracer.processor.exporters = [FileSpanExporter(path)]
+            with tracer.span("root", {"ai.agent": "claude"}):
+                with tracer.span("child"):
+                    pass
+            await tracer.stop()
+
+            with open(path, encoding="utf-8") as f:
+                records = [json.loads(line) for line in f]
+        self.assertEqual([r["name"] for r in records], ["child", "root"])
+        self.assertEqual(records[0]["parent_id"], records[1]["span_id"])
+        self.assertEqual(records[1]["attributes"], {"ai.agent": "claude"})
+
+    async def test_otlp_payload(self):
+        tracer, exporter = make_tracer()
+        with tracer.span("root", {"tokens": 5, "cached": False}):
+            pass
+        await tracer.processor.flush()
+
+        otlp = OTLPHttpExporter("http://localhost:4318/v1/traces", service_name="svc")
+        payload = otlp.payload(exporter.spans)
+        await otlp.shutdown()
+
+        resource = payload["resourceSpans"][0]
+        span = resource["scopeSpans"][0]["spans"][0]
+        self.assertEqual(resource["resource"]["attributes"], [{"key": "service.name", "value": {"stringValue": "svc"}}])
+        self.assertEqual(len(span["traceId"]), 32)
+        self.assertNotIn("parentSpanId", span)
+        self.assertEqual(span["attributes"], [
+            {"key": "tokens", "value": {"intValue": "5"}},
+            {"key": "cached", "value": {"boolValue": False}}
+        ])
+
+
+class TestTracingMiddleware(unittest.TestCase):
+    def test_http_root_span_continues_incoming_trace(self):
+        tracer, exporter = make_tracer()
+        app = FastAPI()
+        app.add_middleware(TracingMiddleware, tracer=tracer)
+
+        @app.get("/items/{item_id}")
+        async def item(item_id: str):
+            with tracer.span("inner"):
+                return {}
+
+        parent = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+        TestClient(app).get("/items/42", headers={"traceparent": parent})
+        asyncio.run(tracer.processor.flush())
+
+        spans = {span.name: span for span in exporter.spans}
+        root = spans["GET /items/{item_id}"]
+        self.assertEqual((root.trace_id, root.parent_id), ("0af7651916cd43dd8448eb211c80319c", "b7ad6b7169203331"))
+        self.assertEqual((root.kind, root.attributes["http.status_code"]), ("server", 200))
+        self.assertEqual(spans["inner"].parent_id, root.span_id)
+
+    def test_parse_traceparent(self):
+        self.assertIsNone(parse_traceparent("garbage"))
+        self.assertIsNone(parse_traceparent("00-" + "0" * 32 + "-b7ad6b7169203331-01"))
+        self.assertFalse(parse_traceparent("00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-00").sampled)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import asyncio
+import unittest
+
+from services.ai_integrations import AgentReply
+from src.delegation.monitoring.delegation_monitor import DelegationMonitor
+from src.delegation.orchestrator.workflow_orchestrator import Workflow, WorkflowOrchestrator, WorkflowStep
+
+
+class FakeRouter:
+    def __init__(self, delays=None, fail=(), raise_for=()):
+        self.delays = delays or {}
+        self.fail = set(fail)
+        self.raise_for = set(raise_for)
+        self.prompts = {}
+        self.active = 0
+        self.peak = 0
+
+    async def route(self, message, agent_id, context="", **kwargs):
+        self.prompts.setdefault(agent_id, []).append(message)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delays.get(agent_id, 0.01))
+        finally:
+            self.active -= 1
+        if agent_id in self.raise_for:
+            raise RuntimeError(f"{agent_id} broke")
+        if agent_id in self.fail:
+            return AgentReply(f"❌ {agent_id} down")
+        return AgentReply(f"out:{agent_id}", backend=agent_id)
+
+
+class TestWorkflow(unittest.TestCase):
+    def test_coordinator_chain_keeps_handoff_order(self):
+        workflow = Workflow.from_chain("t", ["dashka", "claude", "deepseek", "dashka"])
+        deps = {step.id: step.depends_on for step in workflow.steps}
+        self.assertEqual(deps, {
+            "1_dashka": [],
+            "2_claude": ["1_dashka"],
+            "3_deepseek": ["2_claude"],
+            "4_dashka": ["2_claude", "3_deepseek"]
+        })
+
+    def test_specialists_without_handoff_fan_out_from_plan(self):
+        workflow = Workflow.from_chain("t", ["dashka", "deepseek", "claude", "dashka"])
+        deps = {step.id: step.depends_on for step in workflow.steps}
+        self.assertEqual(deps, {
+            "1_dashka": [],
+            "2_deepseek": ["1_dashka"],
+            "3_claude": ["1_dashka"],
+            "4_dashka": ["2_deepseek", "3_claude"]
+        })
+
+    def test_explicit_steps_build_dag(self):
+        workflow = Workflow.from_steps("t", [
+            {"id": "plan", "agent_id": "dashka"},
+            {"id": "a", "agent_id": "claude", "depends_on": ["plan"]},
+            {"id": "b", "agent_id": "deepseek", "depends_on": ["plan"], "instruction": "code"}
+        ])
+        self.assertEqual([step.depends_on for step in workflow.steps], [[], ["plan"], ["plan"]])
+        with self.assertRaises(ValueError):
+            Workflow.from_steps("t", [{"id": "a", "agent_id": "claude", "depends_on": ["missing"]}])
+
+    def test_plain_chain_is_sequential(self):
+        workflow = Workflow.from_chain("t", ["claude", "deepseek"])
+        self.assertEqual(workflow.steps[1].depends_on, ["1_claude"])
+
+    def test_cycle_rejected(self):
+        workflow = Workflow("t", [WorkflowStep("a", "claude", ["b"]), WorkflowStep("b", "claude", ["a"])])
+        with self.assertRaises(ValueError):
+            workflow.validate()
+
+
+class TestWorkflowOrchestrator(unittest.IsolatedAsyncioTestCase):
+    async def test_chain_hands_off_outputs_in_order(self):
+        router = FakeRouter()
+        monitor = DelegationMonitor()
+        events = []
+
+        async def on_event(event):
+            events.append(event)
+
+        workflow = Workflow.from_chain("build it", ["dashka", "claude", "deepseek", "dashka"])
+        result = await WorkflowOrchestrator(router, monitor).run(workflow, on_event=on_event)
+
+        self.assertEqual(result.status, "completed")
+        self.assertEqual(router.peak, 1)
+        self.assertIn("[CLAUDE]: out:claude", router.prompts["deepseek"][0])
+        self.assertIn("[CLAUDE]: out:claude", router.prompts["dashka"][1])
+        self.assertIn("[DEEPSEEK]: out:deepseek", router.prompts["dashka"][1])
+        self.assertEqual(result.output, "out:dashka")
+        self.assertEqual(events[0]["type"], "workflow_started")
+        self.assertEqual(events[-1]["type"], "workflow_completed")
+        self.assertEqual(monitor.stats()["workflows"], {"completed": 1})
+
+    async def test_runs_independent_steps_concurrently(self):
+        router = FakeRouter()
+        workflow = Workflow.from_chain("t", ["dashka", "deepseek", "claude", "dashka"])
+        result = await WorkflowOrchestrator(router).run(workflow)
+
+        self.assertEqual(result.status, "completed")
+        self.assertEqual(router.peak, 2)
+
+    async def test_step_exception_marks_step_failed(self):
+        router = FakeRouter(raise_for={"claude"})
+        workflow = Workflow.from_chain("t", ["claude", "deepseek"])
+        result = await WorkflowOrchestrator(router).run(workflow)
+
+        self.assertEqual([step.status for step in result.steps], ["failed", "skipped"])
+        self.assertIn("claude broke", result.steps[0].output)
+        self.assertEqual(result.status, "failed")
+
+    async def test_failed_step_skips_dependents(self):
+        router = FakeRouter(fail={"claude"})
+        workflow = Workflow.from_chain("t", ["claude", "deepseek"])
+        result = await WorkflowOrchestrator(router).run(workflow)
+
+        self.assertEqual([step.status for step in result.steps], ["failed", "skipped"])
+        self.assertEqual(result.status, "failed")
+        self.assertNotIn("deepseek", router.prompts)
+
+    async def test_step_and_total_deadlines(self):
+        router = FakeRouter(delays={"claude": 1.0})
+        workflow = Workflow.from_chain("t", ["claude", "deepseek"], step_timeout=0.05)
+        result = await WorkflowOrchestrator(router).run(workflow)
+        self.assertEqual([step.status for step in result.steps], ["timeout", "skipped"])
+
+        workflow = Workflow("t", [WorkflowStep("a", "claude"), WorkflowStep("b", "deepseek")], timeout=0.05)
+        result = await WorkflowOrchestrator(router).run(workflow)
+        self.assertEqual({step.step_id: step.status for step in result.steps}, {"a": "timeout", "b": "completed"})
+        self.assertEqual(result.status, "partial")
+
+
+if __name__ == "__main__":
+    unittest.main()
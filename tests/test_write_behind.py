@@ -0,0 +1,87 @@
+import asyncio
+import unittest
+
+from models.chat_models import Message
+from storage.message_store import InMemoryMessageStore
+from storage.write_behind import WriteBehindQueue
+
+
+class RecordingStore(InMemoryMessageStore):
+    def __init__(self, fail=False, delay=0.0):
+        super().__init__()
+        self.batches = []
+        self.fail = fail
+        self.delay = delay
+
+    async def add_many(self, messages):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("db down")
+        self.batches.append(len(messages))
+        await super().add_many(messages)
+
+
+def make_messages(count, project_id="p1"):
+    return [Message(text=f"m{i}", project_id=project_id) for i in range(count)]
+
+
+class TestWriteBehindQueue(unittest.IsolatedAsyncioTestCase):
+    async def test_coalesces_messages_into_batches(self):
+        store = RecordingStore()
+        writer = WriteBehindQueue(store, batch_size=4, flush_interval=10)
+
+        durable = [await writer.submit(make_messages(1)) for _ in range(10)]
+        self.assertTrue(writer.has_pending("p1"))
+        await writer.stop()
+
+        await asyncio.gather(*durable)
+        self.assertEqual(store.batches, [4, 4, 2])
+        self.assertFalse(writer.has_pending("p1"))
+        self.assertEqual(writer.stats()["messages_flushed"], 10)
+
+    async def test_flushes_on_interval(self):
+        store = RecordingStore()
+        writer = WriteBehindQueue(store, batch_size=100, flush_interval=0.01)
+
+        durable = await writer.submit(make_messages(3))
+        await asyncio.wait_for(durable, timeout=1)
+
+        self.assertEqual(len(await store.list("p1")), 3)
+        await writer.stop()
+
+    async def test_flush_waits_for_batch_in_flight(self):
+        store = RecordingStore(delay=0.05)
+        writer = WriteBehindQueue(store, batch_size=100, flush_interval=0.001)
+
+        await writer.submit(make_messages(3))
+        # Фоновый сброс забрал пачку и пишет ее — очередь уже пуста
+        while writer.depth:
+            await asyncio.sleep(0.001)
+        self.assertTrue(writer.has_pending("p1"))
+
+        await writer.flush()
+        self.assertEqual(len(await store.list("p1")), 3)
+
+        await writer.submit(make_messages(2))
+        while writer.depth:
+            await asyncio.sleep(0.001)
+        await writer.flush()
+        await store.clear("p1")
+        await asyncio.sleep(0.1)
+        self.assertEqual(await store.list("p1"), [])
+        await writer.stop()
+
+    async def test_failed_batch_fails_durability_future(self):
+        writer = WriteBehindQueue(RecordingStore(fail=True), batch_size=1, flush_interval=10)
+
+        durable = await writer.submit(make_messages(1))
+        await writer.stop()
+
+        with self.assertRaises(RuntimeError):
+            await durable
+        self.assertEqual(writer.stats()["failed_messages"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+import asyncio
+import json
+import unittest
+
+from services.backplane import InProcessBackplane, InProcessBroker, RedisBackplane
+from services.ws_hub import ConnectionManager, SocketChannel, project_topic
+
+
+class FakeWebSocket:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.sent = []
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+class TestConnectionManager(unittest.IsolatedAsyncioTestCase):
+    async def test_user_with_several_sockets_gets_every_frame(self):
+        manager = ConnectionManager()
+        first, second = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(first, "u1")
+        await manager.connect(second, "u1")
+
+        delivered = await manager.send_personal_message(json.dumps({"n": 1}), "u1")
+        await asyncio.sleep(0)
+
+        self.assertEqual(delivered, 2)
+        self.assertEqual(first.sent, [{"n": 1}])
+        self.assertEqual(second.sent, [{"n": 1}])
+
+    async def test_publish_skips_excluded_and_unsubscribed_sockets(self):
+        manager = ConnectionManager()
+        sockets = [FakeWebSocket() for _ in range(3)]
+        channels = [await manager.connect(ws, f"u{i}") for i, ws in enumerate(sockets)]
+        topic = project_topic("p1")
+        await manager.subscribe(channels[0], topic)
+        await manager.subscribe(channels[1], topic)
+
+        delivered = await manager.publish(topic, {"type": "project_message"}, exclude=channels[0])
+        await asyncio.sleep(0)
+
+        self.assertEqual(delivered, 1)
+        self.assertEqual([len(ws.sent) for ws in sockets], [0, 1, 0])
+
+    async def test_disconnect_removes_channel_everywhere(self):
+        manager = ConnectionManager()
+        channel = await manager.connect(FakeWebSocket(), "u1")
+        await manager.subscribe(channel, project_topic("p1"))
+
+        await manager.disconnect(channel)
+
+        self.assertEqual(manager.stats(), {"users": 0, "connections": 0, "topics": 0})
+
+
+class TestBackplane(unittest.IsolatedAsyncioTestCase):
+    async def test_events_reach_sockets_on_other_workers_once(self):
+        broker = InProcessBroker()
+        worker_a = ConnectionManager(InProcessBackplane(broker))
+        worker_b = ConnectionManager(InProcessBackplane(broker))
+        await worker_a.start()
+        await worker_b.start()
+
+        local, remote = FakeWebSocket(), FakeWebSocket()
+        topic = project_topic("p1")
+        await worker_a.subscribe(await worker_a.connect(local, "u1"), topic)
+        await worker_b.subscribe(await worker_b.connect(remote, "u2"), topic)
+
+        await worker_a.publish(topic, {"type": "project_message"})
+        await worker_a.send_personal_message(json.dumps({"type": "direct"}), "u2")
+        await asyncio.sleep(0)
+
+        self.assertEqual(local.sent, [{"type": "project_message"}])
+        self.assertEqual(remote.sent, [{"type": "project_message"}, {"type": "direct"}])
+
+    async def test_backplane_watches_only_local_recipients(self):
+        broker = InProcessBroker()
+        worker_a = ConnectionManager(InProcessBackplane(broker))
+        worker_b = ConnectionManager(InProcessBackplane(broker))
+        await worker_a.start()
+        await worker_b.start()
+
+        topic = project_topic("p1")
+        channel = await worker_b.connect(FakeWebSocket(), "u2")
+        await worker_b.subscribe(channel, topic)
+        self.assertEqual(worker_b.backplane.watched, {("user", "u2"), ("topic", topic)})
+        self.assertEqual(worker_a.backplane.watched, set())
+
+        delivered = []
+
+        async def record(kind, target, text):
+            delivered.append((kind, target))
+
+        worker_b.backplane._handler = record
+        await worker_a.publish(project_topic("p2"), {"type": "project_message"})
+        await worker_a.publish(topic, {"type": "project_message"})
+        self.assertEqual(delivered, [("topic", topic)])
+
+        await worker_b.disconnect(channel)
+        self.assertEqual(worker_b.backplane.watched, set())
+
+
+class FakePubSub:
+    def __init__(self):
+        self.connection = None
+        self.channels = set()
+
+    async def subscribe(self, *channels):
+        self.connection = object()
+        self.channels.update(channels)
+
+    async def unsubscribe(self, *channels):
+        self.channels.difference_update(channels)
+
+    async def close(self):
+        pass
+
+
+class FakeRedis:
+    def __init__(self):
+        self.pubsubs = []
+
+    def pubsub(self):
+        self.pubsubs.append(FakePubSub())
+        return self.pubsubs[-1]
+
+
+class TestRedisBackplane(unittest.IsolatedAsyncioTestCase):
+    async def test_connect_subscribes_before_returning(self):
+        backplane = RedisBackplane(prefix="ws:")
+        backplane._redis = FakeRedis()
+        backplane._subscribed = asyncio.Event()
+        await backplane._open_pubsub()
+        manager = ConnectionManager(backplane)
+
+        channel = await manager.connect(FakeWebSocket(), "u1")
+        await manager.subscribe(channel, project_topic("p1"))
+        pubsub = backplane._redis.pubsubs[0]
+        self.assertEqual(pubsub.channels, {"ws:user:u1", "ws:topic:project:p1"})
+        self.assertTrue(backplane._subscribed.is_set())
+
+        await manager.disconnect(channel)
+        self.assertEqual(pubsub.channels, set())
+
+        # После переподключения слушатель подписывает все текущие адреса заново
+        await manager.connect(FakeWebSocket(), "u2")
+        await backplane._close_pubsub()
+        await backplane._open_pubsub()
+        self.assertEqual(backplane._redis.pubsubs[-1].channels, {"ws:user:u2"})
+
+
+class TestSlowConsumer(unittest.IsolatedAsyncioTestCase):
+    async def test_drop_policy_keeps_newest_frames(self):
+        websocket = FakeWebSocket(delay=10)
+        channel = SocketChannel(websocket, "slow", buffer_size=2, policy="drop")
+
+        for n in range(5):
+            self.assertTrue(await channel.send(json.dumps({"n": n}), wait=False))
+
+        self.assertEqual(channel.dropped, 3)
+        self.assertEqual([json.loads(channel._queue.get_nowait())["n"] for _ in range(2)], [3, 4])
+
+    async def test_disconnect_policy_closes_slow_socket(self):
+        websocket = FakeWebSocket(delay=10)
+        channel = SocketChannel(websocket, "slow", buffer_size=1, policy="disconnect")
+
+        self.assertTrue(await channel.send("{}", wait=False))
+        self.assertFalse(await channel.send("{}", wait=False))
+
+        self.assertTrue(channel.closed)
+        self.assertEqual(websocket.closed_with, 1013)
+
+
+if __name__ == "__main__":
+    unittest.main()
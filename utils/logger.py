@@ -1 +1,132 @@
 # Логгер
+"""
+Структурные JSON логи через очередь (запись в поток не блокирует event loop)
+и request id в contextvar — для логов, WebSocket кадров и заголовков к провайдерам;
+trace id текущего спана связывает запись с трассой
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Iterator, Mapping, Optional, Tuple
+
+from utils.tracing import current_trace_id
+
+REQUEST_ID_HEADER = "x-request-id"
+# Входящий id принимаем только в безопасном виде, иначе генерируем свой
+REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# name -> (слушатель очереди, QueueHandler логгера, прежний propagate)
+_listeners: Dict[str, Tuple[logging.handlers.QueueListener, logging.Handler, bool]] = {}
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+def get_request_id() -> Optional[str]:
+    return request_id_var.get()
+
+
+def valid_request_id(value) -> bool:
+    return isinstance(value, str) and REQUEST_ID_RE.match(value) is not None
+
+
+def accept_request_id(value: Optional[str]) -> str:
+    """Id из заголовка или кадра клиента, если он корректен; иначе новый"""
+    if valid_request_id(value):
+        return value
+    return new_request_id()
+
+
+@contextmanager
+def request_context(request_id: str) -> Iterator[str]:
+    """Текущий request id; задачи, созданные внутри блока, наследуют его"""
+    token = request_id_var.set(request_id)
+    try:
+        yield request_id
+    finally:
+        request_id_var.reset(token)
+
+
+def with_request_id(headers: Mapping[str, str]) -> Mapping[str, str]:
+    """Заголовки запроса к провайдеру + X-Request-ID текущего запроса (только безопасный id)"""
+    request_id = request_id_var.get()
+    if not valid_request_id(request_id):
+        return headers
+    return {**headers, "X-Request-ID": request_id}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON строка на запись; поля из extra={"fields": {...}} попадают на верхний уровень"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        request_id = getattr(record, "request_id", None) or request_id_var.get()
+        if request_id:
+            payload["request_id"] = request_id
+        trace_id = getattr(record, "trace_id", None) or current_trace_id()
+        if trace_id:
+            payload["trace_id"] = trace_id
+        payload.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class RequestIdQueueHandler(logging.handlers.QueueHandler):
+    """Запоминает request id и trace id в записи до передачи в поток слушателя (contextvar там другой)"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if getattr(record, "request_id", None) is None:
+            record.request_id = request_id_var.get()
+        if getattr(record, "trace_id", None) is None:
+            record.trace_id = current_trace_id()
+        return super().prepare(record)
+
+
+def get_json_logger(name: str, level: int = logging.INFO,
+                    handler: Optional[logging.Handler] = None) -> logging.Logger:
+    """
+    Логгер с JSON форматом: запись кладется в очередь, форматирование и вывод —
+    в фоновом потоке QueueListener. Не распространяется на root (без дублей в текстовом логе)
+    """
+    logger = logging.getLogger(name)
+    if name in _listeners:
+        return logger
+
+    target = handler or logging.StreamHandler()
+    target.setFormatter(JsonFormatter())
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(records, target, respect_handler_level=True)
+    listener.start()
+
+    queue_handler = RequestIdQueueHandler(records)
+    _listeners[name] = (listener, queue_handler, logger.propagate)
+    logger.addHandler(queue_handler)
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger
+
+
+def stop_json_loggers():
+    """Дописать очереди при остановке приложения и вернуть логгерам прежний вывод"""
+    for name, (listener, queue_handler, propagate) in list(_listeners.items()):
+        logger = logging.getLogger(name)
+        # Без слушателя записи копились бы в очереди, которую никто не читает
+        logger.removeHandler(queue_handler)
+        logger.propagate = propagate
+        listener.stop()
+    _listeners.clear()
@@ -0,0 +1,471 @@
+# Трассировка
+"""
+Спаны в модели OpenTelemetry (trace/span id, W3C traceparent, OTLP/HTTP JSON) без SDK:
+текущий спан в contextvar, завершенные спаны копятся в очереди и фоновой задачей
+уходят в экспортеры — JSONL файл для офлайн анализа и/или OTLP коллектор.
+Выключенная трассировка — общий no-op объект без аллокаций на горячем пути
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Mapping, NamedTuple, Optional, Union
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+# Доля корневых трасс, которые записываются; дочерние спаны следуют решению корня
+TRACING_SAMPLE_RATE = float(os.getenv('TRACING_SAMPLE_RATE', 1.0))
+# JSONL файл спанов; пусто — файловый экспорт выключен
+TRACING_FILE = os.getenv('TRACING_FILE', 'logs/spans.jsonl')
+# Полный URL приема трасс коллектора, например http://localhost:4318/v1/traces
+TRACING_OTLP_ENDPOINT = os.getenv('OTEL_EXPORTER_OTLP_TRACES_ENDPOINT', '')
+TRACING_SERVICE_NAME = os.getenv('OTEL_SERVICE_NAME', 'ai_pipeline')
+TRACING_BATCH_SIZE = int(os.getenv('TRACING_BATCH_SIZE', 512))
+TRACING_FLUSH_INTERVAL = float(os.getenv('TRACING_FLUSH_INTERVAL', 5.0))
+TRACING_QUEUE_LIMIT = int(os.getenv('TRACING_QUEUE_LIMIT', 8192))
+
+TRACEPARENT_HEADER = "traceparent"
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+# Коды OTLP
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3, "producer": 4, "consumer": 5}
+STATUS_CODES = {"unset": 0, "ok": 1, "error": 2}
+
+
+class SpanContext(NamedTuple):
+    """Идентичность спана для связи с родителем (в т.ч. удаленным из traceparent)"""
+    trace_id: str
+    span_id: str
+    sampled: bool = True
+
+
+def _new_trace_id() -> str:
+    return f"{random.getrandbits(128) or 1:032x}"
+
+
+def _new_span_id() -> str:
+    return f"{random.getrandbits(64) or 1:016x}"
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[SpanContext]:
+    """W3C traceparent входящего запроса; некорректный заголовок игнорируется"""
+    match = TRACEPARENT_RE.match(value.strip().lower()) if value else None
+    if match is None or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return SpanContext(match.group(1), match.group(2), bool(int(match.group(3), 16) & 1))
+
+
+class Span:
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "start_ns", "end_ns",
+                 "attributes", "events", "status", "status_message", "_processor")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, kind: str = "internal",
+                 attributes: Optional[Mapping[str, Any]] = None, processor: Optional["BatchSpanProcessor"] = None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = _new_span_id()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes) if attributes else {}
+        self.events: List[tuple] = []
+        self.status = "unset"
+        self.status_message = ""
+        self._processor = processor
+
+    @property
+    def is_recording(self) -> bool:
+        return self.end_ns is None
+
+    @property
+    def context(self) -> SpanContext:
+        return SpanContext(self.trace_id, self.span_id)
+
+    @property
+    def elapsed_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: Mapping[str, Any]):
+        self.attributes.update(attributes)
+
+    def add_event(self, name: str, attributes: Optional[Mapping[str, Any]] = None):
+        self.events.append((time.time_ns(), name, dict(attributes) if attributes else {}))
+
+    def set_status(self, status: str, message: str = ""):
+        self.status = status
+        self.status_message = message
+
+    def record_exception(self, error: BaseException):
+        self.add_event("exception", {"exception.type": type(error).__name__, "exception.message": str(error)})
+        self.set_status("error", str(error) or type(error).__name__)
+
+    def end(self):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if self._processor is not None:
+            self._processor.on_end(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Плоская запись для JSONL файла"""
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.elapsed_ms, 3),
+            "status": self.status,
+            "status_message": self.status_message or None,
+            "attributes": self.attributes,
+            "events": [{"ts_ns": ts, "name": name, "attributes": attrs} for ts, name, attrs in self.events]
+        }
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Спан в OTLP/HTTP JSON (id — hex, время — строка наносекунд)"""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KINDS.get(self.kind, 1),
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": _otlp_attributes(self.attributes),
+            "events": [
+                {"timeUnixNano": str(ts), "name": name, "attributes": _otlp_attributes(attrs)}
+                for ts, name, attrs in self.events
+            ],
+            "status": {"code": STATUS_CODES[self.status], "message": self.status_message}
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Mapping[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+class _NoopSpan:
+    """Спан вне выборки или при выключенной трассировке: все методы — no-op"""
+    __slots__ = ()
+
+    is_recording = False
+    trace_id = None
+    span_id = None
+    elapsed_ms = 0.0
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_attributes(self, attributes: Mapping[str, Any]):
+        pass
+
+    def add_event(self, name: str, attributes: Optional[Mapping[str, Any]] = None):
+        pass
+
+    def set_status(self, status: str, message: str = ""):
+        pass
+
+    def record_exception(self, error: BaseException):
+        pass
+
+    def end(self):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+AnySpan = Union[Span, _NoopSpan]
+
+current_span_var: ContextVar[Optional[AnySpan]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> AnySpan:
+    return current_span_var.get() or NOOP_SPAN
+
+
+def current_trace_id() -> Optional[str]:
+    span = current_span_var.get()
+    return span.trace_id if span is not None else None
+
+
+@contextmanager
+def detached() -> Iterator[None]:
+    """Задачи, созданные внутри блока, не наследуют текущий спан (фоновые циклы)"""
+    token = current_span_var.set(None)
+    try:
+        yield
+    finally:
+        current_span_var.reset(token)
+
+
+class _SpanScope:
+    """with tracer.span(...): спан текущий внутри блока, ошибка блока — статус error"""
+    __slots__ = ("span", "_token")
+
+    def __init__(self, span: AnySpan):
+        self.span = span
+        self._token = None
+
+    def __enter__(self) -> AnySpan:
+        self._token = current_span_var.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        current_span_var.reset(self._token)
+        if exc is not None:
+            if isinstance(exc, asyncio.CancelledError):
+                self.span.set_attribute("cancelled", True)
+            elif isinstance(exc, Exception):
+                self.span.record_exception(exc)
+        self.span.end()
+        return False
+
+
+class _NoopScope:
+    __slots__ = ()
+
+    def __enter__(self) -> AnySpan:
+        return NOOP_SPAN
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SCOPE = _NoopScope()
+
+
+class FileSpanExporter:
+    """Спаны JSON строками в локальный файл (запись в потоке, не в event loop)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    async def export(self, spans: List[Span]):
+        lines = "".join(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n" for span in spans)
+        await asyncio.to_thread(self._write, lines)
+
+    def _write(self, lines: str):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+    async def shutdown(self):
+        pass
+
+
+class OTLPHttpExporter:
+    """OTLP/HTTP JSON в коллектор (Jaeger, Tempo, otel-collector на :4318)"""
+
+    def __init__(self, endpoint: str, service_name: str = TRACING_SERVICE_NAME, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.resource = {"attributes": _otlp_attributes({"service.name": service_name})}
+        # Свой клиент: общий пул провайдеров трассирует запросы, экспорт трассировать нельзя
+        self._client = httpx.AsyncClient(timeout=timeout)
+
+    def payload(self, spans: List[Span]) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [{
+                "resource": self.resource,
+                "scopeSpans": [{"scope": {"name": "ai_pipeline"}, "spans": [span.to_otlp() for span in spans]}]
+            }]
+        }
+
+    async def export(self, spans: List[Span]):
+        response = await self._client.post(self.endpoint, json=self.payload(spans))
+        if response.status_code >= 300:
+            raise RuntimeError(f"OTLP collector {response.status_code}: {response.text[:200]}")
+
+    async def shutdown(self):
+        await self._client.aclose()
+
+
+class BatchSpanProcessor:
+    """Очередь завершенных спанов: сброс пачками по размеру или по таймеру; переполнение — отбрасываем"""
+
+    def __init__(self, exporters: List[Any], batch_size: int = TRACING_BATCH_SIZE,
+                 flush_interval: float = TRACING_FLUSH_INTERVAL, max_queue: int = TRACING_QUEUE_LIMIT):
+        self.exporters = exporters
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+
+        self._queue: Deque[Span] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.exported = 0
+        self.dropped = 0
+        self.export_errors = 0
+
+    def on_end(self, span: Span):
+        if len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        self._queue.append(span)
+        if len(self._queue) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            with detached():
+                self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        for exporter in self.exporters:
+            try:
+                await exporter.shutdown()
+            except Exception as e:
+                logger.error(f"Ошибка остановки экспортера спанов: {e}")
+
+    async def flush(self):
+        while self._queue:
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            results = await asyncio.gather(*(exporter.export(batch) for exporter in self.exporters),
+                                           return_exceptions=True)
+            for exporter, result in zip(self.exporters, results):
+                if isinstance(result, Exception):
+                    self.export_errors += 1
+                    logger.warning(f"⚠️ Экспорт спанов ({type(exporter).__name__}) не удался: {result}")
+            self.exported += len(batch)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": len(self._queue),
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "export_errors": self.export_errors
+        }
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+
+class Tracer:
+    def __init__(self, enabled: bool = TRACING_ENABLED, sample_rate: float = TRACING_SAMPLE_RATE,
+                 processor: Optional[BatchSpanProcessor] = None):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.processor = processor
+
+    def start_span(self, name: str, attributes: Optional[Mapping[str, Any]] = None, kind: str = "internal",
+                   parent: Optional[Union[SpanContext, Span]] = None, root: bool = False) -> AnySpan:
+        """
+        Новый спан без активации — его нужно завершить через end().
+        Родитель — parent или текущий спан; root=True начинает новую трассу (фоновые задачи)
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        if parent is None and not root:
+            parent = current_span_var.get()
+        if parent is NOOP_SPAN:
+            return NOOP_SPAN
+        if parent is None:
+            if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+                return NOOP_SPAN
+            return Span(name, _new_trace_id(), None, kind, attributes, self.processor)
+        if isinstance(parent, SpanContext) and not parent.sampled:
+            return NOOP_SPAN
+        return Span(name, parent.trace_id, parent.span_id, kind, attributes, self.processor)
+
+    def span(self, name: str, attributes: Optional[Mapping[str, Any]] = None, kind: str = "internal",
+             parent: Optional[Union[SpanContext, Span]] = None, root: bool = False):
+        """Контекстный менеджер: спан текущий внутри блока и завершается на выходе"""
+        if not self.enabled:
+            return _NOOP_SCOPE
+        return _SpanScope(self.start_span(name, attributes, kind, parent, root))
+
+    async def start(self):
+        if self.enabled and self.processor is not None:
+            await self.processor.start()
+            logger.info(f"🔭 Трассировка: {', '.join(type(e).__name__ for e in self.processor.exporters)}"
+                        f" (выборка {self.sample_rate:g})")
+
+    async def stop(self):
+        if self.processor is not None:
+            await self.processor.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            **(self.processor.stats() if self.processor is not None else {})
+        }
+
+
+def build_exporters() -> List[Any]:
+    """Экспортеры из .env: файл и/или OTLP коллектор"""
+    exporters: List[Any] = []
+    if TRACING_FILE:
+        exporters.append(FileSpanExporter(TRACING_FILE))
+    if TRACING_OTLP_ENDPOINT:
+        exporters.append(OTLPHttpExporter(TRACING_OTLP_ENDPOINT))
+    return exporters
+
+
+async def trace_request_hook(request: httpx.Request):
+    """httpx event hook: traceparent к провайдеру и время отправки запроса"""
+    span = current_span_var.get()
+    if span is not None and span.is_recording:
+        request.headers[TRACEPARENT_HEADER] = span.traceparent
+        request.extensions["trace_sent_ns"] = time.time_ns()
+
+
+async def trace_response_hook(response: httpx.Response):
+    """httpx event hook: срабатывает на заголовках ответа (до чтения тела) — это и есть TTFB"""
+    span = current_span_var.get()
+    sent_ns = response.request.extensions.get("trace_sent_ns")
+    if span is not None and span.is_recording and sent_ns is not None:
+        span.set_attributes({
+            "http.status_code": response.status_code,
+            "http.ttfb_ms": round((time.time_ns() - sent_ns) / 1e6, 3)
+        })
+        span.add_event("response_headers")
+
+
+# Глобальный трассировщик; экспортеры создаются только при включенной трассировке
+tracer = Tracer(processor=BatchSpanProcessor(build_exporters()) if TRACING_ENABLED else None)
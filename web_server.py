@@ -6,17 +6,21 @@ FastAPI сервер для мониторинга и API endpoints
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 import asyncio
-import aiohttp
 import logging
 import os
 import json
 import uuid
 
+from middleware.metrics import MetricsMiddleware
+from services.http_pool import http_clients
+from services.monitor import agent_monitor
+from services.prometheus import CONTENT_TYPE, metrics_registry
+
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -29,6 +33,9 @@ class AgentStatus(BaseModel):
     response_time_ms: float
     last_check: datetime
     success_rate: float = 100.0
+    error: Optional[str] = None
+    # История проб монитора
+    probe_history: Optional[Dict] = None
 
 class DelegationEvent(BaseModel):
     id: str
@@ -52,112 +59,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Метрики Prometheus: HTTP и WebSocket на уровне ASGI
+app.add_middleware(MetricsMiddleware)
+
 # Глобальные переменные
 agent_statuses: Dict[str, AgentStatus] = {}
 recent_delegations: List[DelegationEvent] = []
 connected_websockets: List[WebSocket] = []
 
-# ============================================================================
-# Функции проверки агентов
-# ============================================================================
-
-async def check_telegram_bot() -> AgentStatus:
-    """Проверка Telegram бота"""
-    try:
-        token = os.getenv('TELEGRAM_BOT_TOKEN', '')
-        if not token or len(token) < 30:
-            return AgentStatus(
-                name="Dashka",
-                is_online=False,
-                token_valid=False,
-                response_time_ms=0,
-                last_check=datetime.utcnow()
-            )
-        
-        start_time = datetime.utcnow()
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f'https://api.telegram.org/bot{token}/getMe') as resp:
-                end_time = datetime.utcnow()
-                response_time = (end_time - start_time).total_seconds() * 1000
-                
-                return AgentStatus(
-                    name="Dashka",
-                    is_online=resp.status == 200,
-                    token_valid=resp.status != 401,
-                    response_time_ms=response_time,
-                    last_check=datetime.utcnow()
-                )
-    except Exception as e:
-        logger.error(f"Ошибка проверки Telegram: {e}")
-        return AgentStatus(
-            name="Dashka",
-            is_online=False,
-            token_valid=False,
-            response_time_ms=0,
-            last_check=datetime.utcnow()
-        )
-
-async def check_claude_api() -> AgentStatus:
-    """Проверка Claude API"""
-    try:
-        api_key = os.getenv('ANTHROPIC_API_KEY', '')
-        if not api_key:
-            return AgentStatus(
-                name="Claude",
-                is_online=False,
-                token_valid=False,
-                response_time_ms=0,
-                last_check=datetime.utcnow()
-            )
-        
-        # Упрощенная проверка - просто проверяем формат ключа
-        return AgentStatus(
-            name="Claude",
-            is_online=True,
-            token_valid=len(api_key) > 20,
-            response_time_ms=150.0,
-            last_check=datetime.utcnow()
-        )
-    except Exception as e:
-        logger.error(f"Ошибка проверки Claude: {e}")
-        return AgentStatus(
-            name="Claude",
-            is_online=False,
-            token_valid=False,
-            response_time_ms=0,
-            last_check=datetime.utcnow()
-        )
+@app.on_event("startup")
+async def startup_event():
+    # Пробы идут в фоне; эндпоинты статуса читают готовый снимок
+    await agent_monitor.start()
 
-async def check_deepseek_api() -> AgentStatus:
-    """Проверка DeepSeek API"""
-    try:
-        api_key = os.getenv('DEEPSEEK_API_KEY', '')
-        if not api_key:
-            return AgentStatus(
-                name="DeepSeek",
-                is_online=False,
-                token_valid=False,
-                response_time_ms=0,
-                last_check=datetime.utcnow()
-            )
-        
-        # Упрощенная проверка
-        return AgentStatus(
-            name="DeepSeek",
-            is_online=True,
-            token_valid=len(api_key) > 20,
-            response_time_ms=200.0,
-            last_check=datetime.utcnow()
-        )
-    except Exception as e:
-        logger.error(f"Ошибка проверки DeepSeek: {e}")
-        return AgentStatus(
-            name="DeepSeek",
-            is_online=False,
-            token_valid=False,
-            response_time_ms=0,
-            last_check=datetime.utcnow()
-        )
+@app.on_event("shutdown")
+async def shutdown_event():
+    await agent_monitor.stop()
+    await http_clients.aclose()
 
 # ============================================================================
 # API Endpoints
@@ -276,19 +194,35 @@ async def health_check():
         "timestamp": datetime.utcnow().isoformat()
     }
 
+def _probe_samples():
+    samples = []
+    for agent_id, probe in list(agent_monitor.get_status().items()):
+        samples.append(("agent_probe_up", {"agent": agent_id}, int(probe["is_online"])))
+    return samples
+
+metrics_registry.collector("agent_probe_up", "gauge", "Last health probe result per agent", _probe_samples)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Метрики для Prometheus"""
+    return Response(metrics_registry.expose(), media_type=CONTENT_TYPE)
+
+def build_agent_status(agent_id: str, probe: Dict) -> AgentStatus:
+    """
+    Статус по пробам монитора. Этот процесс не маршрутизирует вызовы агентов —
+    задержка и ошибки реальных вызовов отдает /status API (main.py)
+    """
+    return AgentStatus(**probe, probe_history=probe["history"])
+
 @app.get("/api/agents/status")
 async def get_agents_status():
-    """Получить статус всех агентов"""
-    dashka_status = await check_telegram_bot()
-    claude_status = await check_claude_api()
-    deepseek_status = await check_deepseek_api()
-    
+    """Получить статус всех агентов (снимок последнего раунда проб)"""
     return {
         "agents": {
-            "dashka": dashka_status,
-            "claude": claude_status,
-            "deepseek": deepseek_status
+            agent_id: build_agent_status(agent_id, probe)
+            for agent_id, probe in agent_monitor.get_status().items()
         },
+        "last_check_round": agent_monitor.last_round,
         "timestamp": datetime.utcnow().isoformat()
     }
 